@@ -4,13 +4,123 @@ Sets the DC magnetic field inside the cryostat
 """
 
 from qcodes import VisaInstrument
+import numpy as np
 import time, math
 
 
+# Decides when the field has settled at the target of a ramp
+# Readings are added as they come in, and a line is fitted to the most recent ones
+# The field is settled when it's close to the target, and the fit is flat (slope) and quiet (residual)
+class FieldSettlingDetector():
+    def __init__(self, target, ramp_rate, tolerance=0.01, max_slope=1e-4, max_residual=5e-4,
+                 window=8, min_interval=0.2, max_interval=3.0):
+        # The target field and the ramp rate (T and T/s)
+        self.target = target
+        self.ramp_rate = ramp_rate
+
+        # The thresholds (T, T/s and T)
+        self.tolerance = tolerance
+        self.max_slope = max_slope
+        self.max_residual = max_residual
+
+        # The number of readings to fit, and the limits of the poll interval (s)
+        self.window = window
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+        # The readings so far
+        self.times = []
+        self.fields = []
+
+        # Timestamps of the ramp (it starts at the first reading)
+        self.start_time = None
+        self.arrival_time = None
+        self.settled_time = None
+
+        # The largest distance past the target (in the direction of the ramp)
+        self.overshoot = 0.0
+        self.direction = None
+
+    def add_reading(self, field, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+
+        # The first reading tells us when we started, and which way we are ramping
+        if self.direction is None:
+            self.start_time = timestamp
+            self.direction = 1.0 if self.target >= field else -1.0
+
+        self.times.append(timestamp)
+        self.fields.append(field)
+
+        # We only need the readings in the window
+        if len(self.fields) > self.window:
+            self.times.pop(0)
+            self.fields.pop(0)
+
+        # Keep track of the overshoot
+        self.overshoot = max(self.overshoot, self.direction * (field - self.target))
+
+        # Remember when we first got close to the target
+        if self.arrival_time is None and self.is_close(field):
+            self.arrival_time = timestamp
+
+        # Check if the field has settled
+        if self.settled_time is None and self.check_settled():
+            self.settled_time = timestamp
+
+        return self.is_settled()
+
+    def is_close(self, field):
+        return math.isclose(field, self.target, abs_tol=self.tolerance, rel_tol=self.tolerance)
+
+    # Fit a line to the readings in the window, returns the slope (T/s) and the rms residual (T)
+    def fit(self):
+        t = np.array(self.times) - self.times[0]
+        b = np.array(self.fields)
+        coefficients = np.polyfit(t, b, 1)
+        residual = np.sqrt(np.mean((b - np.polyval(coefficients, t)) ** 2))
+        return coefficients[0], residual
+
+    def check_settled(self):
+        # We need a full window of readings, all close to the target
+        if len(self.fields) < self.window or not all(self.is_close(b) for b in self.fields):
+            return False
+
+        slope, residual = self.fit()
+        return abs(slope) < self.max_slope and residual < self.max_residual
+
+    def is_settled(self):
+        return self.settled_time is not None
+
+    # How long to wait before the next reading, fast close to the target and slow far away
+    def next_interval(self):
+        if len(self.fields) == 0 or self.is_close(self.fields[-1]):
+            return self.min_interval
+
+        # Poll about four times during the remaining ramp
+        eta = abs(self.target - self.fields[-1]) / self.ramp_rate
+        return float(np.clip(eta / 4, self.min_interval, self.max_interval))
+
+    # Report the timing of the ramp (None for the parts that didn't happen)
+    def report(self):
+        return {
+            'target': self.target,
+            'ramp_time': None if self.arrival_time is None else self.arrival_time - self.start_time,
+            'settling_time': None if self.settled_time is None else self.settled_time - self.arrival_time,
+            'total_time': None if self.settled_time is None else self.settled_time - self.start_time,
+            'overshoot': self.overshoot
+        }
+
+
 class MagnetController(VisaInstrument):
     def __init__(self, name, address, **kwargs):
         super().__init__(name, address, terminator='\n', timeout=500, **kwargs)
 
+        # The ramp currently running (rate in T/s and target in T)
+        self.ramp_rate = 0.25 * 0.14619
+        self.ramp_target = None
+
         # Sets the low frequency output amplitude
         self.add_parameter('MagneticField',
                            unit='T',
@@ -20,8 +130,12 @@ class MagnetController(VisaInstrument):
         # Connect to the instrument and get an IDN
         self.connect_message()
 
+        # The settings we have sent to the controller, so we only send the ones that change
+        # Settings we don't know (like after a restart) are missing, so they are always sent
+        self.forget_controller_state()
+
         # Ensure output is measured in Tesla
-        self.ask('TESLA ON')
+        self.send_setting('tesla', 'TESLA ON', True)
 
     def get_magnetic_field(self):
         # The command returns something like
@@ -31,46 +145,85 @@ class MagnetController(VisaInstrument):
         field_string = self.ask('GET OUTPUT')
         return float((field_string.split(': ')[1]).split(' ')[0])
 
-    def set_magnetic_field(self, field):
+    # Send a setting to the controller, if it's not already set (or if force is set)
+    # We use ask, so the next command is only sent once the controller has replied to this one
+    def send_setting(self, setting, command, value, force=False):
+        if not force and self.controller_state.get(setting) == value:
+            return
+
+        try:
+            self.ask(command)
+        except Exception:
+            # We don't know if the controller got the command, so forget everything we know
+            self.forget_controller_state()
+            raise
+
+        self.controller_state[setting] = value
+
+    # Call this if the controller may have been changed behind our back (front panel or restart)
+    def forget_controller_state(self):
+        self.controller_state = {}
+
+    def start_ramp(self, field):
+        # Start ramping the magnet towards a field, and return as soon as the ramp is running
         # The ramp speed, set in amps per second, converted to tesla per second
         tesla_per_amp = 0.14619  # T/amp
         ramp = 0.25 * tesla_per_amp  # T/s
 
-        # Start by interrupting whatever the magnet is currently doing
-        self.ask('PAUSE ON')
-        time.sleep(0.75)
+        # Save the ramp, so the caller can estimate when the magnet arrives
+        self.ramp_rate = ramp
+        self.ramp_target = round(float(field), 4)
 
-        # Set the rate of change for the field in amps per second
-        self.ask(f'SET RAMP {ramp}')
-        time.sleep(0.25)
+        # The settings of the ramp, besides the target
+        settings = [('ramp', f'SET RAMP {ramp}', ramp),  # Rate of change for the field
+                    ('tesla', 'TESLA ON', True),  # Units in tesla
+                    ('mid', 'SET MID 0', 0),
+                    ('heater', 'HEATER ON', True)]  # The heater must be on to change the field
 
-        # Set units to tesla
-        self.ask('TESLA ON')
-        time.sleep(0.25)
-        self.ask('SET MID 0')
-        time.sleep(0.25)
+        # The magnet may still be ramping, so we always pause it before changing the target
+        self.send_setting('pause', 'PAUSE ON', True, force=True)
 
-        # Turn on the heater
-        self.ask('HEATER ON')
-        time.sleep(0.25)
+        # Only the settings that changed are sent
+        for setting, command, value in settings:
+            self.send_setting(setting, command, value)
 
         # Set the magnetic field value (in tesla, 4 decimals accuracy)
-        self.ask(f'SET MAX {round(float(field), 4)}')
-        time.sleep(0.25)
+        self.send_setting('max', f'SET MAX {self.ramp_target}', self.ramp_target)
 
         # Enable operation
-        self.ask('PAUSE OFF')
-        time.sleep(0.25)
+        self.send_setting('pause', 'PAUSE OFF', False)
 
         # Tell the magnet to go to that field value
         self.write('RAMP MAX')
 
-        # Wait for the field to get to the value
-        n_max = 100
-        n = 0
-        while n < n_max and not math.isclose(self.get_magnetic_field(), field, abs_tol=0.01, rel_tol=0.01):
-            n += 1
-            time.sleep(3)
+    # Check if a field is at the target of the ramp
+    @staticmethod
+    def is_at_field(field, target):
+        return math.isclose(field, target, abs_tol=0.01, rel_tol=0.01)
+
+    # Estimate the time left of the ramp in seconds
+    def ramp_eta(self, field):
+        return abs(self.ramp_target - field) / self.ramp_rate
+
+    # Create a settling detector for the ramp that is currently running
+    def settling_detector(self, **kwargs):
+        return FieldSettlingDetector(self.ramp_target, self.ramp_rate, **kwargs)
+
+    # Wait for the field of the current ramp to settle, returns the report of the detector
+    def wait_for_settled_field(self, timeout=300):
+        detector = self.settling_detector()
+        stop_time = time.time() + timeout
+        while not detector.add_reading(self.get_magnetic_field()) and time.time() < stop_time:
+            time.sleep(detector.next_interval())
+
+        return detector.report()
+
+    def set_magnetic_field(self, field):
+        # Start the ramp
+        self.start_ramp(field)
+
+        # Wait for the field to settle at the value
+        self.wait_for_settled_field()
 
         # Return the new field
         return self.get_magnetic_field()
@@ -10,6 +10,9 @@ from time import sleep
 
 import os
 
+# Import the calibration lookup tables
+from instrument_drivers.calibration import load_calibration, CalibrationSet
+
 class Keysight_2700_DMM(VisaInstrument):
     # Paths of calibration files to convert between resistance [in ohms] and temperature [in kelvin]
     calib_files = [
@@ -36,23 +39,32 @@ class Keysight_2700_DMM(VisaInstrument):
         '109': 'He Pot'
     }
 
-    def __init__(self, name, address, **kwargs):
+    # The binary formats of the buffer, and the numpy datatype of each
+    binary_formats = {
+        'REAL,64': 'd',
+        'REAL,32': 'f'
+    }
+
+    def __init__(self, name, address, scans_per_buffer=1, data_format='ASC', **kwargs):
         super().__init__(name, address, terminator='\r', timeout=10, **kwargs)
 
         # Set a few parameters
+        # The buffer can hold several scan sweeps, which are read with scan_channels_multi
         self.n_channels = 9
         self.line_cycles = 5
-        self.buffer_size = 9
+        self.buffer_size = 9 * scans_per_buffer
         self.sample_count = 1
 
-        # Load up the calibration
-        self.calibrations = []
-        for fn in self.calib_files:
-            calib = np.loadtxt(fn, delimiter=',')
-            sort = np.argsort(calib[:, 1])
-            calib[:, 0] = (calib[:, 0])[sort]
-            calib[:, 1] = (calib[:, 1])[sort]
-            self.calibrations.append(calib)
+        # Map the channel ids (101, 102, ...) to the index of the sensor (-1 for unknown channels)
+        self.channel_lookup = np.full(200, -1, dtype=int)
+        for i in range(self.n_channels):
+            self.channel_lookup[101 + i] = i
+
+        # The names of the sensors, in the order of the index
+        self.sensor_labels = [self.sensor_names[str(101 + i)] for i in range(self.n_channels)]
+
+        # Load up the calibration (the files hold temperature and resistance, cached as lookup tables)
+        self.calibrations = CalibrationSet([load_calibration(fn, 1, 0, delimiter=',') for fn in self.calib_files])
 
         # Connect to the instrument and get an IDN
         self.connect_message()
@@ -109,32 +121,126 @@ class Keysight_2700_DMM(VisaInstrument):
         # Set output format
         self.write('FORM:ELEM READ,CHAN')
 
+        # Set the data format of the buffer (ASCII, or one of the binary formats, which falls back to ASCII)
+        self.data_format = 'ASC'
+        self.set_data_format(data_format)
+
+    def set_data_format(self, data_format):
+        """
+        Sets the data format used to read the buffer, 'ASC' or one of the binary formats ('REAL,64' or 'REAL,32')
+        The binary formats are checked, and we fall back to ASCII if the instrument doesn't accept them
+        """
+        if data_format in self.binary_formats:
+            # Little endian, so the data can be used directly
+            self.write('FORM:BORD SWAP')
+            self.write(f'FORM:DATA {data_format}')
+
+            # Check the instrument accepted the format (it replies like 'REAL,64')
+            try:
+                accepted = self.ask('FORM:DATA?').strip().upper().replace(' ', '') == data_format
+            except Exception as e:
+                print('Could not check the data format of the DMM', e)
+                accepted = False
+
+            if accepted:
+                self.data_format = data_format
+                return
+
+            print(f'The DMM did not accept {data_format}, falling back to ASCII')
+
+        # Use ASCII
+        self.write('FORM:DATA ASC')
+        self.data_format = 'ASC'
+
     def convert_to_kelvin(self, channel_string, resistance):
         channel = int(channel_string[-1]) - 1
 
-        # Now we grab the calibration
-        calib = self.calibrations[channel]
-
-        # And we interpolate the result
-        return np.interp(resistance, calib[:, 1], calib[:, 0])
-
-    def scan_channels(self):
-        # Create dict to save resistances
-        results = {}
-
+        # Look up the temperature in the table of the sensor
+        return self.calibrations.convert(channel, resistance)
+
+    def read_scan_values(self):
+        """
+        Reads the buffer as a flat array of numbers (alternating resistances and channels)
+        """
+        if self.data_format in self.binary_formats:
+            try:
+                # Binary block of little endian floats
+                return self.visa_handle.query_binary_values('TRAC:DATA?',
+                                                            datatype=self.binary_formats[self.data_format],
+                                                            is_big_endian=False, container=np.array)
+            except Exception as e:
+                # Throw away whatever is left of the block, and continue in ASCII
+                print('Binary read from the DMM failed, falling back to ASCII', e)
+                self.device_clear()
+                self.set_data_format('ASC')
+
+        # Parse all the numbers at once
+        return np.array(self.ask('TRAC:DATA?').split(','), dtype=float)
+
+    def parse_scan_buffer(self, values):
+        """
+        Parses the buffer (alternating resistances and channels) into arrays of resistances and sensor indices
+        Takes the ASCII reply, or the numbers already parsed
+        """
+        # The resistance and channel alternate
+        if isinstance(values, str):
+            values = np.array(values.split(','), dtype=float)
+        values = np.asarray(values, dtype=float).reshape(-1, 2)
+
+        # Map the channels to the sensors, channels outside the lookup table (a second card, or a garbled reading)
+        # are unknown (-1), and raise in read_scan_buffer
+        channels = values[:, 1].astype(int)
+        known = (channels >= 0) & (channels < len(self.channel_lookup))
+        sensors = np.full(len(channels), -1, dtype=int)
+        sensors[known] = self.channel_lookup[channels[known]]
+
+        return values[:, 0], sensors
+
+    def read_scan_buffer(self):
+        """
+        Reads the buffer and converts all the readings in a single call
+        Returns the temperatures and the sensor index of each reading
+        """
         # Get data from buffer
-        data = self.ask('TRAC:DATA?')
-
-        # Split it into the channels and resistances
-        data_array = data.split(',')
+        resistances, sensors = self.parse_scan_buffer(self.read_scan_values())
 
-        # Iterate through the data (the resistance and channel alternate, so stepsize is 2)
-        for i in range(0, len(data_array), 2):
-            # Grab the current resistance and channel
-            res, chan = data_array[i], data_array[i+1]
+        # Check that we know all the channels
+        if np.any(sensors < 0):
+            raise ValueError('Unknown channel in the scan buffer')
 
-            # And save the data
-            results[self.sensor_names[chan]] = self.convert_to_kelvin(chan, float(res))
+        return self.calibrations.convert(sensors, resistances), sensors
 
-        # Return the saved data
-        return results
+    def scan_channels(self):
+        """
+        Reads the latest temperature of each sensor, returns a dict keyed by the name of the sensor
+        """
+        temperatures, sensors = self.read_scan_buffer()
+
+        # Save the data (the latest reading of a sensor wins)
+        return {self.sensor_labels[sensor]: temperature for sensor, temperature in zip(sensors, temperatures)}
+
+    def scan_channels_multi(self):
+        """
+        Reads every complete scan sweep in the buffer
+        Returns a 2-D array of temperatures with a row for each sweep and a column for each sensor
+        (ordered like sensor_labels), sensors missing from a sweep are NaN
+        """
+        temperatures, sensors = self.read_scan_buffer()
+
+        # A sweep starts at each reading of the first channel (101), the buffer can start mid-sweep
+        # when it was cleared automatically, so the readings before the first 101 are dropped
+        rows = np.cumsum(sensors == 0) - 1
+        in_sweep = rows >= 0
+        rows, temperatures, sensors = rows[in_sweep], temperatures[in_sweep], sensors[in_sweep]
+
+        # Drop the sweep at the end if it's incomplete
+        n_scans = rows[-1] + 1 if len(rows) > 0 else 0
+        if n_scans > 0 and np.count_nonzero(rows == n_scans - 1) < self.n_channels:
+            n_scans -= 1
+        in_scans = rows < n_scans
+
+        # Place each reading in the row of its sweep and the column of its sensor
+        scans = np.full((n_scans, self.n_channels), np.nan)
+        scans[rows[in_scans], sensors[in_scans]] = temperatures[in_scans]
+
+        return scans
@@ -3,7 +3,8 @@ QCodes driver for Leiden Cryogenics (MicroTask) GHS-2T-1T-700-CF,
 which is the gas handling system for the MCK50-100 dilution fridge.
 """
 
-from time import sleep
+from functools import partial
+from time import sleep, time
 from qcodes import VisaInstrument, validators as vals
 from qcodes.instrument.group_parameter import GroupParameter, Group
 
@@ -78,9 +79,32 @@ class LC_GHS(VisaInstrument):
     acks = ['command ok', 'command error', 'parameter error', 'receive error', 'not accepted']
     statuses = ['Start', '3He', '4He', 'Normal', 'Recovery']
 
-    def __init__(self, name, address, **kwargs):
+    # The queries that can be refreshed, in the order they are sent
+    queries = ['status', 'settings', 'leds', 'keys', 'pressures']
+
+    # Refresh groups, the queries each group sends
+    refresh_groups = {
+        'pressures': ['pressures'],
+        'status': ['status', 'settings'],
+        'panel': ['leds', 'keys'],
+        'full': queries
+    }
+
+    # How old (in seconds) the result of each query may be before it's sent again
+    # The pressures are polled, while the settings and the front panel rarely change
+    default_staleness = {'status': 2.0, 'settings': 30.0, 'leds': 2.0, 'keys': 2.0, 'pressures': 0.5}
+
+    def __init__(self, name, address, staleness=None, **kwargs):
         super().__init__(name, address, terminator='\n', **kwargs)
 
+        # The staleness window of each query, and when it was last sent
+        self.staleness = dict(self.default_staleness, **(staleness or {}))
+        self.refresh_times = {query: None for query in self.queries}
+
+        # The leds and keys are saved as bitmasks, bit i - 1 is set when led/key x{i + 100} is on
+        self.led_mask = 0
+        self.key_mask = 0
+
         # Acknowledge type comes back when a command has been sent
         # It tells us if the machine has understood our command
         # 0 = command ok - Command accepted and executed
@@ -106,15 +130,11 @@ class LC_GHS(VisaInstrument):
         # Led status - Tells us what leds are on or off
         # 1 = off
         # 2 = on
-        led_group = [self.latest_ack]
+        # The parameters are read from the led bitmask when they are asked for
         for i in range(1, 65):
             # Create a parameter for each led
-            led_label = f'led_x{i + 100}'
-            self.add_parameter(led_label, GroupParameter, label=f'Led for key x{i+100}', vals=vals.Ints(1, 2))
-            led_group.append(self[led_label])
-
-        # Setup a group to describe the leds (and ack)
-        self.led_group = Group(led_group, get_parser=self.led_status_parser, get_cmd='LEDS?')
+            self.add_parameter(f'led_x{i + 100}', label=f'Led for key x{i+100}', vals=vals.Ints(1, 2),
+                               get_cmd=partial(self.get_led, i), set_cmd=False)
 
         # Pressure status (raw ADC value)
         # P1-P7 are normal sensors
@@ -149,15 +169,11 @@ class LC_GHS(VisaInstrument):
         # Keys on the front panel
         # 1 = off
         # 2 = on
-        keys_group = [self.latest_ack]
+        # The parameters are read from the key bitmask when they are asked for
         for i in range(1, 65):
             # Create a parameter for each key
-            key_label = f'key_x{i+100}'
-            self.add_parameter(key_label, GroupParameter, label=f'Status for key x{i+100}', vals=vals.Ints(1, 2))
-            keys_group.append(self[key_label])
-
-        # Add all the keys to a group
-        self.keys_group = Group(keys_group, get_parser=self.keys_status_parser, get_cmd='KEYS?')
+            self.add_parameter(f'key_x{i + 100}', label=f'Status for key x{i+100}', vals=vals.Ints(1, 2),
+                               get_cmd=partial(self.get_key, i), set_cmd=False)
 
         # Connect to the instrument and get an IDN
         print('Connect string:', self.ask('ID?'))
@@ -188,15 +204,21 @@ class LC_GHS(VisaInstrument):
 
         return status_dict
 
-    def led_status_parser(self, led_status_string):
-        return self.ack_comma_sep_list('led_x{}', 101, led_status_string)
+    # Parse a list of leds or keys (1 = off, 2 = on) into the ack and a bitmask
+    def ack_bitmask(self, status_string):
+        ack_string, res_string = status_string.split(sep)
+
+        # Bit i is set when entry i is on
+        mask = 0
+        for i, status in enumerate(res_string.split(',')):
+            if int(status) == 2:
+                mask |= 1 << i
+
+        return int(ack_string), mask
 
     def pressure_status_parser(self, pressure_status_string):
         return self.ack_comma_sep_list('pressure_p{}', 1, pressure_status_string)
 
-    def keys_status_parser(self, keys_status_string):
-        return self.ack_comma_sep_list('key_x{}', 101, keys_status_string)
-
     def pressure_settings_parser(self, pressure_settings_string):
         # Create a dict to contain the results
         status_dict = {}
@@ -213,21 +235,67 @@ class LC_GHS(VisaInstrument):
 
         return status_dict
 
+    # Send a single query, and save the results
+    def refresh_query(self, query):
+        if query == 'status':
+            self.status_group.update()
+        elif query == 'settings':
+            self.pressure_settings_group.update()
+        elif query == 'pressures':
+            self.pressure_group.update()
+        elif query in ['leds', 'keys']:
+            # The leds and keys only update the bitmask, the parameters are read from it when asked for
+            ack, mask = self.ack_bitmask(self.ask('LEDS?' if query == 'leds' else 'KEYS?'))
+            self.latest_ack.cache.set(ack)
+            if query == 'leds':
+                self.led_mask = mask
+            else:
+                self.key_mask = mask
+        else:
+            raise ValueError(f'Unknown query: {query}')
+
+        self.refresh_times[query] = time()
+
+    # The age of the result of a query in seconds (infinite if it was never sent)
+    def get_age(self, query):
+        if self.refresh_times[query] is None:
+            return float('inf')
+
+        return time() - self.refresh_times[query]
+
+    # Refresh a group of queries ('pressures', 'status', 'panel' or 'full')
+    # Only the queries older than their staleness window are sent, unless max_age is given (0 sends them all)
+    # Returns the queries that were sent
+    def refresh(self, group='full', max_age=None):
+        if group not in self.refresh_groups:
+            raise ValueError(f'Unknown refresh group: {group}')
+
+        sent = []
+        for query in self.refresh_groups[group]:
+            if self.get_age(query) >= (self.staleness[query] if max_age is None else max_age):
+                self.refresh_query(query)
+                sent.append(query)
+
+        return sent
+
+    # Send a single query if it's older than its staleness window
+    def refresh_if_stale(self, query):
+        if self.get_age(query) >= self.staleness[query]:
+            self.refresh_query(query)
+
+    # The state of led x{i + 100} (1 = off, 2 = on), refreshing the leds if they are stale
+    def get_led(self, i):
+        self.refresh_if_stale('leds')
+        return 2 if self.led_mask >> (i - 1) & 1 else 1
+
+    # The state of key x{i + 100} (1 = off, 2 = on), refreshing the keys if they are stale
+    def get_key(self, i):
+        self.refresh_if_stale('keys')
+        return 2 if self.key_mask >> (i - 1) & 1 else 1
+
+    # Update every parameter of the GHS
     def get_all_params(self):
-        # Get system status
-        self.status.get()
-
-        # Get pressure settings
-        self.set_p6_low.get()
-
-        # Get LED statuses
-        self.led_x101.get()
-
-        # Get KEY statuses
-        self.key_x101.get()
-
-        # Get pressures
-        self.pressure_p1.get()
+        self.refresh('full', max_age=0)
 
     # Helper function to manually press a button and return the acknowledgement
     def press_button(self, button):
@@ -2,7 +2,12 @@
 QCodes driver for Pfeiffer Vacuum MaxiGauge vacuum gauge controller
 """
 
+from functools import partial
+import threading
+import time
+
 from qcodes import Instrument
+import numpy as np
 import serial
 
 ### ------- Control Symbols as defined on p. 81 of the english
@@ -19,11 +24,19 @@ C = {
 
 LINE_TERMINATION=C['CR']+C['LF'] # CR, LF and CRLF are all possible (p.82)
 
+# Intervals of the continuous mode (COM,a), in seconds
+STREAM_INTERVALS = {0: 0.1, 1: 1.0, 2: 60.0}
+
+# The latest reading is too old once this many intervals passed without a new one
+STREAM_MAX_AGE = 3
+
 
 class MaxiGauge(Instrument):
-    def __init__(self, name, address, **kwargs):
+    def __init__(self, name, address, stream_mode=None, stream_length=3600, **kwargs):
         """
         Class to keep track of parameters associated with Pfeiffer Vacuum MaxiGauge.
+        If stream_mode is given (0 = 100 ms, 1 = 1 s, 2 = 1 min) the gauge is put in continuous mode,
+        and the latest stream_length readings are kept in a ring buffer.
         """
 
         # Config the superclass
@@ -34,9 +47,27 @@ class MaxiGauge(Instrument):
         self.ser.baudrate = 9600
         self.ser.port = address
 
+        # The latest status code of each sensor (0 = ok, see the manual for the others)
+        self.statuses = np.zeros(6, dtype=int)
+
         # Add a parameter for each sensor
+        # Getting one reads all the sensors at once, and updates the others as well
         for i in range(1, 7):
-            self.add_parameter(f'Pressure{i}', get_cmd=lambda: self.get_pressure(i)[1], set_cmd=None)
+            self.add_parameter(f'Pressure{i}', get_cmd=partial(self.get_batch_pressure, i), set_cmd=None,
+                               unit='mbar')
+
+        # Ring buffer of the continuous mode, with the time, statuses and pressures of each reading
+        self.stream_length = stream_length
+        self.stream_times = np.full(stream_length, np.nan)
+        self.stream_statuses = np.zeros((stream_length, 6), dtype=int)
+        self.stream_pressures = np.full((stream_length, 6), np.nan)
+        self.stream_count = 0
+        self.stream_lock = threading.Lock()
+
+        # The thread reading the continuous mode, and the interval of the readings
+        self.stream_thread = None
+        self.streaming = False
+        self.stream_interval = None
 
         # Now we open the serial connection
         self.ser.open()
@@ -44,10 +75,17 @@ class MaxiGauge(Instrument):
         # Tell the user what happened
         print('Opened serial connection to MaxiGauge')
 
+        # Start the continuous mode if it's wanted
+        if stream_mode is not None:
+            self.start_streaming(stream_mode)
+
     def close(self):
         """
         Closes the serial connection
         """
+        # Stop the continuous mode first
+        self.stop_streaming()
+
         if self.ser.is_open:
             # We close the connection
             self.ser.close()
@@ -56,6 +94,10 @@ class MaxiGauge(Instrument):
         """
         Sends a message to the vacuum gauge (it includes the enquire and control signals) and returns a response
         """
+        # The gauge only answers queries when it's not streaming
+        if self.streaming:
+            raise RuntimeError('The MaxiGauge is in continuous mode, stop streaming before sending commands')
+
 
         # First we clear the input buffer
         self.ser.reset_input_buffer()
@@ -75,9 +117,176 @@ class MaxiGauge(Instrument):
     def get_pressure(self, channel):
         """
         Gets a pressure from a channel, decodes it, and returns the status and pressure as numbers
+        In continuous mode this is the latest reading, and does not touch the serial port
         """
+        if self.streaming:
+            _, statuses, pressures = self.get_latest_sample()
+            return int(statuses[channel - 1]), float(pressures[channel - 1])
+
         # Request the pressure, convert it from a bytes array, remove control symbols, and split into the two results
         s, p = self.send(f'PR{channel}').decode('ascii').strip().split(',')
 
         # Decode the numbers and return them
         return int(s), float(p)
+
+    def get_all_pressures(self):
+        """
+        Gets the pressures of all six channels in a single query (PRX),
+        returns the status codes and pressures as arrays, and updates the Pressure{i} parameters
+        """
+        # In continuous mode we use the latest reading
+        if self.streaming:
+            _, statuses, pressures = self.get_latest_sample()
+        else:
+            # The response is the status and pressure of each channel: s1,p1,s2,p2,...,s6,p6
+            statuses, pressures = self.parse_readings(self.send('PRX'))
+
+        # Feed the parameters from the batch
+        self.statuses = statuses
+        for i in range(1, 7):
+            self.parameters[f'Pressure{i}'].cache.set(pressures[i - 1])
+
+        return statuses, pressures
+
+    def get_batch_pressure(self, channel):
+        """
+        Gets the pressure of a single channel, by reading all of them
+        """
+        return self.get_all_pressures()[1][channel - 1]
+
+    def parse_readings(self, response):
+        """
+        Decodes a reading of all channels (s1,p1,s2,p2,...,s6,p6) into arrays of statuses and pressures
+        Raises ValueError if the reading is cut short or garbled
+        """
+        values = response.decode('ascii').strip().split(',')
+        if len(values) != 12:
+            raise ValueError(f'Expected the status and pressure of 6 channels, got {response}')
+        return np.array(values[0::2], dtype=int), np.array(values[1::2], dtype=float)
+
+    def add_sample(self, timestamp, statuses, pressures):
+        """
+        Saves a reading in the ring buffer of the continuous mode
+        """
+        with self.stream_lock:
+            i = self.stream_count % self.stream_length
+            self.stream_times[i] = timestamp
+            self.stream_statuses[i] = statuses
+            self.stream_pressures[i] = pressures
+            self.stream_count += 1
+
+    def get_latest_sample(self):
+        """
+        Returns the time, statuses and pressures of the latest reading in continuous mode
+        Raises if the reading is older than a few stream intervals (the stream stopped)
+        """
+        with self.stream_lock:
+            if self.stream_count == 0:
+                raise RuntimeError('No readings from the MaxiGauge yet')
+
+            i = (self.stream_count - 1) % self.stream_length
+            timestamp = self.stream_times[i]
+            statuses, pressures = self.stream_statuses[i].copy(), self.stream_pressures[i].copy()
+
+        # Don't pass off an old reading as the current pressure
+        age = time.time() - timestamp
+        if age > STREAM_MAX_AGE * self.stream_interval:
+            raise RuntimeError(f'The latest MaxiGauge reading is {age:.1f} s old, the stream stopped')
+
+        return timestamp, statuses, pressures
+
+    def get_stream(self, since=None):
+        """
+        Returns the times, statuses and pressures in the ring buffer (oldest first),
+        optionally only the readings after the time since
+        """
+        with self.stream_lock:
+            # Unroll the ring buffer, so the oldest reading is first
+            n = min(self.stream_count, self.stream_length)
+            order = (np.arange(self.stream_count - n, self.stream_count)) % self.stream_length
+            times = self.stream_times[order]
+            statuses = self.stream_statuses[order]
+            pressures = self.stream_pressures[order]
+
+        if since is not None:
+            keep = times > since
+            times, statuses, pressures = times[keep], statuses[keep], pressures[keep]
+
+        return times, statuses, pressures
+
+    def start_streaming(self, mode=1):
+        """
+        Puts the gauge in continuous mode (0 = every 100 ms, 1 = every second, 2 = every minute),
+        and starts a thread reading the readings into the ring buffer
+        """
+        if self.streaming:
+            return
+
+        # The answer to the command is the first reading
+        first = self.send(f'COM,{mode}')
+        self.add_sample(time.time(), *self.parse_readings(first))
+
+        # Let the reader wake up regularly, so it can be stopped
+        self.stream_interval = STREAM_INTERVALS[mode]
+        self.ser.timeout = 2 * self.stream_interval + 0.5
+
+        self.streaming = True
+        self.stream_thread = threading.Thread(target=self.read_stream, name=f'{self.name}_stream', daemon=True)
+        self.stream_thread.start()
+
+    def read_stream(self):
+        """
+        Reads the continuous mode into the ring buffer until streaming is stopped (runs in a thread)
+        """
+        while self.streaming:
+            try:
+                line = self.ser.read_until()
+            except serial.SerialException as e:
+                print('MaxiGauge stream stopped:', e)
+
+                # Take the gauge out of continuous mode before commands can be sent again,
+                # otherwise the replies to the next commands would be stream readings
+                self.reset_interface()
+                self.stream_thread = None
+                self.streaming = False
+                break
+
+            # Timeouts and partial lines are skipped
+            if not line.endswith(bytes(C['LF'], 'ascii')):
+                continue
+
+            try:
+                self.add_sample(time.time(), *self.parse_readings(line))
+            except ValueError:
+                print('Could not parse MaxiGauge reading:', line)
+
+    def stop_streaming(self):
+        """
+        Stops the continuous mode, and returns the gauge to request/response
+        """
+        # The reader clears the thread itself if the stream failed
+        thread = self.stream_thread
+        if thread is None:
+            return
+
+        # Stop the reader, and wait for it to finish
+        self.streaming = False
+        thread.join()
+        self.stream_thread = None
+
+        self.reset_interface()
+
+    def reset_interface(self):
+        """
+        Ends the continuous mode (any command does), resets the interface and throws away what's left
+        """
+        if not self.ser.is_open:
+            return
+
+        try:
+            self.ser.write(bytes(C['ETX'], 'ascii'))
+            time.sleep(0.1)
+            self.ser.reset_input_buffer()
+            self.ser.timeout = None
+        except serial.SerialException as e:
+            print('Could not reset the MaxiGauge interface:', e)
@@ -7,9 +7,15 @@ Only driver that requires pyserial
 from qcodes import Instrument, validators as vals
 import serial
 import numpy as np
-from scipy.interpolate import CubicSpline
 import time, os, sys
 
+# Import the line transfer, which clocks the bits in and out of the bridge, and the word codec
+from instrument_drivers.Picowatt_AVS47B_protocol import make_line_transfer, encode_tx, decode_rx, word_to_bits, \
+    bits_to_word
+
+# Import the calibration lookup tables
+from instrument_drivers.calibration import load_calibration
+
 
 class Avs_47b_direct(Instrument):
     # Paths of calibration files to convert between resistance [in ohms] and temperature [in kelvin]
@@ -30,10 +36,9 @@ class Avs_47b_direct(Instrument):
         # Config the superclass
         super().__init__(name, **kwargs)
 
-        # Load up the calibration
-        calib_data = np.loadtxt(self.calib_file)
-        self.dale_calib = CubicSpline(calib_data[:, 0], calib_data[:, 1])
-        self.ruo2_10k_calib = CubicSpline(calib_data[:, 2], calib_data[:, 3])
+        # Load up the calibration (converted from mK to K, and cached as lookup tables)
+        self.dale_calib = load_calibration(self.calib_file, 0, 1, method='spline', scale=1e-3)
+        self.ruo2_10k_calib = load_calibration(self.calib_file, 2, 3, method='spline', scale=1e-3)
 
         # Initialize the serial connection (not open yet)
         self.ser = serial.Serial()
@@ -134,102 +139,33 @@ class Avs_47b_direct(Instrument):
         # Now we open the serial connection
         self.ser.open()
 
+        # Use the fastest way to toggle the lines of this port
+        self.lines = make_line_transfer(self.ser)
+
         # And then we send a config in local mode
         self.send_config(False, True)
         print('Opened serial connection to AVS-47B')
 
-    def construct_txstring(self, remote):
+    def construct_txword(self, remote):
         """
-        Constructs a txstring from the device configuration
+        Constructs the 48 bit config word from the device configuration
         Settings are only written if remote is enabled
         """
-        # Allocate 48 bits
-        txstring = [0] * 48
-
-        # Set disable AL
-        txstring[-5] = self.AlarmLine.get()
-
-        # Set remote mode
-        txstring[-7] = int(remote)
-
-        # Set range
-        range_int = f'{int(self.range_v_map[self.Range.get()]):0=3b}'
-        txstring[-9] = int(range_int[-1])
-        txstring[-10] = int(range_int[-2])
-        txstring[-11] = int(range_int[-3])
-
-        # Set the excitation
-        excitation_int = f'{int(self.excitation_v_map[self.Excitation.get()]):0=3b}'
-        txstring[-12] = int(excitation_int[-1])
-        txstring[-13] = int(excitation_int[-2])
-        txstring[-14] = int(excitation_int[-3])
-
-        # Set the display
-        display_int = f'{int(self.Display.get()):0=3b}'
-        txstring[-15] = int(display_int[-1])
-        txstring[-16] = int(display_int[-2])
-        txstring[-17] = int(display_int[-3])
-
-        # Set the channel
-        channel_int = f'{int(self.MultiplexerChannel.get()):0=3b}'
-        txstring[-18] = int(channel_int[-1])
-        txstring[-19] = int(channel_int[-2])
-        txstring[-20] = int(channel_int[-3])
-
-        # Set the input
-        input_int = f'{int(self.InputMode.get()):0=2b}'
-        # input_int = f'{int(0):0=2b}'
-        txstring[-21] = int(input_int[-1])
-        txstring[-22] = int(input_int[-2])
-
-        # Set the ref voltage address to 3
-        txstring[-25] = 1
-        txstring[-26] = 1
-
-        # Program the reference voltage
-        ref_voltage_int = f'{int(self.ReferenceVoltage.get()):0=16b}'
-        for i in range(len(ref_voltage_int)):
-            txstring[i] = int(ref_voltage_int[i])
-
-        # Return the 48bit txstring
-        return txstring
+        return encode_tx(self.ReferenceVoltage.get(), self.InputMode.get(), self.MultiplexerChannel.get(),
+                         self.Display.get(), self.excitation_v_map[self.Excitation.get()],
+                         self.range_v_map[self.Range.get()], remote, self.AlarmLine.get())
+
+    def construct_txstring(self, remote):
+        """
+        Constructs a txstring (list of 48 bits) from the device configuration
+        """
+        return word_to_bits(self.construct_txword(remote))
 
     def decode_rxstring(self, rxstring):
         """
-        Method to decode the results from the AVS-47B
+        Method to decode the results from the AVS-47B (list of 48 bits)
         """
-        # Convert the array to a string
-        a = ''
-        for b in rxstring:
-            a += str(b)
-
-        # Extract the variables we need to determine the output
-        ovr = int(a[5], base=2)
-        pol = int(a[6], base=2)
-        msd = int(a[7], base=2)
-        d3 = int(a[8:12], base=2)
-        d2 = int(a[12:16], base=2)
-        d1 = int(a[16:20], base=2)
-        lsd = int(a[20:24], base=2)
-
-        # Extract variables that determine the state of the machine at time of measurement
-        input_out = int(a[26:28], base=2)
-        ch_out = int(a[28:31], base=2)
-        disp_out = int(a[31:34], base=2)
-        excitation = int(a[34:37], base=2)
-        range_out = int(a[37:40], base=2)
-
-        # Compute the 4.5 digit number
-        adc = 10000 * msd + 1000 * d3 + 100 * d2 + 10 * d1 + lsd
-
-        # Set the sign and convert to float
-        if pol == 0:
-            adc *= -1.
-
-        # Convert the ADC value to a resistance
-        resistance = adc * 10 ** (range_out - 5)
-
-        return ovr, resistance, adc, input_out, ch_out, disp_out, excitation, range_out
+        return decode_rx(bits_to_word(rxstring))
 
     def send_config(self, remote=False, save_device_config=False, return_decoded=False):
         """
@@ -240,28 +176,26 @@ class Avs_47b_direct(Instrument):
         """
         # First we send the address
         # Construct an address (we just use the default (1) as recommended)
-        hw_address = [0, 0, 0, 0, 0, 0, 0, 1]
-        hw_address_old = [0, 0, 0, 0, 0, 0, 0, 1]
+        hw_address = 1
 
-        # Construct the TXString and allocate the rxstring
-        txstring = self.construct_txstring(remote)
-        rxstring = [0] * 48
+        # Construct the config word
+        txword = self.construct_txword(remote)
 
         # Read the old address and write the new address
-        self.read_write_data(hw_address_old, hw_address)
+        self.lines.transfer_word(hw_address, 8)
 
         # Strobe the address
         self.strobe()
 
         # Read and write the config
-        self.read_write_data(rxstring, txstring)
+        rxword = self.lines.transfer_word(txword)
 
         # Strobe the txstring
         self.strobe()
 
         # Check if we should save the devices config to the configuration of the module
         if save_device_config:
-            ovr, resistance, adc, input_out, ch_out, disp_out, excitation, range_out = self.decode_rxstring(rxstring)
+            ovr, resistance, adc, input_out, ch_out, disp_out, excitation, range_out = decode_rx(rxword)
 
             # Save the overrange
             self.Overrange.set(ovr)
@@ -297,10 +231,10 @@ class Avs_47b_direct(Instrument):
             if return_decoded:
                 return ovr, resistance, adc, input_out, ch_out, disp_out, excitation, range_out
         elif return_decoded:
-            return self.decode_rxstring(rxstring)
+            return decode_rx(rxword)
 
         # Return the rxstring
-        return rxstring
+        return word_to_bits(rxword)
 
     def get_alarm_signal(self):
         """
@@ -323,6 +257,9 @@ class Avs_47b_direct(Instrument):
         # And we set the alarmline, so we get a signal when data is ready
         self.AlarmLine.set(0)
 
+        # The overrange of the new measurement is not known yet
+        self.Overrange.set(0)
+
         # Now we send the updated configuration
         # We set it to remote mode for it all to function
         # And we don't want to overwrite our users configuration
@@ -336,7 +273,8 @@ class Avs_47b_direct(Instrument):
         # Now we retreive the data, we save the results to the config
         ovr, resistance, _, _, ch_out, _, _, _ = self.send_config(True, False, True)
 
-        # Check if we're overranged
+        # Check if we're overranged (saved, so the caller can tell an overrange from a measurement that isn't ready)
+        self.Overrange.set(ovr)
         if ovr == 0:
             # Return the resistance along with a signal that the measurement is complete
             return True, resistance, self.MultiplexerChannel.get()
@@ -368,66 +306,25 @@ class Avs_47b_direct(Instrument):
             raise ValueError('This sensor is not calibrated')
 
         if self.sensors[channel] == 'dale':
-            temp = self.dale_calib(resistance) * 1e-3  # We convert from mk to k
+            temp = self.dale_calib(resistance)
         else:
-            temp = self.ruo2_10k_calib(resistance) * 1e-3
+            temp = self.ruo2_10k_calib(resistance)
 
         # return whether we are overranged, the temperature, and the channel measured
         return temp
 
     def read_write_data(self, rx, tx):
         """
-        Writes a single bit to the shift register, and receives the corresponding bit from the AVS
+        Writes the bits to the shift register, and receives the corresponding bits from the AVS
         """
-        # Iterate through the bits in the tx
-        for i in range(len(tx)):
-            # Set the clock pulse to 0
-            self.ser.rts = False
-
-            # Read the DI state
-            rx[i] = int(self.ser.cts)
-
-            # Set the DC state from the input signal
-            self.ser.dtr = bool(tx[i])
-
-            # sleep for a short while
-            # python is pretty slow, so we don't need it
-
-            # Set the clock pulse to 1
-            self.ser.rts = True
-
-            # sleep for a short while
-            # python is pretty slow, so we don't need it
-
-            # Set the clock pulse to 0
-            self.ser.rts = False
-
-            # Set the dataline to 0
-            self.ser.dtr = False
+        # The line transfer precomputes the line toggles of the exchange, and only sets lines that change
+        rx[:] = self.lines.transfer(tx)
 
     def strobe(self):
         """
         Strobes the device, must be run after sending address and after sending config
         """
-        # Loop 3 times
-        for _ in range(3):
-            # Set the clock pulse to 0
-            self.ser.rts = False
-
-            # Set the dataline to 0
-            self.ser.dtr = False
-
-            # sleep for a short while
-            # python is pretty slow, so we don't need it
-
-            # Set the dataline to 1
-            self.ser.dtr = True
-
-            # sleep for a short while
-            # python is pretty slow, so we don't need it
-
-            # Set the dataline to 0
-            self.ser.dtr = False
+        self.lines.strobe()
 
     def close(self):
         """
@@ -0,0 +1,268 @@
+"""
+Serial line protocol of the Picowatt AVS-47B AC Resistance Bridge (direct connection)
+The bridge is a shift register clocked by RTS, written through DTR and read through CTS.
+This module has no qcodes dependency, so it can be tested and benchmarked without the instrument.
+"""
+
+import sys
+
+# The 48 bit words sent to and received from the bridge, packed in integers
+# The first bit on the line is the most significant bit of the word
+# The config fields are at the same positions in both directions
+word_length = 48
+
+# Positions (of the least significant bit) and masks of the fields
+reference_voltage_shift, reference_voltage_mask = 32, 0xFFFF
+reference_address_shift, reference_address = 24, 0b11  # The address of the reference DAC is always 3
+input_shift, input_mask = 20, 0b11
+channel_shift, channel_mask = 17, 0b111
+display_shift, display_mask = 14, 0b111
+excitation_shift, excitation_mask = 11, 0b111
+range_shift, range_mask = 8, 0b111
+remote_shift = 6
+alarm_line_shift = 4
+
+# Fields of the measurement in the received word
+overrange_shift = 42
+polarity_shift = 41
+msd_shift = 40
+digit_shifts = (36, 32, 28, 24)
+
+# Resistance of one ADC count on each range
+range_scales = [10 ** (r - 5) for r in range(8)]
+
+
+# Pack a config into a word
+def encode_tx(reference_voltage, input_mode, channel, display, excitation, range_code, remote, alarm_line):
+    return ((int(reference_voltage) & reference_voltage_mask) << reference_voltage_shift
+            | reference_address << reference_address_shift
+            | (int(input_mode) & input_mask) << input_shift
+            | (int(channel) & channel_mask) << channel_shift
+            | (int(display) & display_mask) << display_shift
+            | (int(excitation) & excitation_mask) << excitation_shift
+            | (int(range_code) & range_mask) << range_shift
+            | (int(remote) & 1) << remote_shift
+            | (int(alarm_line) & 1) << alarm_line_shift)
+
+
+# Unpack a received word
+# Returns overrange, resistance, adc value, input, channel, display, excitation and range
+def decode_rx(word):
+    # The 4.5 digit BCD number from the ADC
+    adc = 10000 * (word >> msd_shift & 1)
+    for shift, weight in zip(digit_shifts, (1000, 100, 10, 1)):
+        adc += weight * (word >> shift & 0xF)
+
+    # Set the sign (negative numbers are floats, like the original decoder)
+    if not word >> polarity_shift & 1:
+        adc *= -1.
+
+    range_out = word >> range_shift & range_mask
+    return (word >> overrange_shift & 1,
+            adc * range_scales[range_out],
+            adc,
+            word >> input_shift & input_mask,
+            word >> channel_shift & channel_mask,
+            word >> display_shift & display_mask,
+            word >> excitation_shift & excitation_mask,
+            range_out)
+
+
+# Convert between words and lists of bits (most significant bit first)
+def word_to_bits(word, n_bits=word_length):
+    return [word >> (n_bits - 1 - i) & 1 for i in range(n_bits)]
+
+
+def bits_to_word(bits):
+    word = 0
+    for bit in bits:
+        word = word << 1 | int(bit)
+
+    return word
+
+
+# Steps of a line sequence
+# A step is either setting a line, or reading the data line of the bridge
+READ_CTS = ('cts', None)
+
+
+# Builds the line sequence of an exchange, given the state of the lines before it starts
+# Writes the tx bits and reads one bit for each, returns the steps and the state of the lines afterwards
+# The waveform is the same as the original bit-by-bit implementation: DTR is set for the bit, RTS is pulsed,
+# and DTR is returned low after every bit
+# Only sets that don't change a line are skipped (RTS is already low, and DTR is already low for 0 bits)
+def build_exchange_sequence(tx, rts=None, dtr=None):
+    steps = []
+
+    # Make sure the clock starts low
+    if rts is not False:
+        steps.append(('rts', False))
+        rts = False
+
+    for bit in tx:
+        # Read the bit the bridge is shifting out
+        steps.append(READ_CTS)
+
+        # Set the data line, if it changes (it's low after the first bit)
+        if dtr is not bool(bit):
+            dtr = bool(bit)
+            steps.append(('dtr', dtr))
+
+        # Pulse the clock
+        steps.append(('rts', True))
+        steps.append(('rts', False))
+
+        # Return the data line low
+        if dtr:
+            steps.append(('dtr', False))
+            dtr = False
+
+    return steps, rts, dtr
+
+
+# Same as above, for the bits of a word
+def build_word_exchange_sequence(word, n_bits, rts=None, dtr=None):
+    return build_exchange_sequence(word_to_bits(word, n_bits), rts, dtr)
+
+
+# Builds the line sequence of a strobe (three pulses on the data line with the clock low)
+def build_strobe_sequence(rts=None, dtr=None):
+    steps = []
+
+    # The clock is low during the strobe
+    if rts is not False:
+        steps.append(('rts', False))
+        rts = False
+
+    for _ in range(3):
+        # Start with the data line low
+        if dtr is not False:
+            steps.append(('dtr', False))
+
+        # Pulse the data line
+        steps.append(('dtr', True))
+        steps.append(('dtr', False))
+        dtr = False
+
+    return steps, rts, dtr
+
+
+# Runs line sequences through the pyserial modem line properties (works on every platform)
+# The sequences are cached, since the same address and config are sent over and over
+class SerialLineTransfer():
+    def __init__(self, ser):
+        self.ser = ser
+
+        # The state of the lines, None until we have set them
+        self.rts = None
+        self.dtr = None
+
+        # Cache of sequences keyed by the tx bits and the state of the lines
+        self.sequences = {}
+
+    # Get a sequence from the cache (or build it)
+    def get_sequence(self, key, builder, *args):
+        key = (key, self.rts, self.dtr)
+        if key not in self.sequences:
+            self.sequences[key] = builder(*args, rts=self.rts, dtr=self.dtr)
+
+        steps, self.rts, self.dtr = self.sequences[key]
+        return steps
+
+    # Writes the tx bits, and returns the bits read from the bridge
+    def transfer(self, tx):
+        tx = tuple(int(bit) for bit in tx)
+        return self.run(self.get_sequence(tx, build_exchange_sequence, tx))
+
+    # Writes a word of n_bits bits, and returns the word read from the bridge
+    def transfer_word(self, word, n_bits=word_length):
+        steps = self.get_sequence(('word', word, n_bits), build_word_exchange_sequence, word, n_bits)
+        return bits_to_word(self.run(steps))
+
+    def strobe(self):
+        self.run(self.get_sequence('strobe', build_strobe_sequence))
+
+    def run(self, steps):
+        # Look up the serial port once
+        ser = self.ser
+        rx = []
+
+        for line, value in steps:
+            if line == 'cts':
+                rx.append(int(ser.cts))
+            elif line == 'rts':
+                ser.rts = value
+            else:
+                ser.dtr = value
+
+        return rx
+
+
+# Runs line sequences with raw modem ioctls on the file descriptor of the port (Linux only)
+# Each step is one syscall, without the python overhead of the pyserial properties
+class IoctlLineTransfer(SerialLineTransfer):
+    def __init__(self, ser, ioctl=None):
+        super().__init__(ser)
+
+        import fcntl
+        import struct
+        import termios
+
+        # The ioctl can be replaced (used by the benchmark to run without a port)
+        self.ioctl = fcntl.ioctl if ioctl is None else ioctl
+        self.struct = struct
+        self.TIOCMGET = termios.TIOCMGET
+        self.TIOCMSET = termios.TIOCMSET
+        self.TIOCM_RTS = termios.TIOCM_RTS
+        self.TIOCM_DTR = termios.TIOCM_DTR
+        self.TIOCM_CTS = termios.TIOCM_CTS
+
+        # Packed buffers for the four states of RTS and DTR (other modem lines are kept as they are)
+        self.fd = ser.fileno()
+        lines = self.get_modem_lines()
+        other_lines = lines & ~(self.TIOCM_RTS | self.TIOCM_DTR)
+        self.states = {}
+        for rts in (False, True):
+            for dtr in (False, True):
+                self.states[(rts, dtr)] = struct.pack('I', other_lines | (self.TIOCM_RTS if rts else 0)
+                                                      | (self.TIOCM_DTR if dtr else 0))
+
+        # The steps only set one line, so we keep track of the actual state of both
+        self.line_state = (bool(lines & self.TIOCM_RTS), bool(lines & self.TIOCM_DTR))
+
+    def get_modem_lines(self):
+        return self.struct.unpack('I', self.ioctl(self.fd, self.TIOCMGET, self.struct.pack('I', 0)))[0]
+
+    def run(self, steps):
+        # Look up everything once, this loop runs for every bit
+        ioctl, fd, states, unpack = self.ioctl, self.fd, self.states, self.struct.unpack
+        TIOCMGET, TIOCMSET, TIOCM_CTS = self.TIOCMGET, self.TIOCMSET, self.TIOCM_CTS
+        zero = self.struct.pack('I', 0)
+
+        rts, dtr = self.line_state
+        rx = []
+
+        for line, value in steps:
+            if line == 'cts':
+                rx.append(int(bool(unpack('I', ioctl(fd, TIOCMGET, zero))[0] & TIOCM_CTS)))
+                continue
+            elif line == 'rts':
+                rts = value
+            else:
+                dtr = value
+
+            ioctl(fd, TIOCMSET, states[(rts, dtr)])
+
+        self.line_state = (rts, dtr)
+        return rx
+
+
+# Pick the fastest transfer available for the serial port
+def make_line_transfer(ser):
+    if sys.platform.startswith('linux'):
+        try:
+            return IoctlLineTransfer(ser)
+        except (ImportError, OSError, AttributeError, ValueError):
+            pass
+
+    return SerialLineTransfer(ser)
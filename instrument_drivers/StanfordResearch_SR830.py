@@ -0,0 +1,92 @@
+"""
+QCodes driver for Stanford Research SR830 lock-in amplifier, with continuous buffer streaming.
+Extends the QCodes driver, the buffer keeps filling and is read in parts with TRCB (binary floats).
+"""
+
+import time
+
+import numpy as np
+from qcodes.instrument_drivers.stanford_research.SR830 import SR830 as QcodesSR830
+
+
+class SR830(QcodesSR830):
+    # Number of points the buffer holds (for each channel)
+    buffer_capacity = 16383
+
+    def __init__(self, name, address, **kwargs):
+        super().__init__(name, address, **kwargs)
+
+        # The sample rate of the running stream (Hz), and when it started
+        self.stream_rate = None
+        self.stream_start_time = None
+
+    def start_stream(self):
+        """
+        Clears the buffer and starts filling it at the buffer sample rate, until it's full
+        Returns the sample rate (Hz)
+        """
+        rate = self.buffer_SR.get()
+        if rate == 'Trigger':
+            raise ValueError('The buffer must be sampled at a fixed rate to stream it')
+
+        # Single shot (stop when full), and don't start on a trigger
+        self.write('SEND 0')
+        self.write('TSTR 0')
+
+        # Clear the buffer and start filling it
+        self.buffer_reset()
+        self.buffer_start()
+
+        self.stream_rate = float(rate)
+        self.stream_start_time = time.time()
+
+        return self.stream_rate
+
+    def get_stream_count(self):
+        """
+        The number of points in the buffer
+        """
+        return int(self.ask('SPTS?'))
+
+    def read_stream_channel(self, channel, start, n_points, out=None):
+        """
+        Reads n_points of a channel from the buffer, starting at the point start
+        The points are sent as little endian floats (TRCB) in one binary transfer, without converting them to text
+        If out is given, the points are written to it (it must hold at least n_points), otherwise a new array is made
+        """
+        self.write(f'TRCB? {channel}, {start}, {n_points}')
+
+        # The floats can contain the termination character (a line feed byte), so it's turned off and we read until END
+        # The transfer has no terminator, it ends with EOI on the last byte
+        # One more byte is allowed, so a terminator sent after the floats (like the simulation does) is read as well
+        with self.visa_handle.read_termination_context(''):
+            data = self.visa_handle.read_bytes(4 * n_points + 1, break_on_termchar=True)
+
+        values = np.frombuffer(data, dtype='<f4', count=n_points)
+
+        if out is None:
+            return values.astype(float)
+
+        # Converts to the type of out while copying, so there are no temporary arrays
+        out[:n_points] = values
+        return out[:n_points]
+
+    def read_stream(self, start, n_points, out=None):
+        """
+        Reads n_points of both channels from the buffer, starting at the point start
+        Returns an array of shape (2, n_points), written to out if it's given
+        """
+        if out is None:
+            out = np.empty((2, n_points))
+
+        for channel in [1, 2]:
+            self.read_stream_channel(channel, start, n_points, out[channel - 1])
+
+        return out[:, :n_points]
+
+    def read_buffer(self, out=None):
+        """
+        Reads every point in the buffer of both channels (instead of prepare_buffer_readout and the databuffers)
+        Returns an array of shape (2, points in the buffer), written to out if it's given
+        """
+        return self.read_stream(0, self.get_stream_count(), out)
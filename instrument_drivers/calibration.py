@@ -0,0 +1,147 @@
+"""
+Calibrations to convert between resistance [in ohms] and temperature
+The calibration files are turned into lookup tables, which are uniform in log(resistance).
+Converting is then a single vectorized index and linear interpolation, for any number of sensors at once.
+The tables are cached on disk, keyed by the hash of the calibration file and the table settings.
+Resistances outside the calibration are clamped to the ends of the table.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+# Folder to cache the compiled tables in (ignored by git)
+cache_dir = os.path.join(os.path.dirname(__file__), 'avs_calibration_files', '.cache')
+
+# Bump this when the way tables are built changes, so old caches are not used
+cache_version = 1
+
+# Number of points in a table
+default_n_points = 4096
+
+
+# A lookup table for a single sensor
+class CalibrationTable():
+    def __init__(self, log_r_min, log_r_step, temperatures):
+        self.log_r_min = float(log_r_min)
+        self.log_r_step = float(log_r_step)
+        self.temperatures = np.asarray(temperatures, dtype=float)
+
+    # Convert a resistance (or an array of them) to temperature
+    def convert(self, resistance):
+        r = np.asarray(resistance, dtype=float)
+
+        # Position in the table, clamped to the ends
+        x = (np.log(np.maximum(r, 1e-300)) - self.log_r_min) / self.log_r_step
+        x = np.clip(x, 0, len(self.temperatures) - 1)
+
+        # Interpolate between the neighbouring points
+        i = np.minimum(x.astype(int), len(self.temperatures) - 2)
+        frac = x - i
+        t = self.temperatures[i] * (1 - frac) + self.temperatures[i + 1] * frac
+
+        # Return a float for a single resistance
+        return float(t) if t.ndim == 0 else t
+
+    # Alias, so the table can be used like the splines it replaces
+    __call__ = convert
+
+
+# The lookup tables of several sensors, so a whole scan can be converted in one call
+# All tables must have the same number of points
+class CalibrationSet():
+    def __init__(self, tables):
+        self.tables = list(tables)
+        self.log_r_min = np.array([table.log_r_min for table in self.tables])
+        self.log_r_step = np.array([table.log_r_step for table in self.tables])
+        self.temperatures = np.vstack([table.temperatures for table in self.tables])
+        self.n_points = self.temperatures.shape[1]
+
+    def __len__(self):
+        return len(self.tables)
+
+    def __getitem__(self, sensor):
+        return self.tables[sensor]
+
+    # Convert resistances to temperatures, sensors holds the index of the table to use for each resistance
+    # Both can be arrays of any (broadcastable) shape
+    def convert(self, sensors, resistances):
+        sensors = np.asarray(sensors, dtype=int)
+        r = np.asarray(resistances, dtype=float)
+
+        # Position in the tables, clamped to the ends
+        x = (np.log(np.maximum(r, 1e-300)) - self.log_r_min[sensors]) / self.log_r_step[sensors]
+        x = np.clip(x, 0, self.n_points - 1)
+
+        # Interpolate between the neighbouring points
+        i = np.minimum(x.astype(int), self.n_points - 2)
+        frac = x - i
+        t = self.temperatures[sensors, i] * (1 - frac) + self.temperatures[sensors, i + 1] * frac
+
+        return float(t) if t.ndim == 0 else t
+
+
+# Build a table from calibration points
+# method is 'linear' (like np.interp) or 'spline' (like scipy's CubicSpline)
+def build_table(resistances, temperatures, method='linear', n_points=default_n_points):
+    # Sort by resistance
+    sort = np.argsort(resistances)
+    resistances = np.asarray(resistances, dtype=float)[sort]
+    temperatures = np.asarray(temperatures, dtype=float)[sort]
+
+    # The grid of the table is uniform in log(resistance)
+    log_r = np.linspace(np.log(resistances[0]), np.log(resistances[-1]), n_points)
+    grid = np.exp(log_r)
+
+    # Ensure the ends are exactly at the calibration points
+    grid[0], grid[-1] = resistances[0], resistances[-1]
+
+    # Evaluate the calibration on the grid
+    if method == 'spline':
+        from scipy.interpolate import CubicSpline
+        table_temperatures = CubicSpline(resistances, temperatures)(grid)
+    elif method == 'linear':
+        table_temperatures = np.interp(grid, resistances, temperatures)
+    else:
+        raise ValueError(f'Unknown calibration method: {method}')
+
+    return CalibrationTable(log_r[0], log_r[1] - log_r[0], table_temperatures)
+
+
+# Load a calibration file and turn it into a table (from the cache if it's there)
+# r_column and t_column are the columns of the file holding the resistance and the temperature
+# The temperatures are multiplied by scale (use 1e-3 to convert from mK to K)
+def load_calibration(path, r_column, t_column, delimiter=None, method='linear', scale=1.0,
+                     n_points=default_n_points, use_cache=True):
+    # The key is the hash of the file and every setting that changes the table
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read())
+    digest.update(repr((cache_version, r_column, t_column, method, scale, n_points)).encode())
+    cache_file = os.path.join(cache_dir, digest.hexdigest() + '.npz')
+
+    # Try the cache first
+    if use_cache and os.path.exists(cache_file):
+        try:
+            with np.load(cache_file) as cached:
+                return CalibrationTable(cached['log_r_min'], cached['log_r_step'], cached['temperatures'])
+        except (OSError, KeyError, ValueError):
+            # A broken cache file is rebuilt below
+            pass
+
+    # Parse the file and build the table
+    calib = np.loadtxt(path, delimiter=delimiter)
+    table = build_table(calib[:, r_column], calib[:, t_column] * scale, method, n_points)
+
+    # Save it for next time (the cache is only an optimization, so failing to write it is fine)
+    if use_cache:
+        try:
+            # Write to a temporary file first, so a crash never leaves half a table in the cache
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(cache_file + '.tmp', 'wb') as f:
+                np.savez(f, log_r_min=table.log_r_min, log_r_step=table.log_r_step, temperatures=table.temperatures)
+            os.replace(cache_file + '.tmp', cache_file)
+        except OSError as e:
+            print('Could not cache calibration', path, e)
+
+    return table
@@ -0,0 +1,129 @@
+# Import asyncio to run a sampling loop for each source
+import asyncio
+
+# Import time to timestamp the samples
+import time
+
+# Import the ring buffers the samples are kept in
+from ring_buffer import RingBuffer
+
+
+# Samples every source of an acquisition scheduler continuously, each at its own interval, into ring buffers
+# Everything else (measurements, updates to the browser, saving) reads from the buffers,
+# so the instruments are only queried by the daemon
+class AcquisitionDaemon():
+    def __init__(self, scheduler, intervals, capacity=3600):
+        self.scheduler = scheduler
+
+        # Seconds between the samples of each source
+        self.intervals = dict(intervals)
+        self.capacity = capacity
+
+        # A ring buffer for each source, created with the fields of the source, or the fields of the first sample
+        self.buffers = {}
+        for name in self.intervals:
+            fields = self.scheduler.sources[name]['fields']
+            if fields is not None:
+                self.buffers[name] = RingBuffer(fields, self.capacity)
+
+        # The sampling loop of each source
+        self.tasks = {}
+
+    # Check if the daemon is sampling
+    def is_running(self):
+        return len(self.tasks) > 0
+
+    # Start sampling every source (does nothing if it's already running)
+    def start(self):
+        for name in self.intervals:
+            if name not in self.tasks:
+                self.tasks[name] = asyncio.ensure_future(self.sample_source(name))
+
+    # Stop sampling
+    def stop(self):
+        for task in self.tasks.values():
+            task.cancel()
+
+        self.tasks = {}
+
+    # Sample a source forever
+    async def sample_source(self, name):
+        while True:
+            start = time.time()
+            try:
+                values = await self.scheduler.read_source(name)
+
+                # The sample is timestamped in the middle of the read
+                self.append(name, (start + time.time()) / 2, values)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f'Could not sample {name}:', e)
+
+            # Wait until the next sample is due
+            await asyncio.sleep(max(self.intervals[name] - (time.time() - start), 0.01))
+
+    # Save a sample of a source
+    def append(self, name, timestamp, values):
+        if name not in self.buffers:
+            self.buffers[name] = RingBuffer(values.keys(), self.capacity)
+
+        self.buffers[name].append(timestamp, values)
+
+    # The time of the latest sample of a source (None if it has no samples)
+    def latest_time(self, name):
+        if name not in self.buffers or self.buffers[name].count == 0:
+            return None
+
+        return self.buffers[name].latest()['timestamp']
+
+    # The sources (all of them if none are given) without a sample timestamped at or after a time
+    def missing(self, sources=None, after=-float('inf')):
+        return [name for name in sources or self.intervals
+                if self.latest_time(name) is None or self.latest_time(name) < after]
+
+    # Wait until every source (or the ones given) has at least one sample
+    # Returns False if a source has no samples before the timeout (seconds), an instrument may never answer
+    async def wait_for_samples(self, sources=None, timeout=None):
+        return await self.wait_for_samples_after(-float('inf'), sources, timeout)
+
+    # Wait until every source (or the ones given) has a sample timestamped at or after a time
+    # Returns False if a source has no such sample before the timeout (seconds)
+    async def wait_for_samples_after(self, after, sources=None, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        while len(self.missing(sources, after)) > 0:
+            if deadline is not None and time.time() > deadline:
+                return False
+
+            await asyncio.sleep(0.1)
+
+        return True
+
+    # The latest sample of the sources (all of them if none are given), merged into one record
+    # The record is timestamped with the oldest of the samples, sources without samples have their fields as None
+    def latest(self, sources=None):
+        record = {}
+        timestamps = []
+        for name in sources or self.intervals:
+            if self.latest_time(name) is None:
+                if name in self.buffers:
+                    record.update({field: None for field in self.buffers[name].fields})
+                continue
+
+            sample = self.buffers[name].latest()
+            timestamps.append(sample.pop('timestamp'))
+            record.update(sample)
+
+        record['timestamp'] = min(timestamps) if len(timestamps) > 0 else time.time()
+        return record
+
+    # The mean of the sources over a time window, merged into one record timestamped with the end of the window
+    # Sources without samples in the window use their latest sample before the end (None if they have none)
+    def window(self, start, end, sources=None):
+        record = {}
+        for name in sources or self.intervals:
+            if name in self.buffers:
+                record.update(self.buffers[name].window_mean(start, end))
+
+        record['timestamp'] = end
+        return record
@@ -0,0 +1,21 @@
+# Reads a number of sources (usually one instrument each), while reserving the instruments of the source
+# Every instrument has its own lane and thread, so the sources can be read in parallel
+class AcquisitionScheduler():
+    def __init__(self, lanes):
+        self.lanes = lanes
+
+        # The sources, each with an awaitable returning a dict of values, and the instruments it reserves
+        self.sources = {}
+
+    # Add a source, read is an awaitable returning a dict of values
+    # The instruments are reserved while the source is read, so read must not reserve them itself
+    # The fields are the keys of the values, if they are given the source has them (as None) before its first sample
+    def add_source(self, name, read, instruments=(), fields=None):
+        self.sources[name] = {'read': read, 'instruments': tuple(instruments),
+                              'fields': None if fields is None else list(fields)}
+
+    # Read a single source, while reserving its instruments
+    async def read_source(self, name):
+        source = self.sources[name]
+        async with self.lanes.use(*source['instruments']):
+            return await source['read']()
@@ -7,11 +7,28 @@ import os
 # Import uuid to access a machine id
 import uuid
 
+# Import itertools to count the tasks (keeps tasks of the same priority in order)
+import itertools
+
 from keep_python_alive_win import WindowsInhibitor
 
+# Import the lanes, so each instrument only runs one command at a time
+from instrument_lanes import InstrumentLanes
+
 
 class BaseQueueClass():
-    n_workers = 4
+    # Workers only pick tasks from the queue, the instrument lanes decide what can run at the same time
+    # So we keep enough workers around that a task waiting for a busy instrument does not stall the others
+    n_workers = 8
+
+    # Tasks are processed by class, lower numbers go first
+    # Measurements are never delayed by the browser asking for updates
+    task_priorities = {
+        'measurement': 0,
+        'control': 1,
+        'ui': 2,
+        'background': 3
+    }
 
     def __init__(self, socket_client):
         super().__init__()
@@ -22,12 +39,23 @@ class BaseQueueClass():
         # Setup the queue variables
         self.queue = None
         self.worker_instances = []
+        self.task_counter = itertools.count()
 
-        # Initialize queue processors
+        # Initialize queue processors, along with their task class and whether duplicates are coalesced
         self.queue_functions = {}
+        self.queue_task_classes = {}
+        self.queue_instruments = {}
+        self.coalesced_functions = set()
+
+        # Setup the instrument lanes
+        self.lanes = InstrumentLanes()
+
+        # Keep track of the coalesced tasks waiting in the queue
+        self.pending_coalesced_tasks = set()
 
         # Add rerun background job
-        self.register_queue_processor('rerun_background_job', self.rerun_background_job)
+        self.register_queue_processor('rerun_background_job', self.rerun_background_job,
+                                      task_class='background', coalesce=True)
 
 
     @property
@@ -37,19 +65,23 @@ class BaseQueueClass():
     # Define the interface for the worker
     async def worker(self, name, queue):
         while True:
-            # Get an objective
-            task = await queue.get()
+            # Get an objective (the priority and counter are only used for sorting)
+            _, _, task = await queue.get()
 
-            # Execute the task
+            # A coalesced task can be queued again as soon as it starts running
+            self.pending_coalesced_tasks.discard(self.coalesce_key(task))
+
+            # Execute the task, while reserving the instruments it uses
             try:
-                await self.queue_functions[task['function_name']](queue, name, task)
+                async with self.lanes.use(*self.queue_instruments.get(task['function_name'], ())):
+                    await self.queue_functions[task['function_name']](queue, name, task)
             except Exception as e:
                 # Exceptions happen here when the namespace is not ready for example
                 # So we put it on the queue again
                 print('got exception on queue task:', task['function_name'])
                 print(e)
 
-                await self.queue.put(task)
+                await self.put_task(task)
 
                 # Disconnect and reconnect here to prevent namespace errors
                 await self.socket_client.disconnect()
@@ -59,22 +91,72 @@ class BaseQueueClass():
             queue.task_done()
 
     # Register functions that can process things from the queue
-    def register_queue_processor(self, name, function):
+    # The task class sets the priority of the task (see task_priorities)
+    # Coalesced tasks are dropped if the same task (same function and arguments) is already waiting in the queue,
+    # use it for tasks where running once is as good as running twice (such as getting a trace)
+    # The instruments are reserved while the task runs, long tasks (such as measurements)
+    # should not declare any, and reserve the instruments as they need them instead
+    def register_queue_processor(self, name, function, task_class='ui', coalesce=False, instruments=()):
         self.queue_functions[name] = function
+        self.queue_task_classes[name] = task_class
+        self.queue_instruments[name] = tuple(instruments)
+
+        if coalesce:
+            self.coalesced_functions.add(name)
+
+    # The key a coalesced task is matched on, the function and all the arguments of the task
+    # A task with other arguments is other work, so it is never dropped for a waiting one
+    @staticmethod
+    def coalesce_key(task):
+        return task['function_name'], repr(sorted(task.items()))
+
+    # Put a task on the queue, sorted by the priority of its task class
+    async def put_task(self, task):
+        function_name = task['function_name']
+
+        # Drop duplicates of coalesced tasks, the one already waiting does the same work
+        if function_name in self.coalesced_functions:
+            key = self.coalesce_key(task)
+            if key in self.pending_coalesced_tasks:
+                return
+
+            self.pending_coalesced_tasks.add(key)
+
+        # Look up the priority (unknown tasks are treated as ui tasks)
+        priority = self.task_priorities[self.queue_task_classes.get(function_name, 'ui')]
+
+        # The counter keeps tasks with the same priority in order, and ensures the dicts are never compared
+        await self.queue.put((priority, next(self.task_counter), task))
 
     # Create a queue, has to be
     def create_queue(self):
         # Create a queue that we will use to store our "workload".
-        self.queue = asyncio.Queue()
+        self.queue = asyncio.PriorityQueue()
 
         # Create a worker to process the items in our queue
         for i in range(0, self.n_workers):
             self.worker_instances.append(asyncio.create_task(self.worker(f'{self.queue_name}-worker-{i}', self.queue)))
 
-    # Kills the worker and cleans up after it
+    # Kills the workers and cleans up after them
     async def destroy_queue(self):
-        self.worker_instance.cancel()
-        await asyncio.gather(self.worker_instance, return_exceptions=True)
+        for worker_instance in self.worker_instances:
+            worker_instance.cancel()
+
+        await asyncio.gather(*self.worker_instances, return_exceptions=True)
+        self.worker_instances = []
+        self.pending_coalesced_tasks.clear()
+
+    # Make every instrument of a station available as awaitable proxies in self.io
+    # Blocking instrument calls should always go through these, so they run in the thread of the instrument
+    def setup_async_instruments(self, station):
+        self.io = {}
+        for name, instrument in station.components.items():
+            self.io[name] = self.lanes.wrap(name, instrument)
+
+    # Run a queue function while reserving an instrument (used when running queue functions inside other tasks)
+    async def reserve_and_run(self, instrument, function, queue, name, task):
+        async with self.lanes.use(instrument):
+            return await function(queue, name, task)
 
     # Runs the background job
     async def rerun_background_job(self, queue, name, task):
@@ -111,7 +193,7 @@ class BaseClientNamespace(socketio.AsyncClientNamespace):
 
     # Helper function to append to the queue
     async def append_to_queue(self, data):
-        await self.my_queue.queue.put(data)
+        await self.my_queue.put_task(data)
 
     # Event received when size of queue is required
     # Returns the size immediately
@@ -0,0 +1,95 @@
+# Import time to keep track of the age of the readings
+import time
+
+
+# The channels of the resistance bridge, with the name of the temperature and the target interval (seconds)
+# The still changes quickly, while the mixing chamber sensors change slowly
+default_bridge_channels = {
+    1: {'name': 't_still', 'interval': 10.0},
+    2: {'name': 't_mixing_chamber_1', 'interval': 30.0},
+    3: {'name': 't_mixing_chamber_2', 'interval': 30.0}
+}
+
+
+# Decides which channels of the resistance bridge to read, and in which order
+# Switching the multiplexer costs settling time, so each channel is only read when its interval has passed,
+# and we start with the channel the bridge is already on.
+# Channels that are not read keep their last value, along with the age of it
+class BridgeChannelScheduler():
+    def __init__(self, channels=None, control_channel=None, control_boost=3.0, early_fraction=0.5):
+        # Copy the config, so changes don't leak into the defaults
+        self.channels = {ch: dict(config) for ch, config in (channels or default_bridge_channels).items()}
+
+        # The channel used for temperature control is read control_boost times as often
+        self.control_channel = control_channel
+        self.control_boost = control_boost
+
+        # The channel the bridge is on is read if this fraction of its interval has passed (it's free to read)
+        self.early_fraction = early_fraction
+
+        # The latest value of each channel, and when it was read
+        self.values = {ch: None for ch in self.channels}
+        self.read_times = {ch: None for ch in self.channels}
+
+        # The channel the bridge is currently on
+        self.current_channel = None
+
+    # Change the target interval of a channel
+    def set_interval(self, channel, interval):
+        self.channels[channel]['interval'] = float(interval)
+
+    # Change which channel is used for temperature control (None for no channel)
+    def set_control_channel(self, channel):
+        self.control_channel = channel
+
+    # The target interval of a channel
+    def get_interval(self, channel):
+        interval = self.channels[channel]['interval']
+        if channel == self.control_channel:
+            interval /= self.control_boost
+
+        return interval
+
+    # The age of the latest value of a channel (infinite if it was never read)
+    def get_age(self, channel, now=None):
+        if self.read_times[channel] is None:
+            return float('inf')
+
+        return (time.time() if now is None else now) - self.read_times[channel]
+
+    # The channels to read now, in the order to read them
+    def plan(self, now=None):
+        now = time.time() if now is None else now
+
+        # The channels whose interval has passed, the most overdue first
+        due = [ch for ch in self.channels if self.get_age(ch, now) >= self.get_interval(ch)]
+        due.sort(key=lambda ch: self.get_age(ch, now) / self.get_interval(ch), reverse=True)
+
+        # Start with the channel the bridge is on, since reading it needs no switch
+        current = self.current_channel
+        if current in self.channels:
+            if current in due:
+                due.remove(current)
+                due.insert(0, current)
+            elif len(due) > 0 and self.get_age(current, now) >= self.early_fraction * self.get_interval(current):
+                # We have to switch away anyway, so read it early instead of switching back to it soon
+                due.insert(0, current)
+
+        return due
+
+    # Save a reading of a channel
+    def record(self, channel, value, now=None):
+        self.values[channel] = value
+        self.read_times[channel] = time.time() if now is None else now
+        self.current_channel = channel
+
+    # The latest values and their ages, keyed by the name of the temperature
+    # The age is saved as '<name>_age' (seconds, None if the channel was never read)
+    def get_temperatures(self, now=None):
+        now = time.time() if now is None else now
+        temperatures = {}
+        for ch, config in self.channels.items():
+            temperatures[config['name']] = self.values[ch]
+            temperatures[config['name'] + '_age'] = None if self.read_times[ch] is None else self.get_age(ch, now)
+
+        return temperatures
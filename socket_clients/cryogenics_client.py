@@ -10,7 +10,7 @@ import os
 # import pandas to support HDF5
 import pandas as pd
 
-# Import time module for startup reference, and import deque to store temperatures and pressures
+# Import time module for startup reference, and import deque to keep the bridge readout times
 import time, sys, os
 from collections import deque
 
@@ -20,6 +20,19 @@ sys.path.append(os.path.dirname(__file__) + '/..')
 # Import the base namespace, contains shared methods and information
 from baseclient import BaseClientNamespace, BaseQueueClass, main
 
+# Import the scheduler of the resistance bridge channels
+from bridge_scheduler import BridgeChannelScheduler
+
+# Import the engine running the valve procedures of the GHS
+from ghs_procedures import PressureStream, GHSProcedureRunner
+
+# Import the scheduler reading the instruments in parallel, and the daemon sampling them continuously
+from acquisition_scheduler import AcquisitionScheduler
+from acquisition_daemon import AcquisitionDaemon
+
+# Import the ring buffers keeping the temperature and pressure history
+from ring_buffer import ColumnarRingBuffer
+
 if os.getenv('USE_FAKE_STATIONS') is None:
     # Import cryogenics station to collect data
     from stations import cryogenics_station
@@ -27,10 +40,17 @@ else:
     # Import the mocked magnetism station
     from stations.fake_stations import cryogenics_station_fake as cryogenics_station
 
+# Number of temperature and pressure samples kept in the history (12 hours at one sample every 5 seconds)
+history_capacity = 8640
+
+# The most samples sent when a trace is resynced
+trace_resync_samples = 1000
+
 # Experiments are naturally stateful, and we must remember some things
+# The sequence number of a temperature or pressure sample is its index in the history
 experiment_state = {
-    'temperatures': deque(maxlen=50),  # initialize a double ended queues
-    'pressures': deque(maxlen=50),
+    'temperatures': ColumnarRingBuffer(capacity=history_capacity),
+    'pressures': ColumnarRingBuffer(capacity=history_capacity),
     'startup_time': time.time(),
     'current_step': {'step_done': True},
     'next_step': {},
@@ -40,12 +60,48 @@ experiment_state = {
 }
 
 
+# Seconds between polls of the alarm line of the resistance bridge
+bridge_poll_interval = 0.1
+
+# We start polling a channel at this fraction of its learned settling time
+bridge_settle_margin = 0.8
+
+# Weight of the newest settling time when learning the settling time of a channel
+bridge_settle_weight = 0.3
+
+# Minimum seconds between reads of the GHS pressures while a procedure waits for a pressure
+ghs_pressure_interval = 1.0
+
+# Seconds between the samples of each instrument in the acquisition daemon
+acquisition_intervals = {'dmm': 2.0, 'resistance_bridge': 1.0, 'ghs': 1.0, 'maxigauge': 1.0}
+
+# Number of samples of each instrument kept in the ring buffers
+acquisition_capacity = 3600
+
+# The longest time (seconds) a datapoint waits for every instrument to be sampled after the system stabilized
+fresh_sample_timeout = 30.0
+
+# The longest time (seconds) the updates wait for the first samples, an instrument that never answers is reported
+first_sample_timeout = 10.0
+
+# The temperatures read from the DMM, and the name of the sensor of each
+dmm_sensors = {
+    't_upper_hex': 'Upper HEx',
+    't_lower_hex': 'Lower HEx',
+    't_he_pot': 'He Pot CCS',
+    't_1st_stage': '1st stage',
+    't_2nd_stage': '2nd stage',
+    't_inner_coil': 'Inner Coil',
+    't_outer_coil': 'Outer Coil',
+    't_switch': 'Switch',
+    't_he_pot_2': 'He Pot'
+}
+
+
 # We have a class that creates a queue so we can expect things to happen in a specific order
 class CryoQueue(BaseQueueClass):
-    # Add a lock to wait for query on resistance to finish
-    running_query_on_resistance = False
-
     # Add adjustable delay parameter for the resistance bridge (seconds)
+    # The bridge is read as soon as the alarm line says it's ready, so this only sets the timeout (20 delays)
     picowatt_delay = 3
 
     def __init__(self, socket_client):
@@ -59,31 +115,77 @@ class CryoQueue(BaseQueueClass):
         self.dmm = self.station.components['dmm']
         self.maxigauge = self.station.components['maxigauge']
 
+        # Learned settling time of each bridge channel after switching to it (seconds)
+        self.bridge_settle_times = {}
+
+        # Times of the latest bridge readouts, used to compute the sample rate
+        self.bridge_readout_times = deque(maxlen=30)
+
+        # Decides which bridge channels to read on each update (starting from the channel the bridge is on)
+        self.bridge_scheduler = BridgeChannelScheduler()
+        self.bridge_scheduler.current_channel = self.resistance_bridge.MultiplexerChannel.get_latest()
+
+        # Create awaitable versions of the instruments, the blocking calls run in a thread for each instrument
+        self.setup_async_instruments(self.station)
+
+        # The valve procedures of the GHS share a single stream of pressures
+        self.ghs_pressure_stream = PressureStream(self.read_ghs_pressures, min_interval=ghs_pressure_interval)
+        self.ghs_procedures = GHSProcedureRunner(self.press_ghs_buttons, self.ghs_pressure_stream)
+
+        # The temperatures and pressures are read from the four instruments in parallel
+        # The fields are given, so an instrument that never answers still has its values (as None)
+        self.acquisition = AcquisitionScheduler(self.lanes)
+        self.acquisition.add_source('dmm', self.read_dmm_temperatures, instruments=['dmm'],
+                                    fields=list(dmm_sensors))
+        self.acquisition.add_source('resistance_bridge', self.read_bridge_temperatures,
+                                    instruments=['resistance_bridge'],
+                                    fields=list(self.bridge_scheduler.get_temperatures()))
+        self.acquisition.add_source('ghs', self.read_frontpanel_pressures, instruments=['ghs'],
+                                    fields=[f'p_{i}' for i in range(1, 9)])
+        self.acquisition.add_source('maxigauge', self.read_maxigauge_pressures, instruments=['maxigauge'],
+                                    fields=['p_9', 'p_10'])
+
+        # The daemon samples all the instruments continuously, everything else reads its ring buffers
+        self.acquisition_daemon = AcquisitionDaemon(self.acquisition, acquisition_intervals, acquisition_capacity)
+
         # Register queue processors
-        self.register_queue_processor('configure_avs47b', self.configure_avs47b)
-        self.register_queue_processor('get_temperatures', self.get_temperatures)
+        self.register_queue_processor('configure_avs47b', self.configure_avs47b, task_class='control',
+                                      instruments=['resistance_bridge'])
+        self.register_queue_processor('get_temperatures', self.get_temperatures, coalesce=True)
         self.register_queue_processor('get_temperature_trace', self.get_temperature_trace)
-        self.register_queue_processor('update_temperatures', self.update_temperatures)
-        self.register_queue_processor('get_pressures', self.get_pressures)
+        self.register_queue_processor('update_temperatures', self.update_temperatures,
+                                      task_class='background', coalesce=True)
+        self.register_queue_processor('get_pressures', self.get_pressures, coalesce=True)
         self.register_queue_processor('get_pressure_trace', self.get_pressure_trace)
-        self.register_queue_processor('get_fp_status', self.get_fp_status)
-        self.register_queue_processor('update_pressures', self.update_pressures)
-        self.register_queue_processor('start_cooling', self.start_cooling)
-        self.register_queue_processor('get_mck_state', self.get_mck_state)
-        self.register_queue_processor('process_next_step', self.process_next_step)
-        self.register_queue_processor('get_avs47b_config', self.get_avs47b_config)
-        self.register_queue_processor('run_background_jobs', self.run_background_jobs)
-        self.register_queue_processor('start_circulation', self.start_circulation)
+        self.register_queue_processor('get_fp_status', self.get_fp_status, coalesce=True)
+        self.register_queue_processor('update_pressures', self.update_pressures,
+                                      task_class='background', coalesce=True)
+        self.register_queue_processor('start_cooling', self.start_cooling, task_class='control')
+        self.register_queue_processor('get_mck_state', self.get_mck_state, task_class='background', coalesce=True,
+                                      instruments=['tcs'])
+        self.register_queue_processor('process_next_step', self.process_next_step, task_class='measurement')
+        self.register_queue_processor('get_avs47b_config', self.get_avs47b_config, coalesce=True,
+                                      instruments=['resistance_bridge'])
+        self.register_queue_processor('configure_bridge_schedule', self.configure_bridge_schedule,
+                                      task_class='control')
+        self.register_queue_processor('run_background_jobs', self.run_background_jobs,
+                                      task_class='background', coalesce=True)
+        self.register_queue_processor('run_ghs_procedure', self.run_ghs_procedure, task_class='control')
 
     @property
     def queue_name(self):
         return 'CryoQueue'
 
     # Queue task to configure the avs47b
+    # The whole configuration runs in the thread of the bridge (the lane is reserved by the queue)
     async def configure_avs47b(self, queue, name, task):
-        # Grab the config
-        config = task['config']
+        await self.lanes.call('resistance_bridge', self.apply_avs47b_config, task['config'])
+
+        # The channel may have changed
+        self.bridge_scheduler.current_channel = self.resistance_bridge.MultiplexerChannel.get_latest()
 
+    # Set the parameters of the avs47b that are in the config, and send them to the bridge (blocking)
+    def apply_avs47b_config(self, config):
         # Create a list of accepted parameters
         params = ['InputMode', 'MultiplexerChannel', 'Range', 'Excitation', 'ReferenceVoltage', 'ReferenceSource', 'Magnification', 'Display']
 
@@ -99,8 +201,19 @@ class CryoQueue(BaseQueueClass):
         # Next we update our local config to reflect what the state of the device actually is
         self.resistance_bridge.send_config(True, True, False)
 
+    # Queue task to configure which bridge channels are read how often
+    # The config can contain 'intervals' ({channel: seconds}) and 'control_channel' (channel or None)
+    async def configure_bridge_schedule(self, queue, name, task):
+        config = task['config']
+
+        for channel, interval in config.get('intervals', {}).items():
+            self.bridge_scheduler.set_interval(int(channel), interval)
+
+        if 'control_channel' in config:
+            self.bridge_scheduler.set_control_channel(config['control_channel'])
+
     async def get_avs47b_config(self, queue, name, task):
-        self.resistance_bridge.send_config(True, True, False)
+        await self.io['resistance_bridge'].send_config(True, True, False)
 
         # Create a list of accepted parameters
         params = ['InputMode', 'MultiplexerChannel', 'Range', 'Excitation', 'ReferenceVoltage', 'ReferenceSource',
@@ -113,100 +226,157 @@ class CryoQueue(BaseQueueClass):
 
         await self.socket_client.emit('c_avs47b_got_config', config)
 
-    async def get_updated_temperatures(self, queue, name, task):
-        # Get temperatures
-        scan_data = self.dmm.scan_channels()
-        t_still = await self.query_resistance_bridge_for_temperature(1)
-        t_mixing_chamber_1 = await self.query_resistance_bridge_for_temperature(2)
-        t_mixing_chamber_2 = await self.query_resistance_bridge_for_temperature(3)
-
-        # Setup the dict containing the temperatures
-        temperatures = {
-            't_upper_hex': scan_data['Upper HEx'],
-            't_lower_hex': scan_data['Lower HEx'],
-            't_he_pot': scan_data['He Pot CCS'],
-            't_1st_stage': scan_data['1st stage'],
-            't_2nd_stage': scan_data['2nd stage'],
-            't_inner_coil': scan_data['Inner Coil'],
-            't_outer_coil': scan_data['Outer Coil'],
-            't_switch': scan_data['Switch'],
-            't_he_pot_2': scan_data['He Pot'],
-            't_still': t_still,
-            't_mixing_chamber_1': t_mixing_chamber_1,
-            't_mixing_chamber_2': t_mixing_chamber_2,
-            'timestamp': time.time() - experiment_state['startup_time'],
+    # Read the temperatures of the DMM, the DMM must be reserved by the caller
+    async def read_dmm_temperatures(self):
+        scan_data = await self.io['dmm'].scan_channels()
+
+        return {label: scan_data[sensor] for label, sensor in dmm_sensors.items()}
+
+    # Read the bridge channels that are due, the others keep their last value
+    # A channel without a measurement (overrange or timeout) is recorded as None, and tried again after its interval
+    # The bridge must be reserved by the caller
+    async def read_bridge_temperatures(self):
+        for channel in self.bridge_scheduler.plan():
+            resistance = await self.read_resistance_bridge_channel(channel)
+            temperature = None
+            if resistance is not None:
+                temperature = self.resistance_bridge.convert_to_temperature(channel, resistance)
+            self.bridge_scheduler.record(channel, temperature)
+
+        return self.bridge_scheduler.get_temperatures()
+
+    # Save the temperatures of an acquisition record (the values starting with t_)
+    def store_temperatures(self, record):
+        temperatures = {label: value for label, value in record.items() if label.startswith('t_')}
+        temperatures.update({
+            'timestamp': record['timestamp'] - experiment_state['startup_time'],
             'started': experiment_state['startup_time']
-        }
+        })
 
-        # Append the updated temperatures to the state
-        experiment_state['temperatures'].append(temperatures)
+        # Append the updated temperatures to the state, the sequence number is the index in the history
+        temperatures['seq'] = experiment_state['temperatures'].append(temperatures)
 
         # And return them
         return temperatures
 
-    async def query_resistance_bridge_for_temperature(self, channel):
-        # Wait until lock is released
-        while self.running_query_on_resistance:
-            await asyncio.sleep(0.2)
-
-        # Lock the bridge to this query
-        self.running_query_on_resistance = True
+    async def get_updated_temperatures(self, queue, name, task):
+        # The latest temperatures sampled by the acquisition daemon
+        await self.start_acquisition(queue, name, task)
+        await self.wait_for_first_samples(['dmm', 'resistance_bridge'])
+        return self.store_temperatures(self.acquisition_daemon.latest(['dmm', 'resistance_bridge']))
+
+    # Wait for the first samples of the sources, the sources that never answer are reported and left out (None)
+    async def wait_for_first_samples(self, sources=None, timeout=first_sample_timeout):
+        if not await self.acquisition_daemon.wait_for_samples(sources, timeout=timeout):
+            print('No samples from', ', '.join(self.acquisition_daemon.missing(sources)), 'yet, their values are None')
+
+    # Switch the bridge to a channel and read it as soon as the measurement is ready
+    # Returns None if the bridge is overranged or times out
+    # The bridge must be reserved by the caller
+    async def read_resistance_bridge_channel(self, channel):
+        # The settling time is only learned and used when the multiplexer switches
+        switched = self.resistance_bridge.MultiplexerChannel.get_latest() != channel
 
         # First we setup the query
-        self.resistance_bridge.setup_query_for_resistance(channel)
+        await self.io['resistance_bridge'].setup_query_for_resistance(channel)
+        start = time.time()
+        timeout = start + 20 * self.picowatt_delay
 
-        # Next we wait for the signal to become available
-        resistance = 0
-        for i in range(20):
-            # Sleep while the measurement populates
-            await asyncio.sleep(self.picowatt_delay)
+        # If we know how long the channel takes to settle, we don't poll until it's almost ready
+        if switched and channel in self.bridge_settle_times:
+            await asyncio.sleep(bridge_settle_margin * self.bridge_settle_times[channel])
 
-            # Get the resistance
-            m_complete, resistance, ch_out = self.resistance_bridge.query_for_resistance()
-
-            print('got results from ch', ch_out, 'when querying ch',
-                  channel, 'the resistance is', resistance, 'm', m_complete)
+        while time.time() < timeout:
+            # Poll the alarm line, the resistance is only read out once the alarm line says it's ready
+            m_complete, resistance, ch_out = await self.io['resistance_bridge'].query_for_resistance()
 
             # Return the resistance when the measurement is complete
             if m_complete:
-                break
+                self.record_bridge_readout(channel, time.time() - start, switched)
+                return resistance
+
+            # Every overranged poll is a full reconfiguration of the bridge, so we give up on the channel until
+            # it's due again instead of polling it until the timeout
+            if self.resistance_bridge.Overrange.get_latest():
+                print('The resistance bridge is overranged on ch', channel)
+                return None
+
+            await asyncio.sleep(bridge_poll_interval)
 
-        # Unlock the bridge
-        self.running_query_on_resistance = False
+        print('Timed out waiting for the resistance bridge on ch', channel)
+        return None
 
-        # Convert the resistance to temperature
-        return self.resistance_bridge.convert_to_temperature(channel, resistance)
+    # Learn the settling time of a channel after a switch of the multiplexer, and keep track of the sample rate
+    def record_bridge_readout(self, channel, settle_time, switched=True):
+        if switched:
+            if channel in self.bridge_settle_times:
+                settle_time = (bridge_settle_weight * settle_time
+                               + (1 - bridge_settle_weight) * self.bridge_settle_times[channel])
+            self.bridge_settle_times[channel] = settle_time
+
+        self.bridge_readout_times.append(time.time())
+
+    # The number of bridge readouts per second, over the latest readouts
+    def get_bridge_sample_rate(self):
+        if len(self.bridge_readout_times) < 2:
+            return 0.0
+
+        return (len(self.bridge_readout_times) - 1) / (self.bridge_readout_times[-1] - self.bridge_readout_times[0])
 
     # Queue task to retrieve temperatures
     async def update_temperatures(self, queue, name, task):
         # Update the temperatures
         await self.get_updated_temperatures(queue, name, task)
 
+        # Report how fast we are reading the bridge
+        print(f'resistance bridge: {self.get_bridge_sample_rate():.2f} readouts/s, settling times',
+              {ch: round(t, 2) for ch, t in self.bridge_settle_times.items()})
+
         # Send them to the server
         await self.get_temperatures(queue, name, task)
 
-    async def get_updated_pressures(self, queue, name, task):
-        # Query the frontpanel for updated pressures
-        self.ghs.get_all_params()
-
-        # Update the pressures dict
-        experiment_state['pressures'].append({
-            'p_1': self.ghs.pressure_p1.get_latest(),
-            'p_2': self.ghs.pressure_p2.get_latest(),
-            'p_3': self.ghs.pressure_p3.get_latest(),
-            'p_4': self.ghs.pressure_p4.get_latest(),
-            'p_5': self.ghs.pressure_p5.get_latest(),
-            'p_6': self.ghs.pressure_p6.get_latest(),
-            'p_7': self.ghs.pressure_p7.get_latest(),
-            'p_8': self.ghs.pressure_p8.get_latest(),
-            'p_9': self.maxigauge.get_pressure(5)[1],
-            'p_10': self.maxigauge.get_pressure(6)[1],
-            'timestamp': time.time() - experiment_state['startup_time'],
+    # Read the pressures of the front panel (only the pressures, the status is refreshed when it's asked for)
+    # The GHS must be reserved by the caller
+    async def read_frontpanel_pressures(self):
+        await self.io['ghs'].refresh('pressures')
+        ghs_pressures = self.get_ghs_pressures()
+
+        # Share the GHS pressures with the procedures waiting for them
+        self.ghs_pressure_stream.publish(ghs_pressures)
+
+        return {f'p_{i}': ghs_pressures[f'pressure_p{i}'] for i in range(1, 9)}
+
+    # Read the pressures of the maxigauge, the maxigauge must be reserved by the caller
+    async def read_maxigauge_pressures(self):
+        # All the maxigauge channels are read in one query, we use channels 5 and 6
+        _, maxigauge_pressures = await self.io['maxigauge'].get_all_pressures()
+        return {'p_9': float(maxigauge_pressures[4]), 'p_10': float(maxigauge_pressures[5])}
+
+    # Save the pressures of an acquisition record (the values starting with p_)
+    def store_pressures(self, record):
+        pressures = {label: value for label, value in record.items() if label.startswith('p_')}
+        pressures.update({
+            'timestamp': record['timestamp'] - experiment_state['startup_time'],
             'started': experiment_state['startup_time']
         })
 
+        # Update the pressures history, the sequence number is the index in the history
+        pressures['seq'] = experiment_state['pressures'].append(pressures)
+
         # Return the updated state
-        return experiment_state['pressures'][-1]
+        return pressures
+
+    async def get_updated_pressures(self, queue, name, task):
+        # The latest pressures sampled by the acquisition daemon
+        await self.start_acquisition(queue, name, task)
+        await self.wait_for_first_samples(['ghs', 'maxigauge'])
+        return self.store_pressures(self.acquisition_daemon.latest(['ghs', 'maxigauge']))
+
+    # Start the acquisition daemon (does nothing if it's running)
+    async def start_acquisition(self, queue, name, task):
+        if not self.acquisition_daemon.is_running():
+            print('Starting the acquisition daemon')
+            self.acquisition_daemon.start()
 
     # Queue task to retrieve pressures from the front panel
     async def update_pressures(self, queue, name, task):
@@ -220,22 +390,27 @@ class CryoQueue(BaseQueueClass):
     async def get_temperatures(self, queue, name, task):
         await self.socket_client.send_temperatures(experiment_state['temperatures'][-1])
 
-    # Send a trace containing last 20 temperature measurements
+    # Send the temperature measurements recorded after the sequence number in the task
+    # The trace goes back to the browser that asked for it (browser_sid), the others have other sequence numbers
     async def get_temperature_trace(self, queue, name, task):
-        await self.socket_client.send_temperature_trace(experiment_state['temperatures'])
+        trace_update = experiment_state['temperatures'].get_trace_after(task.get('after_seq', -1),
+                                                                        trace_resync_samples)
+        await self.socket_client.send_temperature_trace(trace_update, task['browser_sid'])
 
     # Send the latest pressures
     async def get_pressures(self, queue, name, task):
         await self.socket_client.send_pressures(experiment_state['pressures'][-1])
 
-    # Send a trace containing the last 20 pressure measurements
+    # Send the pressure measurements recorded after the sequence number in the task
     async def get_pressure_trace(self, queue, name, task):
-        await self.socket_client.send_pressure_trace(experiment_state['pressures'])
+        trace_update = experiment_state['pressures'].get_trace_after(task.get('after_seq', -1),
+                                                                     trace_resync_samples)
+        await self.socket_client.send_pressure_trace(trace_update, task['browser_sid'])
 
     # Queue task to get the mck state
     async def get_mck_state(self, queue, name, task):
         # Update the status of the TCS
-        self.tcs.get_all_params()
+        await self.io['tcs'].get_all_params()
 
     # Queue task to cool the system down
     async def start_cooling(self, queue, name, task):
@@ -243,6 +418,10 @@ class CryoQueue(BaseQueueClass):
 
     # Queue task to send the frontpanel status and ack to the frontend
     async def get_fp_status(self, queue, name, task):
+        # Refresh the status, if it's stale
+        async with self.lanes.use('ghs'):
+            await self.io['ghs'].refresh('status')
+
         await self.socket_client.send_fp_status({
             'ack': self.ghs.latest_ack.get_latest(),
             'status': self.ghs.status.get_latest()
@@ -303,14 +482,24 @@ class CryoQueue(BaseQueueClass):
         pressures = {'step_id': step['id']}
         temperatures = {'step_id': step['id']}
 
+        # The instruments are sampled by the acquisition daemon, so a datapoint is a time window of its buffers
+        await self.start_acquisition(queue, name, task)
+        await self.wait_for_first_samples(timeout=fresh_sample_timeout)
+
         # Do the measurement
         for datapoint_idx in range(step['data_points_per_measurement']):            
             # Start by waiting for the system to stabalize
             await asyncio.sleep(step['data_wait_before_measuring'])
+            wait_end = time.time()
 
-            # Get the data concurrently
-            raw_data = await asyncio.gather(self.get_updated_pressures(queue, name, task), 
-                                            self.get_updated_temperatures(queue, name, task))
+            # Wait until every instrument has been sampled after the system stabalized, and average those samples
+            # The window lasts until the slowest instrument has a sample, so the faster ones contribute several
+            if not await self.acquisition_daemon.wait_for_samples_after(wait_end, timeout=fresh_sample_timeout):
+                print('Timed out waiting for fresh samples of',
+                      ', '.join(self.acquisition_daemon.missing(after=wait_end)),
+                      'using their latest samples')
+            record = self.acquisition_daemon.window(wait_end, time.time())
+            raw_data = [self.store_pressures(record), self.store_temperatures(record)]
 
             # Send it to the client, so the updates feel like they're incoming
             await asyncio.gather(self.get_pressures(queue, name, task), 
@@ -360,103 +549,42 @@ class CryoQueue(BaseQueueClass):
         await self.socket_client.emit('mark_step_as_done', step)
         experiment_state['current_step']['step_done'] = True
 
-    async def start_circulation(self, queue, name, task):
-        # We start by resetting so we know the state of the system
-        # This closes all valves and turns off all pumps
-        self.ghs.press_button('reset')
-
-        # Wait between
-        await asyncio.sleep(1)
-
-        # Next we start s3 as the backing pump for s1
-        self.ghs.press_button('s3')
-
-        # And we let it spin up
-        await asyncio.sleep(1)
-
-        # Next we open all the way to the still
-        self.ghs.press_button('3')
-        self.ghs.press_button('2')
-        self.ghs.press_button('0')
+    # Press a number of buttons on the GHS front panel, while reserving it
+    async def press_ghs_buttons(self, *buttons):
+        async with self.lanes.use('ghs'):
+            for button in buttons:
+                await self.io['ghs'].press_button(button)
 
-        # And we open the gate valve
-        self.ghs.press_button('gate-valve-18')
+    # The latest GHS pressures, keyed by the parameter name
+    def get_ghs_pressures(self):
+        return {f'pressure_p{i}': self.ghs[f'pressure_p{i}'].get_latest() for i in range(1, 9)}
 
-        # Now we wait until the pressure is low on P4
-        while self.ghs.pressure_p4.get() > 3:
-            await asyncio.sleep(0.1)
+    # Read the GHS pressures, while reserving it
+    async def read_ghs_pressures(self):
+        async with self.lanes.use('ghs'):
+            await self.io['ghs'].refresh('pressures')
 
-        # And we turn on the turbopump
-        self.ghs.press_button('s1')
+        return self.get_ghs_pressures()
 
-        # We now open the first dump
-        self.ghs.press_button('10')
-        self.ghs.press_button('9')
-
-        # And we wait a little for the pressure to stabalize
-        await asyncio.sleep(1)
-
-        # Next we open the trap
-        self.ghs.press_button('4')
-        self.ghs.press_button('5')
-
-        # And we bypass the compressor and open the final valve
-        self.ghs.press_button('bypass')
-        self.ghs.press_button('6')
-
-    async def pump_still(self):
-        # We start by resetting so we know the state of the system
-        # This closes all valves and turns off all pumps
-        self.ghs.press_button('reset')
-
-        # Wait for everything to shut down
-        await asyncio.sleep(1)
-
-        # We now open the first dump so the pressure has somewhere to go
-        self.ghs.press_button('10')
-        self.ghs.press_button('9')
-
-        # Next we start s3 as the backing pump for s1
-        self.ghs.press_button('s3')
-
-        # And we let it spin up
-        await asyncio.sleep(1)
-
-        # Next we open all the way to the still
-        self.ghs.press_button('3')
-        self.ghs.press_button('2')
-        self.ghs.press_button('0')
-
-        # Now we wait until the pressure is low on P4
-        while self.ghs.pressure_p4.get() > 3:
-            await asyncio.sleep(1)
-
-        # And we turn on the turbopump
-        self.ghs.press_button('s1')
-
-        # We wait for the turbopump to spin up
-        await asyncio.sleep(10)
-
-        # And we open the gate valve
-        self.ghs.press_button('gate-valve-18')
-
-    async def pump_ivc_and_still(self):
-        # We start by pumping the still
-        await self.pump_still()
-
-        # We wait for that a bit
-        await asyncio.sleep(5)
-
-        # Then we open to the IVC
-        self.ghs.press_button('a10')
+    # Queue task to run a valve procedure (start_circulation, pump_still or pump_ivc_and_still)
+    # The browser that asked is told if the procedure can't run
+    async def run_ghs_procedure(self, queue, name, task):
+        try:
+            await self.ghs_procedures.run(task['procedure'])
+        except (ValueError, RuntimeError) as e:
+            print('Could not run the GHS procedure', e)
+            await self.socket_client.send_ghs_procedure_error(str(e), task['browser_sid'])
 
     async def run_background_jobs(self, queue, name, task):
+        # Ensure the instruments are being sampled
+        await self.start_acquisition(queue, name, task)
+
         # Get the temperatures
         await self.update_temperatures(queue, name, task)
 
         # Wait and rerun the job
         await asyncio.sleep(5)
-        await self.queue.put({'function_name': 'run_background_jobs'})
+        await self.put_task({'function_name': 'run_background_jobs'})
 
 
 # Create the class containing the namespace for this client
@@ -498,18 +626,24 @@ class CryoClientNamespace(BaseClientNamespace):
     async def on_c_config_avs47b(self, config):
         await self.append_to_queue({'function_name': 'configure_avs47b', 'config': config})
 
+    # Received when the schedule of the bridge channels should be updated
+    async def on_c_config_bridge_schedule(self, config):
+        await self.append_to_queue({'function_name': 'configure_bridge_schedule', 'config': config})
+
     # Received when new temperatures are wanted
     async def on_c_get_temperatures(self):
         await self.append_to_queue({'function_name': 'get_temperatures'})
 
-    async def on_c_get_temperature_trace(self):
-        await self.append_to_queue({'function_name': 'get_temperature_trace'})
+    async def on_c_get_temperature_trace(self, after_seq, browser_sid):
+        await self.append_to_queue({'function_name': 'get_temperature_trace', 'after_seq': after_seq,
+                                    'browser_sid': browser_sid})
 
     async def on_c_get_pressures(self):
         await self.append_to_queue({'function_name': 'get_pressures'})
 
-    async def on_c_get_pressure_trace(self):
-        await self.append_to_queue({'function_name': 'get_pressure_trace'})
+    async def on_c_get_pressure_trace(self, after_seq, browser_sid):
+        await self.append_to_queue({'function_name': 'get_pressure_trace', 'after_seq': after_seq,
+                                    'browser_sid': browser_sid})
 
     # Received when the mck state is desired
     async def on_c_get_mck_state(self):
@@ -518,9 +652,25 @@ class CryoClientNamespace(BaseClientNamespace):
     async def on_c_got_picowatt_delay(self, delay):
         self.my_queue.picowatt_delay = delay
 
-    async def on_c_start_circulation(self):
+    # Starting circulation is the start_circulation procedure, so errors go back to the browser like the others
+    async def on_c_start_circulation(self, browser_sid):
         print('got start circulation')
-        await self.append_to_queue({'function_name': 'start_circulation'})
+        await self.on_c_run_ghs_procedure('start_circulation', browser_sid)
+
+    # Received when a valve procedure of the GHS should run
+    # Only the names of the procedures are accepted, anything else is sent back as an error
+    async def on_c_run_ghs_procedure(self, procedure, browser_sid):
+        if not self.my_queue.ghs_procedures.has_procedure(procedure):
+            await self.send_ghs_procedure_error(f'Unknown GHS procedure: {procedure}', browser_sid)
+            return
+
+        await self.append_to_queue({'function_name': 'run_ghs_procedure', 'procedure': procedure,
+                                    'browser_sid': browser_sid})
+
+    # Received when the running valve procedure should be aborted
+    # This bypasses the queue, since the procedure is blocking it
+    async def on_c_abort_ghs_procedure(self):
+        self.my_queue.ghs_procedures.abort()
 
     async def get_picowatt_delay(self):
         await self.emit('c_get_picowatt_delay')
@@ -529,18 +679,22 @@ class CryoClientNamespace(BaseClientNamespace):
     async def send_temperatures(self, temperatures):
         await self.emit('c_got_temperatures', temperatures)
 
-    async def send_temperature_trace(self, temperature_trace):
-        await self.emit('c_got_temperature_trace', list(temperature_trace))
+    async def send_temperature_trace(self, trace_update, browser_sid):
+        await self.emit('c_got_temperature_trace', (trace_update, browser_sid))
 
     async def send_pressures(self, pressures):
         await self.emit('c_got_pressures', pressures)
 
-    async def send_pressure_trace(self, pressure_trace):
-        await self.emit('c_got_pressure_trace', list(pressure_trace))
+    async def send_pressure_trace(self, trace_update, browser_sid):
+        await self.emit('c_got_pressure_trace', (trace_update, browser_sid))
 
     async def send_fp_status(self, status):
         await self.emit('c_got_fp_status', status)
 
+    # Event sent when a valve procedure of the GHS could not run
+    async def send_ghs_procedure_error(self, message, browser_sid):
+        await self.emit('c_ghs_procedure_error', (message, browser_sid))
+
     async def is_step_ready(self, step_id):
         await self.emit('c_is_step_ready', step_id)
 
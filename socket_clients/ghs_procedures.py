@@ -0,0 +1,254 @@
+# Import asyncio to wait for the pressures and the steps
+import asyncio
+
+# Import operator to compare the pressures in the conditions
+import operator
+
+# Import time to keep track of the age of the pressures
+import time
+
+
+# The comparisons that can be used in a condition
+comparisons = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge
+}
+
+
+# The valve procedures of the GHS, as lists of steps
+# A step is one of:
+#  {'press': [buttons]} - press the buttons on the front panel in order
+#  {'delay': seconds} - wait
+#  {'wait_for': (pressure, comparison, value), 'timeout': seconds} - wait until the condition holds
+ghs_procedures = {
+    'start_circulation': [
+        # Reset, this closes all valves and turns off all pumps
+        {'press': ['reset']},
+        {'delay': 1},
+
+        # Start s3 as the backing pump for s1, and let it spin up
+        {'press': ['s3']},
+        {'delay': 1},
+
+        # Open all the way to the still, and open the gate valve
+        {'press': ['3', '2', '0']},
+        {'press': ['gate-valve-18']},
+
+        # Wait until the pressure is low on P4, then turn on the turbopump
+        {'wait_for': ('pressure_p4', '<=', 3), 'timeout': 1800},
+        {'press': ['s1']},
+
+        # Open the first dump, and let the pressure stabilize
+        {'press': ['10', '9']},
+        {'delay': 1},
+
+        # Open the trap, bypass the compressor and open the final valve
+        {'press': ['4', '5']},
+        {'press': ['bypass', '6']}
+    ],
+    'pump_still': [
+        # Reset, and wait for everything to shut down
+        {'press': ['reset']},
+        {'delay': 1},
+
+        # Open the first dump so the pressure has somewhere to go
+        {'press': ['10', '9']},
+
+        # Start s3 as the backing pump for s1, and let it spin up
+        {'press': ['s3']},
+        {'delay': 1},
+
+        # Open all the way to the still
+        {'press': ['3', '2', '0']},
+
+        # Wait until the pressure is low on P4, then turn on the turbopump and let it spin up
+        {'wait_for': ('pressure_p4', '<=', 3), 'timeout': 1800},
+        {'press': ['s1']},
+        {'delay': 10},
+
+        # Open the gate valve
+        {'press': ['gate-valve-18']}
+    ]
+}
+
+# Pumping the IVC is pumping the still, followed by opening to the IVC
+ghs_procedures['pump_ivc_and_still'] = ghs_procedures['pump_still'] + [
+    {'delay': 5},
+    {'press': ['a10']}
+]
+
+# Steps run when a procedure is aborted or times out
+# Reset closes all valves and turns off all pumps, which leaves the GHS in a known state
+default_abort_steps = [{'press': ['reset']}]
+
+
+# Raised in a running procedure when it is aborted
+class ProcedureAborted(Exception):
+    pass
+
+
+# Check a condition, (pressure, comparison, value), against a dict of pressures
+def check_condition(condition, pressures):
+    label, comparison, value = condition
+    if pressures is None or pressures.get(label) is None:
+        return False
+
+    return comparisons[comparison](pressures[label], value)
+
+
+# A stream of GHS pressures, shared by everything waiting for a pressure condition
+# The pressures are read at most once per min_interval, and only while something is waiting,
+# readings made elsewhere (like the pressure updates) can be published to the stream as well
+class PressureStream():
+    def __init__(self, read_pressures, min_interval=1.0):
+        # Awaitable returning a dict of pressures
+        self.read_pressures = read_pressures
+        self.min_interval = min_interval
+
+        # The latest pressures, and when they were read
+        self.pressures = None
+        self.read_time = None
+
+        # Waiters are woken up on every new reading
+        self.new_reading = None
+        self.n_waiters = 0
+        self.poll_task = None
+
+    # The age of the latest pressures (infinite if there are none)
+    def get_age(self):
+        if self.read_time is None:
+            return float('inf')
+
+        return time.time() - self.read_time
+
+    # Save a new reading, and wake up the waiters
+    def publish(self, pressures):
+        self.pressures = dict(pressures)
+        self.read_time = time.time()
+
+        if self.new_reading is not None:
+            self.new_reading.set()
+            self.new_reading = None
+
+    # Poll the pressures while something is waiting
+    async def poll(self):
+        try:
+            while self.n_waiters > 0:
+                # Don't read if someone else published a recent reading
+                if self.get_age() >= self.min_interval:
+                    try:
+                        self.publish(await self.read_pressures())
+                    except Exception as e:
+                        print('Could not read the GHS pressures', e)
+
+                # Wait until the next reading is due
+                await asyncio.sleep(max(self.min_interval - self.get_age(), 0.01))
+        finally:
+            self.poll_task = None
+
+    # Wait until the condition holds on the pressures, returns the pressures
+    # Raises asyncio.TimeoutError if it takes longer than timeout seconds
+    async def wait_for(self, condition, timeout=None):
+        self.n_waiters += 1
+        try:
+            # Start polling if we are the first waiter
+            if self.poll_task is None:
+                self.poll_task = asyncio.ensure_future(self.poll())
+
+            async def wait():
+                while not check_condition(condition, self.pressures) or self.get_age() >= self.min_interval:
+                    if self.new_reading is None:
+                        self.new_reading = asyncio.Event()
+                    await self.new_reading.wait()
+
+                return self.pressures
+
+            return await asyncio.wait_for(wait(), timeout)
+        finally:
+            self.n_waiters -= 1
+
+
+# Runs the valve procedures of the GHS, one at a time
+class GHSProcedureRunner():
+    def __init__(self, press_buttons, pressure_stream, procedures=None, abort_steps=None):
+        # Awaitable pressing a number of buttons
+        self.press_buttons = press_buttons
+        self.pressure_stream = pressure_stream
+        self.procedures = ghs_procedures if procedures is None else procedures
+        self.abort_steps = default_abort_steps if abort_steps is None else abort_steps
+
+        # The running procedure, and the step it is on
+        self.running = None
+        self.current_step = None
+        self.aborted = None
+
+    # Only the procedures known by name can be run, so a request can't send its own valve sequence
+    def has_procedure(self, name):
+        return isinstance(name, str) and name in self.procedures
+
+    # Abort the running procedure, it stops at the current step and runs the abort steps
+    def abort(self):
+        if self.aborted is not None:
+            self.aborted.set()
+
+    # Wait for an awaitable, unless the procedure is aborted first
+    async def until_aborted(self, awaitable):
+        task = asyncio.ensure_future(awaitable)
+        abort_task = asyncio.ensure_future(self.aborted.wait())
+        try:
+            await asyncio.wait([task, abort_task], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            abort_task.cancel()
+
+        if not task.done():
+            task.cancel()
+            raise ProcedureAborted()
+
+        return task.result()
+
+    # Run a single step
+    async def run_step(self, step):
+        if 'press' in step:
+            await self.press_buttons(*step['press'])
+        elif 'delay' in step:
+            await asyncio.sleep(step['delay'])
+        elif 'wait_for' in step:
+            await self.pressure_stream.wait_for(step['wait_for'], step.get('timeout'))
+        else:
+            raise ValueError(f'Unknown procedure step: {step}')
+
+    # Run a procedure by name, raises ValueError if it's not one of the procedures
+    # Returns True if it finished, and False if it was aborted or timed out (the abort steps are then run)
+    async def run(self, name):
+        if not self.has_procedure(name):
+            raise ValueError(f'Unknown GHS procedure: {name}')
+
+        if self.running is not None:
+            raise RuntimeError(f'The GHS procedure {self.running} is already running')
+
+        steps = self.procedures[name]
+
+        self.running = name
+        self.aborted = asyncio.Event()
+        try:
+            for i, step in enumerate(steps):
+                self.current_step = i
+                print(f'GHS procedure {name}, step {i}:', step)
+                await self.until_aborted(self.run_step(step))
+
+            return True
+        except (ProcedureAborted, asyncio.TimeoutError) as e:
+            print(f'GHS procedure {name} stopped at step {self.current_step}',
+                  '(timed out)' if isinstance(e, asyncio.TimeoutError) else '(aborted)')
+
+            # Leave the GHS in a known state
+            for step in self.abort_steps:
+                await self.run_step(step)
+
+            return False
+        finally:
+            self.running = None
+            self.current_step = None
+            self.aborted = None
@@ -0,0 +1,98 @@
+# Import asyncio for the locks
+import asyncio
+
+# Import contextlib to create async context managers
+import contextlib
+
+# Import functools to pass arguments to the executors
+import functools
+
+# Import the thread pool, the instrument calls are blocking so they run in threads
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Each instrument gets its own lane, which allows a single command (or sequence of commands) in flight per device.
+# Different instruments are not related, so they run fully in parallel.
+# Each lane also has a thread to run the blocking instrument calls in, so the event loop
+# (and the socket.io heartbeats) keeps running while an instrument is busy
+class InstrumentLanes():
+    def __init__(self):
+        # Dict of locks, one for each instrument (created the first time the instrument is used)
+        self.locks = {}
+
+        # Dict of executors, one thread for each instrument (so calls to one device never overlap)
+        self.executors = {}
+
+    # Get the lock of an instrument
+    def get_lock(self, instrument):
+        if instrument not in self.locks:
+            self.locks[instrument] = asyncio.Lock()
+
+        return self.locks[instrument]
+
+    # Get the executor of an instrument
+    def get_executor(self, instrument):
+        if instrument not in self.executors:
+            self.executors[instrument] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=instrument)
+
+        return self.executors[instrument]
+
+    # Run a blocking function in the thread of an instrument, and wait for the result without blocking the event loop
+    # This does not reserve the lane, so reserve it first if the call is part of a sequence that must not be interrupted
+    async def call(self, instrument, function, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.get_executor(instrument), functools.partial(function, *args, **kwargs))
+
+    # Wrap an instrument so all its methods and parameters become awaitable, and run in the thread of the instrument
+    # Use it like: await lanes.wrap('magnet_ps', magnet_ps).MagneticField.set(1.0)
+    def wrap(self, instrument, target):
+        return AsyncInstrumentProxy(self, instrument, target)
+
+    # Stop the threads (waits for running calls to finish)
+    def shutdown(self):
+        for executor in self.executors.values():
+            executor.shutdown()
+
+    # Check if an instrument is in use
+    def is_busy(self, instrument):
+        return instrument in self.locks and self.locks[instrument].locked()
+
+    # Reserve a number of instruments while the context is active
+    # Use it like: async with lanes.use('dmm', 'resistance_bridge'): ...
+    # The lanes are not reentrant, so don't reserve an instrument that is already reserved by the same task
+    @contextlib.asynccontextmanager
+    async def use(self, *instruments):
+        # Always lock in sorted order, so two tasks reserving the same instruments can't deadlock
+        locks = [self.get_lock(instrument) for instrument in sorted(set(instruments))]
+
+        # Acquire the locks one at a time
+        acquired = []
+        try:
+            for lock in locks:
+                await lock.acquire()
+                acquired.append(lock)
+
+            yield
+        finally:
+            # Release in reverse order
+            for lock in reversed(acquired):
+                lock.release()
+
+
+# Proxy for an instrument (or any of its parameters, channels, or methods)
+# Looking up attributes and items is done immediately, calling is done in the thread of the instrument
+class AsyncInstrumentProxy():
+    def __init__(self, lanes, instrument, target):
+        self._lanes = lanes
+        self._instrument = instrument
+        self._target = target
+
+    def __getattr__(self, attribute):
+        return AsyncInstrumentProxy(self._lanes, self._instrument, getattr(self._target, attribute))
+
+    def __getitem__(self, key):
+        return AsyncInstrumentProxy(self._lanes, self._instrument, self._target[key])
+
+    # Calling returns an awaitable
+    def __call__(self, *args, **kwargs):
+        return self._lanes.call(self._instrument, self._target, *args, **kwargs)
@@ -7,6 +7,9 @@ import os
 # Import time and path python packages
 import time, sys, os, math
 
+# Import functools to pass the output arrays to the lock-in reads
+import functools
+
 # Import numpy
 import numpy as np
 
@@ -34,7 +37,10 @@ magnetism_state = {
     'current_step': {'step_done': True},
     'next_step': {},
     'experiment_file': None,
-    'experiment_file_id': None
+    'experiment_file_id': None,
+    'magnet_ramp': None,
+    'magnet_settling': None,
+    'sr830_stream': None
 }
 
 
@@ -56,6 +62,15 @@ lockin_params = ['phase', 'reference_source', 'frequency', 'ext_trigger', 'harmo
 # Resistor to calculate current
 resistor = 84.5  # Ohm
 
+# Extra seconds a ramp may take on top of twice the expected time, before we stop waiting for it
+magnet_ramp_slack = 60.0
+
+# Seconds between checks of the number of points in the lock-in buffer, while waiting for points
+sr830_poll_interval = 0.05
+
+# Extra seconds we wait for lock-in points on top of twice the time they take, before we give up on the buffer
+sr830_stream_slack = 5.0
+
 
 # A queue to process magnetism related tasks
 # Such as adjusting equipment and taking measurements
@@ -70,6 +85,9 @@ class MagnetismQueue(BaseQueueClass):
         self.lockin = self.station.components['lockin']
         self.magnet_ps = self.station.components['magnet_ps']
 
+        # Create awaitable versions of the instruments, the blocking calls run in a thread for each instrument
+        self.setup_async_instruments(self.station)
+
         # Turn on the signal generator (0.5 volts peak to peak)
         self.configure_n9310a({'amplitude': 0.5, 'frequency': 1000})
 
@@ -90,22 +108,31 @@ class MagnetismQueue(BaseQueueClass):
         })
 
         # Register queue processors
-        self.register_queue_processor('get_sr830_config', self.get_sr830_config)
-        self.register_queue_processor('get_n9310a_config', self.get_n9310a_config)
-        self.register_queue_processor('get_oscilloscope_config', self.get_oscilloscope_config)
-        self.register_queue_processor('get_magnet_trace', self.get_magnet_trace)
-        self.register_queue_processor('process_next_step', self.process_next_step)
-        self.register_queue_processor('set_oscilloscope_config', self.set_oscilloscope_config)
-        self.register_queue_processor('set_sr830_config', self.set_sr830_config)
-        self.register_queue_processor('set_magnet_config', self.set_magnet_config)
-        self.register_queue_processor('set_n9310a_config', self.set_n9310a_config)
-        self.register_queue_processor('get_dc_field', self.get_dc_field)
+        self.register_queue_processor('get_sr830_config', self.get_sr830_config, coalesce=True,
+                                      instruments=['lockin'])
+        self.register_queue_processor('get_n9310a_config', self.get_n9310a_config, coalesce=True,
+                                      instruments=['signal_gen'])
+        self.register_queue_processor('get_oscilloscope_config', self.get_oscilloscope_config, coalesce=True,
+                                      instruments=['dvm'])
+        self.register_queue_processor('get_magnet_trace', self.get_magnet_trace, coalesce=True,
+                                      instruments=['dvm'])
+        self.register_queue_processor('process_next_step', self.process_next_step, task_class='measurement')
+        self.register_queue_processor('set_oscilloscope_config', self.set_oscilloscope_config, task_class='control',
+                                      instruments=['dvm'])
+        self.register_queue_processor('set_sr830_config', self.set_sr830_config, task_class='control',
+                                      instruments=['lockin'])
+        self.register_queue_processor('set_magnet_config', self.set_magnet_config, task_class='control',
+                                      instruments=['magnet_ps'])
+        self.register_queue_processor('set_n9310a_config', self.set_n9310a_config, task_class='control',
+                                      instruments=['signal_gen'])
+        self.register_queue_processor('get_dc_field', self.get_dc_field, coalesce=True,
+                                      instruments=['magnet_ps'])
 
     @property
     def queue_name(self):
         return 'MagnetismQueue'
 
-    async def get_sr830_config(self, queue, name, task):
+    def read_sr830_config(self):
         # Empty dict to store results
         config = {}
 
@@ -113,11 +140,17 @@ class MagnetismQueue(BaseQueueClass):
         for cp in lockin_params:
             config[cp] = self.lockin[cp].get()
 
-        self.socket_client.send_lockin_config(config)
+        return config
 
-    async def get_oscilloscope_config(self, queue, name, task):
+    async def get_sr830_config(self, queue, name, task):
+        # Read all the parameters in the thread of the lock-in
+        config = await self.lanes.call('lockin', self.read_sr830_config)
+
+        await self.socket_client.send_lockin_config(config)
+
+    def read_oscilloscope_config(self):
         # Grab the config parameters
-        config = {
+        return {
             'ch1': {
                 'state': self.dvm.channels[0].state.get(),
                 'scale': self.dvm.channels[0].scale.get(),
@@ -136,6 +169,10 @@ class MagnetismQueue(BaseQueueClass):
             'horizontal_scale': self.dvm.horizontal_scale.get()
         }
 
+    async def get_oscilloscope_config(self, queue, name, task):
+        # Read all the parameters in the thread of the oscilloscope
+        config = await self.lanes.call('dvm', self.read_oscilloscope_config)
+
         # Send it to the server
         await self.socket_client.send_oscope_config(config)
 
@@ -145,8 +182,8 @@ class MagnetismQueue(BaseQueueClass):
     async def get_n9310a_config(self, queue, name, task):
         # Collect the data from the device
         config = {
-            'amplitude': self.signal_gen.LFOutputAmplitude.get(),
-            'frequency': self.signal_gen.LFOutputFrequency.get()
+            'amplitude': await self.io['signal_gen'].LFOutputAmplitude.get(),
+            'frequency': await self.io['signal_gen'].LFOutputFrequency.get()
         }
 
         # Send the configuration back
@@ -159,16 +196,16 @@ class MagnetismQueue(BaseQueueClass):
     async def get_magnet_trace(self, queue, name, task):
         # Get a trace from the oscilloscope
         # We start by forcing a trigger to prepare the scope
-        self.dvm.force_trigger()
+        await self.io['dvm'].force_trigger()
 
         # Then we wait for the data to arrive
         await asyncio.sleep(10 * self.dvm.horizontal_scale.get_latest())
 
         # Now we prepare the data
-        self.dvm.channels[0].curvedata.prepare_curvedata()
+        await self.io['dvm'].channels[0].curvedata.prepare_curvedata()
 
         # And we get the trace
-        magnetism_state['magnet_trace'] = self.dvm.channels[0].curvedata.get() / resistor
+        magnetism_state['magnet_trace'] = await self.io['dvm'].channels[0].curvedata.get() / resistor
 
         # Compute the times
         magnetism_state['magnet_trace_times'] = np.arange(0.0, 10 * self.dvm.horizontal_scale.get_latest(),
@@ -183,7 +220,7 @@ class MagnetismQueue(BaseQueueClass):
         return magnetism_state['magnet_trace']
 
     async def get_magnet_rms_direct(self, queue, name, task):
-        return float(self.dvm.ask('MEASUrement:IMMed:VALue?'))
+        return float(await self.io['dvm'].ask('MEASUrement:IMMed:VALue?'))
 
     async def get_latest_magnet_trace(self, queue, name, task):
         # Send the data to the client
@@ -198,7 +235,7 @@ class MagnetismQueue(BaseQueueClass):
 
     async def get_dc_field(self, queue, name, task):
         # Get the DC field
-        dc_field = self.magnet_ps.MagneticField.get()
+        dc_field = await self.io['magnet_ps'].MagneticField.get()
 
         # Send the DC field to the browser
         await self.socket_client.send_dc_field(dc_field)
@@ -206,34 +243,148 @@ class MagnetismQueue(BaseQueueClass):
         # Return it for the process next step method
         return dc_field
 
-    async def get_sr830_trace(self, queue, name, task):
-        # Clear the buffer
-        self.lockin.buffer_reset()
+    # Start ramping the magnet, and return a future which is done when the ramp is over
+    # The result of the future is True if the magnet arrived at the field and False otherwise
+    async def start_magnet_ramp(self, field):
+        # A new ramp interrupts the old one, so stop following it
+        self.stop_magnet_ramp_monitor()
+
+        # Start the ramp, this returns as soon as the magnet is moving
+        await self.io['magnet_ps'].start_ramp(field)
+
+        # Follow the ramp in the background, so other work can run while the magnet moves
+        arrived = asyncio.get_running_loop().create_future()
+        magnetism_state['magnet_ramp'] = {
+            'target': self.magnet_ps.ramp_target,
+            'arrived': arrived,
+            'monitor': asyncio.ensure_future(self.monitor_magnet_ramp(self.magnet_ps.ramp_target, arrived))
+        }
+
+        return arrived
 
-        # Start filling the buffer at the sample rate
-        self.lockin.buffer_start()
+    def stop_magnet_ramp_monitor(self):
+        ramp = magnetism_state['magnet_ramp']
+        if ramp is not None:
+            # The monitor marks the ramp as not arrived when it's cancelled
+            ramp['monitor'].cancel()
+            magnetism_state['magnet_ramp'] = None
 
-        # Compute the time to wait
+    async def monitor_magnet_ramp(self, target, arrived):
+        try:
+            # The detector decides when the field has settled, and how often we read it
+            detector = self.magnet_ps.settling_detector()
+
+            # Get the field at the start of the ramp
+            field = await self.io['magnet_ps'].MagneticField.get()
+
+            # Stop waiting if the ramp takes a lot longer than expected
+            timeout = time.time() + 2 * self.magnet_ps.ramp_eta(field) + magnet_ramp_slack
+
+            while True:
+                # Add the reading to the detector
+                settled = detector.add_reading(field)
+
+                # Send the progress to the browser
+                await self.socket_client.send_magnet_ramp_progress({
+                    'field': field,
+                    'target': target,
+                    'eta': self.magnet_ps.ramp_eta(field),
+                    'settled': settled
+                })
+
+                # Check if the field has settled
+                if settled:
+                    magnetism_state['magnet_settling'] = detector.report()
+                    print('Magnet settled at', target, 'T after', magnetism_state['magnet_settling']['total_time'], 's')
+                    arrived.set_result(True)
+                    break
+
+                # Check if we have waited too long
+                # The controller may have been changed behind our back, so the next ramp sends every setting
+                if time.time() > timeout:
+                    magnetism_state['magnet_settling'] = detector.report()
+                    print('Magnet did not settle at', target, 'T in time')
+                    self.magnet_ps.forget_controller_state()
+                    arrived.set_result(False)
+                    break
+
+                # Wait a bit (shorter close to the target) and read the field again
+                await asyncio.sleep(detector.next_interval())
+                field = await self.io['magnet_ps'].MagneticField.get()
+        except asyncio.CancelledError:
+            # The ramp was interrupted
+            if not arrived.done():
+                arrived.set_result(False)
+            raise
+        except Exception as e:
+            print('Could not follow the magnet ramp', e)
+            self.magnet_ps.forget_controller_state()
+            if not arrived.done():
+                arrived.set_result(False)
+
+    # Start filling the lock-in buffer continuously, the datapoints take their slices of it
+    # The lock-in must be reserved by the caller
+    async def start_sr830_stream(self):
+        rate = await self.io['lockin'].start_stream()
+
+        # Points before valid_from are not used (they were taken before the system was ready, or by earlier datapoints)
+        # The start time is used to find when the points of a slice were taken
+        magnetism_state['sr830_stream'] = {'rate': rate, 'valid_from': 0, 'start_time': time.time(),
+                                           'last_slice': None}
+
+    # Read the slice of the lock-in stream for a datapoint, into out (shape (2, buffersize)) if it's given
+    async def get_sr830_trace(self, queue, name, task, out=None):
         buffersize = task['step']['sr830_buffersize']
-        sleep_time = buffersize / task['step']['sr830_frequency']
+        capacity = self.lockin.buffer_capacity
+
+        # The buffer stops when it's full, so we would wait forever for more points than it holds
+        if buffersize > capacity:
+            raise ValueError(f'The lock-in buffer holds at most {capacity} points, {buffersize} were asked for')
+
+        # Start the stream if it's not running
+        if magnetism_state['sr830_stream'] is None:
+            await self.start_sr830_stream()
+
+        stream = magnetism_state['sr830_stream']
+        count = await self.io['lockin'].get_stream_count()
 
-        # Add some extra time to ensure it has enough time to get all the datapoints
-        # We want to either add 1 second or double the time, whichever is smallest
-        sleep_time += np.minimum(sleep_time, 1)
+        # The datapoint is the latest buffersize points, which were mostly taken while we waited before the datapoint
+        # If there are not enough valid points yet, we wait for the ones we miss
+        end = max(count, stream['valid_from'] + buffersize)
 
-        # Wait for enough points to gather
-        await asyncio.sleep(sleep_time)
+        # The buffer stops when it's full, so restart it if it's full or can't hold the points we need
+        if count >= capacity or end > capacity:
+            await self.start_sr830_stream()
+            stream = magnetism_state['sr830_stream']
+            count, end = 0, buffersize
 
-        # Stop filling the buffers
-        self.lockin.buffer_pause()
+        # Wait for the missing points (the buffer may have been stopped, so we give up after twice the time they take)
+        if count < end:
+            timeout = time.time() + 2 * (end - count) / stream['rate'] + sr830_stream_slack
+            await asyncio.sleep((end - count) / stream['rate'])
+            while await self.io['lockin'].get_stream_count() < end:
+                if time.time() > timeout:
+                    magnetism_state['sr830_stream'] = None
+                    raise TimeoutError('The lock-in buffer stopped filling')
 
-        # Prepare the buffers
-        self.lockin.ch1_databuffer.prepare_buffer_readout()
-        self.lockin.ch2_databuffer.prepare_buffer_readout()
+                await asyncio.sleep(sr830_poll_interval)
 
-        # Return the data (cut to the buffer size)
-        return [self.lockin.ch1_databuffer.get()[:buffersize],
-                self.lockin.ch2_databuffer.get()[:buffersize]]
+        # Read the slice, the next datapoint starts after it
+        trace = await self.io['lockin'].read_stream(end - buffersize, buffersize, out)
+        stream['valid_from'] = end
+
+        # Save when the points of the slice were taken
+        stream['last_slice'] = (stream['start_time'] + (end - buffersize) / stream['rate'],
+                                stream['start_time'] + end / stream['rate'])
+
+        return [trace[0], trace[1]]
+
+    # Await a read, and save when it was issued and when it completed in timings
+    async def timed_read(self, timings, label, read):
+        timings[f'{label}_issued'] = time.time()
+        result = await read
+        timings[f'{label}_completed'] = time.time()
+        return result
 
     async def process_next_step(self, queue, name, task):
         # We get the step
@@ -270,39 +421,58 @@ class MagnetismQueue(BaseQueueClass):
             fp = f'data/magnetism_data_experiment_{magnetism_state["experiment_file_id"]}.h5'
             magnetism_state['experiment_file'] = pd.HDFStore(fp)
 
+        # The measurement task does not reserve any instruments up front,
+        # so we reserve each instrument while we use it
+        magnet_arrived = None
+        magnetism_state['magnet_settling'] = None
         try:
-            # Set the magentic field
-            await self.set_magnet_config(queue, name, {'config': {
-                'magnet_field': step['magnet_field']
-            }})
+            # Start ramping the magentic field, the other instruments are configured while the magnet moves
+            async with self.lanes.use('magnet_ps'):
+                magnet_arrived = await self.set_magnet_config(queue, name, {'config': {
+                    'magnet_field': step['magnet_field']
+                }})
         except:
             print('Could not set magnetic field')
 
         try:
             # set the signal generator config
-            await self.set_n9310a_config(queue, name, {'config': {
-                'frequency': step['n9310a_frequency'],
-                'amplitude': step['n9310a_amplitude']
-            }})
+            async with self.lanes.use('signal_gen'):
+                await self.set_n9310a_config(queue, name, {'config': {
+                    'frequency': step['n9310a_frequency'],
+                    'amplitude': step['n9310a_amplitude']
+                }})
         except:
             print('Could not configure function generator')
 
         try:
             # set the lock-in amplifier config
-            await self.set_sr830_config(queue, name, {'config': {
-                'sensitivity': step['sr830_sensitivity'],
-                'frequency': step['sr830_frequency'],
-                'buffersize': step['sr830_buffersize']
-            }})
+            async with self.lanes.use('lockin'):
+                await self.set_sr830_config(queue, name, {'config': {
+                    'sensitivity': step['sr830_sensitivity'],
+                    'frequency': step['sr830_frequency'],
+                    'buffersize': step['sr830_buffersize']
+                }})
         except:
             print('Could not configure lockin amplifier')
 
         try:
             # Autorange the scope
-            await self.dvm.ask('AUTOS EXEC')
+            async with self.lanes.use('dvm'):
+                await self.io['dvm'].ask('AUTOS EXEC')
         except:
             print('could not autorange the scope')
 
+        # Wait for the magnet to arrive at the field
+        if magnet_arrived is not None and not await magnet_arrived:
+            print('Magnet did not arrive at the field')
+
+        try:
+            # Start streaming the lock-in buffer, only the points from now on are used
+            async with self.lanes.use('lockin'):
+                await self.start_sr830_stream()
+        except:
+            print('Could not start the lockin amplifier buffer')
+
         # Mark this step as ready
         await self.socket_client.emit('m_set_step_ready', step['id'])
 
@@ -311,18 +481,41 @@ class MagnetismQueue(BaseQueueClass):
         # Create lists to hold the results
         ac_fields = []
         dc_fields = []
-        lockin_amplitudes = []
-        lockin_phases = []
+        datapoint_timings = []
+
+        # The lock-in data is read straight into an array (channel, datapoint, point)
+        lockin_traces = np.empty((2, step['data_points_per_measurement'], step['sr830_buffersize']))
 
         # Do the measurement
         for datapoint_idx in range(step['data_points_per_measurement']):
             # Start by waiting for the system to stabalize
             await asyncio.sleep(step['data_wait_before_measuring'])
 
-            # Get the data concurrently
-            raw_data = await asyncio.gather(self.get_magnet_rms_direct(queue, name, task),
-                                            self.get_dc_field(queue, name, task),
-                                            self.get_sr830_trace(queue, name, task))
+            # The lock-in slice is the latest sr830_buffersize points, so it's mostly taken during the wait above,
+            # while the scope and magnet are read after it
+            # We accept this so a datapoint does not wait for the buffer, when the slice was taken is saved
+            # as lockin_slice_start and lockin_slice_end in tables/datapoint_timing
+
+            # Get the data concurrently, each read reserves its own instrument and runs in the thread of it
+            # The time each read was issued and completed is saved with the datapoint
+            timings = {'datapoint': datapoint_idx}
+            raw_data = await asyncio.gather(
+                self.timed_read(timings, 'dvm',
+                                self.reserve_and_run('dvm', self.get_magnet_rms_direct, queue, name, task)),
+                self.timed_read(timings, 'magnet_ps',
+                                self.reserve_and_run('magnet_ps', self.get_dc_field, queue, name, task)),
+                self.timed_read(timings, 'lockin',
+                                self.reserve_and_run('lockin', functools.partial(
+                                    self.get_sr830_trace, out=lockin_traces[:, datapoint_idx]
+                                ), queue, name, task))
+            )
+
+            # Save when the lock-in points were taken, and how long the reads took together
+            if magnetism_state['sr830_stream'] is not None and magnetism_state['sr830_stream']['last_slice']:
+                timings['lockin_slice_start'], timings['lockin_slice_end'] = \
+                    magnetism_state['sr830_stream']['last_slice']
+            timings['wall_time'] = time.time() - timings['dvm_issued']
+            datapoint_timings.append(timings)
 
             # Sort the data into the lists
             # Compute the rms value of the ac_field strength
@@ -331,15 +524,13 @@ class MagnetismQueue(BaseQueueClass):
             # Add the dc field
             dc_fields.append(raw_data[1])
 
-            # Add the amplitude and phase of the measured signal
-            lockin_amplitudes.append(raw_data[2][0])
-            lockin_phases.append(raw_data[2][1])
+            # The amplitude and phase of the measured signal are already in lockin_traces
 
-            print('took single measurement')
+            print(f'took single measurement in {timings["wall_time"]:.3f} s')
 
-        # Create numpy arrays from lock-in data and flatten them
-        lockin_amplitudes_np = np.array(lockin_amplitudes).ravel()
-        lockin_phases_np = np.array(lockin_phases).ravel()
+        # Flatten the lock-in data
+        lockin_amplitudes_np = lockin_traces[0].ravel()
+        lockin_phases_np = lockin_traces[1].ravel()
 
         # Create dataframes to prepare for saving
         magnet_field_frame = pd.DataFrame({
@@ -354,6 +545,13 @@ class MagnetismQueue(BaseQueueClass):
         })
 
         # Save the measurement
+        if magnetism_state['magnet_settling'] is not None:
+            # Save how long the magnet took to settle, so we can plan sweeps
+            magnetism_state['experiment_file'].append(
+                'tables/magnet_settling',
+                pd.DataFrame([dict(magnetism_state['magnet_settling'], step_id=step['id'])], dtype=float),
+                format='table', data_columns=True
+            )
         magnetism_state['experiment_file'].append(
             'tables/magnetic_field_data',
             magnet_field_frame,
@@ -364,13 +562,19 @@ class MagnetismQueue(BaseQueueClass):
             lockin_frame,
             format='table', data_columns=True
         )
+        magnetism_state['experiment_file'].append(
+            'tables/datapoint_timing',
+            pd.DataFrame(datapoint_timings, dtype=float).assign(step_id=step['id']),
+            format='table', data_columns=True
+        )
 
         # Send the measurements to the server
         await self.socket_client.emit('m_got_step_results', {
             'ac_rms_field': ac_fields,
             'dc_field': dc_fields,
-            'lockin_amplitude': get_mean_from_list_of_arrays(lockin_amplitudes),
-            'lockin_phase': get_mean_from_list_of_arrays(lockin_phases),
+            'lockin_amplitude': get_mean_from_list_of_arrays(lockin_traces[0]),
+            'lockin_phase': get_mean_from_list_of_arrays(lockin_traces[1]),
+            'magnet_settling': magnetism_state['magnet_settling'],
             'step_id': step['id']
         })
 
@@ -423,13 +627,10 @@ class MagnetismQueue(BaseQueueClass):
                 self.dvm.trigger_level.set(config['trigger']['trigger_level'])
 
     async def set_oscilloscope_config(self, queue, name, task):
-        # Call the configure function with the configuration
-        self.configure_oscilloscope(task['config'])
-
-    async def set_sr830_config(self, queue, name, task):
-        # Grab the config
-        config = task['config']
+        # Call the configure function with the configuration (in the thread of the oscilloscope)
+        await self.lanes.call('dvm', self.configure_oscilloscope, task['config'])
 
+    def configure_sr830(self, config):
         # Reset any ratios
         self.lockin.ch1_ratio('none')
         self.lockin.ch2_ratio('none')
@@ -445,15 +646,32 @@ class MagnetismQueue(BaseQueueClass):
             if cp in config:
                 self.lockin[cp].set(config[cp])
 
+    async def set_sr830_config(self, queue, name, task):
+        # The datapoints are slices of the buffer, so they can't be larger than it
+        if task['config'].get('buffersize', 0) > self.lockin.buffer_capacity:
+            raise ValueError(f'The lock-in buffer holds at most {self.lockin.buffer_capacity} points')
+
+        # Call the configure function with the configuration (in the thread of the lock-in)
+        await self.lanes.call('lockin', self.configure_sr830, task['config'])
+
+        # The sample rate may have changed, so the stream is restarted when it's used next
+        magnetism_state['sr830_stream'] = None
+
+    # Starts the ramp and returns without waiting for the magnet, await the returned future to wait for it
     async def set_magnet_config(self, queue, name, task):
         # We can only set the magnetic field, so we set that
         if 'magnet_field' in task['config']:
-            old_field = self.magnet_ps.MagneticField.get()
+            old_field = await self.io['magnet_ps'].MagneticField.get()
             new_field = task['config']['magnet_field']
 
             # If there is not at least a 1% difference in the fields, we don't do anything
             if not math.isclose(old_field, new_field, abs_tol=1e-4, rel_tol=0.01):
-                self.magnet_ps.MagneticField.set(new_field)
+                return await self.start_magnet_ramp(new_field)
+
+        # The magnet is already at the field
+        arrived = asyncio.get_running_loop().create_future()
+        arrived.set_result(True)
+        return arrived
 
     def configure_n9310a(self, config):
         # Turn on the signal generator
@@ -468,8 +686,8 @@ class MagnetismQueue(BaseQueueClass):
             self.signal_gen.LFOutputFrequency.set(config['frequency'])
 
     async def set_n9310a_config(self, queue, name, task):
-        # Call the configuration method with the config
-        self.configure_n9310a(task['config'])
+        # Call the configuration method with the config (in the thread of the signal generator)
+        await self.lanes.call('signal_gen', self.configure_n9310a, task['config'])
 
 
 # Create the class containing the namespace for this client
@@ -543,6 +761,9 @@ class MagnetismClientNamespace(BaseClientNamespace):
     async def send_dc_field(self, dc_field):
         await self.emit('m_got_dc_field', dc_field)
 
+    async def send_magnet_ramp_progress(self, progress):
+        await self.emit('m_got_magnet_ramp_progress', progress)
+
     async def send_n9310a_config(self, config):
         await self.emit('m_got_n9310a_config', config)
 
@@ -0,0 +1,181 @@
+# Import math to check for missing values
+import math
+
+# Import numpy for the preallocated arrays
+import numpy as np
+
+
+# Fixed size history of samples, stored as a preallocated 2-D float64 array with a column for each field
+# Every row is written twice (at i and i + capacity), so the latest capacity rows are always contiguous,
+# appending is O(1), and any window of the history is a view of the array (no copies)
+# Each sample has a sequence number, which is the number of samples appended before it
+# Missing values (None) are saved as NaN, and returned as None when samples are turned back into dicts
+class ColumnarRingBuffer():
+    def __init__(self, columns=None, capacity=3600):
+        self.capacity = capacity
+
+        # The number of samples ever appended (and the sequence number of the next sample)
+        self.count = 0
+
+        # The columns can be given later, they are then taken from the first sample
+        self.columns = None
+        self.column_index = None
+        self.data = None
+        if columns is not None:
+            self.allocate(columns)
+
+    # Create the array for a list of columns
+    def allocate(self, columns):
+        self.columns = list(columns)
+        self.column_index = {column: i for i, column in enumerate(self.columns)}
+        self.data = np.full((2 * self.capacity, len(self.columns)), np.nan)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    # The sequence number of the oldest sample in the buffer
+    @property
+    def first_seq(self):
+        return self.count - len(self)
+
+    # Add a sample, a dict of column: value (values of unknown columns are ignored)
+    # Returns the sequence number of the sample
+    def append(self, values):
+        if self.data is None:
+            self.allocate(values.keys())
+
+        # Build the row once, and write it to both halves
+        row = np.full(len(self.columns), np.nan)
+        for column, value in values.items():
+            if column in self.column_index and value is not None:
+                row[self.column_index[column]] = value
+
+        i = self.count % self.capacity
+        self.data[i] = row
+        self.data[i + self.capacity] = row
+
+        self.count += 1
+        return self.count - 1
+
+    # The rows from sequence number start to stop (not included) as a view, clamped to the samples in the buffer
+    def view(self, start=None, stop=None):
+        if self.data is None:
+            return np.empty((0, 0))
+
+        start = self.first_seq if start is None else min(max(start, self.first_seq), self.count)
+        stop = self.count if stop is None else min(max(stop, start), self.count)
+
+        # The oldest sample is at this position, and the next capacity rows are in order
+        offset = self.first_seq % self.capacity
+        return self.data[offset + start - self.first_seq:offset + stop - self.first_seq]
+
+    # A single column from sequence number start to stop as a view
+    def column(self, name, start=None, stop=None):
+        return self.view(start, stop)[:, self.column_index[name]]
+
+    # Turn rows into dicts, with the sequence number of each row as 'seq'
+    def to_dicts(self, rows, first_seq):
+        return [dict(zip(self.columns, [None if math.isnan(value) else value for value in row]), seq=first_seq + i)
+                for i, row in enumerate(rows.tolist())]
+
+    # The samples from sequence number start, as a list of dicts
+    def get_samples(self, start=None):
+        start = self.first_seq if start is None else max(start, self.first_seq)
+        return self.to_dicts(self.view(start), start)
+
+    # A single sample as a dict, by sequence number (negative numbers count back from the latest)
+    def __getitem__(self, seq):
+        if seq < 0:
+            seq += self.count
+
+        if not self.first_seq <= seq < self.count:
+            raise IndexError('Sample is not in the buffer')
+
+        return self.to_dicts(self.view(seq, seq + 1), seq)[0]
+
+    # Get the part of the history recorded after a sequence number
+    # If the requester has nothing (after_seq < 0), is missing samples that are no longer in the buffer,
+    # or the sequence number is from before a restart, we send the latest max_samples samples as a full resync
+    def get_trace_after(self, after_seq, max_samples=None):
+        # Check if we can send the samples as a delta
+        if self.count > 0 and after_seq is not None and after_seq >= 0 and \
+                self.first_seq - 1 <= after_seq <= self.count - 1:
+            return {'full': False, 'samples': self.get_samples(after_seq + 1)}
+
+        # Otherwise we resync
+        start = None if max_samples is None else self.count - max_samples
+        return {'full': True, 'samples': self.get_samples(start)}
+
+
+# History of timestamped samples, used to keep the samples of each instrument
+# The timestamp is saved in the first column
+class RingBuffer(ColumnarRingBuffer):
+    def __init__(self, fields, capacity=3600):
+        self.fields = list(fields)
+        super().__init__(['timestamp'] + self.fields, capacity)
+
+    # Add a sample, values is a dict of field: value (fields that are not in the buffer are ignored)
+    def append(self, timestamp, values):
+        return super().append(dict(values, timestamp=timestamp))
+
+    # The latest sample as a dict, with its 'timestamp' (None if the buffer is empty)
+    def latest(self):
+        if self.count == 0:
+            return None
+
+        sample = self[-1]
+        sample.pop('seq')
+        return sample
+
+    # The samples with start <= time <= end, oldest first, as an array of times and an array of values
+    def window(self, start=-np.inf, end=np.inf):
+        rows = self.view()
+        times = rows[:, 0]
+        keep = (times >= start) & (times <= end)
+        return times[keep], rows[keep, 1:]
+
+    # The mean of each field over the samples in a window, as a dict
+    # If there are no samples in the window, the latest sample before the end is used
+    # A field with an '<field>_age' field holds a reading made age seconds before the sample, which is repeated
+    # until the next reading. It is averaged over the samples whose reading was made in the window, and its age is
+    # the age of the newest of those readings at the end of the window. Without readings made in the window,
+    # the latest reading and its age are used, so an old reading is never passed off as part of the window
+    def window_mean(self, start, end):
+        times, values = self.window(start, end)
+        if len(times) == 0:
+            times, values = self.window(end=end)
+            times, values = times[-1:], values[-1:]
+
+        if len(times) == 0:
+            return {field: None for field in self.fields}
+
+        # Fields that are NaN in every sample stay None
+        counts = np.sum(~np.isnan(values), axis=0)
+        sums = np.nansum(values, axis=0)
+        mean = {field: float(sums[i] / counts[i]) if counts[i] > 0 else None for i, field in enumerate(self.fields)}
+
+        # The fields with the age of their reading only use the readings made in the window
+        for field in self.fields:
+            if field + '_age' in self.column_index:
+                mean[field], mean[field + '_age'] = self.reading_mean(field, start, end)
+
+        return mean
+
+    # The mean of a field over the samples whose reading was made in a window,
+    # and the age of the newest of those readings at the end of the window
+    # Returns the latest reading before the end and its age if none were made in the window (None if there are none)
+    def reading_mean(self, field, start, end):
+        times, values = self.window(end=end)
+        readings = values[:, self.fields.index(field)]
+        read_times = times - values[:, self.fields.index(field + '_age')]
+
+        known = ~np.isnan(readings) & ~np.isnan(read_times)
+        readings, read_times = readings[known], read_times[known]
+        if len(readings) == 0:
+            return None, None
+
+        in_window = read_times >= start
+        if not np.any(in_window):
+            return float(readings[-1]), float(end - read_times[-1])
+
+        return float(np.mean(readings[in_window])), float(end - np.max(read_times[in_window]))
@@ -25,6 +25,10 @@ tcs_address = 'ASRL8::INSTR'
 resistance_bridge_address = 'COM9'
 maxigauge_address = 'COM10'
 
+# Set to put the MaxiGauge in continuous mode (0 = every 100 ms, 1 = every second, 2 = every minute)
+# The pressures are then read from the stream instead of being queried
+maxigauge_stream_mode = None
+
 
 def setup_instruments():
     # Setup the Picowatt resistance bridge
@@ -40,7 +44,8 @@ def setup_instruments():
     ghs = LeidenCryogenics_GHS_2T_1T_700_CF.LC_GHS('ghs', ghs_address)
 
     # Setup the Pfeiffer Vacuum MaxiGauge TPG256A
-    maxigauge = PfeifferVacuum_MaxiGauge.MaxiGauge('maxigauge', maxigauge_address)
+    maxigauge = PfeifferVacuum_MaxiGauge.MaxiGauge('maxigauge', maxigauge_address,
+                                                   stream_mode=maxigauge_stream_mode)
 
     # Return the instruments as a list
     return [resistance_bridge, tcs, ghs, dmm, maxigauge]
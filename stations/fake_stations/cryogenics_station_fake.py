@@ -55,30 +55,39 @@ def setup_instruments():
 
     class ghs_mock(DummyInstrument):
         # Mock GHS methods
+        led_mask = 0
+        key_mask = 0
+
+        def refresh(self, group='full', max_age=None):
+            sent = []
+            if group in ['status', 'full']:
+                # Get system status
+                self.status.set(4)
+
+                # Get pressure settings
+                self.set_p6_low.set(1)
+                self.set_p6_high.set(100)
+                self.set_p7_low.set(1)
+                self.set_p7_high.set(100)
+                sent += ['status', 'settings']
+
+            if group in ['panel', 'full']:
+                # Get LED and KEY statuses (all off)
+                self.led_mask = 0
+                self.key_mask = 0
+                sent += ['leds', 'keys']
+
+            if group in ['pressures', 'full']:
+                # Get pressures
+                for i in range(1, 9):
+                    # Create a parameter for each sensor
+                    self[f'pressure_p{i}'].set(np.random.normal() + 3)
+                sent += ['pressures']
+
+            return sent
+
         def get_all_params(self):
-            # Get system status
-            self.status.set(4)
-
-            # Get pressure settings
-            self.set_p6_low.set(1)
-            self.set_p6_high.set(100)
-            self.set_p7_low.set(1)
-            self.set_p7_high.set(100)
-
-            # Get LED statuses
-            for i in range(1, 65):
-                # Create a parameter for each led
-                self[f'led_x{i + 100}'].set(0)
-
-            # Get KEY statuses
-            for i in range(1, 65):
-                # Create a parameter for each key
-                self[f'key_x{i + 100}'].set(0)
-
-            # Get pressures
-            for i in range(1, 9):
-                # Create a parameter for each sensor
-                self[f'pressure_p{i}'].set(np.random.normal() + 3)
+            self.refresh('full', max_age=0)
 
     ghs = ghs_mock('ghs', gates=ghs_gates)
 
@@ -16,6 +16,11 @@ from qcodes import Station
 from qcodes.tests.instrument_mocks import DummyInstrument
 from qcodes.instrument.parameter import ArrayParameter, Parameter
 
+# Import the magnet controller to share the ramp helpers
+from instrument_drivers.CryogenicsLimited_MagnetController import MagnetController, FieldSettlingDetector
+
+import time
+
 import numpy as np
 
 
@@ -89,8 +94,9 @@ def setup_instruments():
                                    'ch1_display', 'ch2_display', 'X', 'Y', 'R', 'P', 'buffer_SR', 'buffer_acq_mode',
                                    'buffer_trig_mode', 'buffer_npts'])
 
-    # Set a default npts
+    # Set a default npts and sample rate
     sr830.buffer_npts.set(256)
+    sr830.buffer_SR.set(512)
 
     # Create fake channels
     sr830.ch1_databuffer = SR830_fake_ChannelBuffer('ch1_databuffer', sr830, 1)
@@ -101,6 +107,29 @@ def setup_instruments():
     sr830.buffer_start = lambda: 0
     sr830.buffer_pause = lambda: 0
 
+    # Mock the streaming of the buffer, it fills at the buffer sample rate until it's full
+    sr830.buffer_capacity = 16383
+    sr830.stream_rate = None
+    sr830.stream_start_time = None
+
+    def fake_start_stream():
+        sr830.stream_rate = float(sr830.buffer_SR.get())
+        sr830.stream_start_time = time.time()
+        return sr830.stream_rate
+
+    sr830.start_stream = fake_start_stream
+    sr830.get_stream_count = lambda: min(int((time.time() - sr830.stream_start_time) * sr830.stream_rate),
+                                         sr830.buffer_capacity)
+
+    def fake_read_stream(start, n_points, out=None):
+        if out is None:
+            out = np.empty((2, n_points))
+
+        out[:, :n_points] = np.random.normal(size=(2, n_points))
+        return out[:, :n_points]
+
+    sr830.read_stream = fake_read_stream
+
     # Remove validators (they're wrong)
     sr830.ch1_ratio.vals = None
     sr830.ch2_ratio.vals = None
@@ -126,6 +155,21 @@ def setup_instruments():
     magnet_ps.set_magnetic_field = lambda field: fake_set_magnet_ps(field)
     magnet_ps.get_magnetic_field = lambda: fake_get_magnet_ps()
 
+    # The fake magnet ramps instantly, but uses the same ramp interface as the real one
+    magnet_ps.ramp_rate = 0.25 * 0.14619
+    magnet_ps.ramp_target = None
+
+    def fake_start_ramp(field):
+        magnet_ps.ramp_target = round(float(field), 4)
+        magnet_ps.MagneticField.set(magnet_ps.ramp_target)
+
+    magnet_ps.start_ramp = fake_start_ramp
+    magnet_ps.forget_controller_state = lambda: None
+    magnet_ps.is_at_field = MagnetController.is_at_field
+    magnet_ps.ramp_eta = lambda field: abs(magnet_ps.ramp_target - field) / magnet_ps.ramp_rate
+    magnet_ps.settling_detector = lambda **kwargs: FieldSettlingDetector(magnet_ps.ramp_target, magnet_ps.ramp_rate,
+                                                                          **kwargs)
+
     # And finally the voltmeter (Implemented using a Tektronix TBS1072B oscilloscope,
     # which happens to need the same driver as the TPS2012B)
     tek_scope = DummyInstrument('dvm', gates=['horizontal_scale', 'trigger_type', 'trigger_source', 'trigger_level'])
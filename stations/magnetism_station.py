@@ -15,9 +15,9 @@ Talks to the following instruments:
 from qcodes import Station
 
 # Import instruments
-from qcodes.instrument_drivers.stanford_research.SR830 import SR830
 from qcodes.instrument_drivers.tektronix.TPS2012 import TPS2012
 from instrument_drivers import Keysight_N9310A
+from instrument_drivers import StanfordResearch_SR830
 from instrument_drivers import CryogenicsLimited_MagnetController
 
 # VISA addresses for the instruments
@@ -31,7 +31,7 @@ magnet_ps_address = 'ASRL4::INSTR'
 def setup_instruments():
     # Here we create actual instruments with connections to physical hardware
     # Start with the lock-in amplifier
-    sr830 = SR830('lockin', lock_in_amplifier_address)
+    sr830 = StanfordResearch_SR830.SR830('lockin', lock_in_amplifier_address)
 
     # Next we have the signal generator, this controls the AC field
     n9310a = Keysight_N9310A.N9310A('signal_gen', signal_generator_address)
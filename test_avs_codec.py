@@ -0,0 +1,325 @@
+"""
+Tests of the AVS-47B word codec and line transfers.
+The codec is compared to the original string based implementation over every value of every field.
+The line transfers are run against a mock serial port, and must toggle the lines exactly like the original
+bit-by-bit implementation.
+Does not need the instrument (or qcodes).
+"""
+
+import itertools
+import struct
+import sys
+import time
+import unittest
+
+import numpy as np
+
+from instrument_drivers.Picowatt_AVS47B_protocol import encode_tx, decode_rx, word_to_bits, bits_to_word, \
+    SerialLineTransfer, IoctlLineTransfer
+
+
+# The original txstring construction, taking the values instead of the instrument parameters
+def legacy_construct_txstring(reference_voltage, input_mode, channel, display, excitation, range_code, remote,
+                              alarm_line):
+    txstring = [0] * 48
+    txstring[-5] = alarm_line
+    txstring[-7] = int(remote)
+
+    range_int = f'{int(range_code):0=3b}'
+    txstring[-9] = int(range_int[-1])
+    txstring[-10] = int(range_int[-2])
+    txstring[-11] = int(range_int[-3])
+
+    excitation_int = f'{int(excitation):0=3b}'
+    txstring[-12] = int(excitation_int[-1])
+    txstring[-13] = int(excitation_int[-2])
+    txstring[-14] = int(excitation_int[-3])
+
+    display_int = f'{int(display):0=3b}'
+    txstring[-15] = int(display_int[-1])
+    txstring[-16] = int(display_int[-2])
+    txstring[-17] = int(display_int[-3])
+
+    channel_int = f'{int(channel):0=3b}'
+    txstring[-18] = int(channel_int[-1])
+    txstring[-19] = int(channel_int[-2])
+    txstring[-20] = int(channel_int[-3])
+
+    input_int = f'{int(input_mode):0=2b}'
+    txstring[-21] = int(input_int[-1])
+    txstring[-22] = int(input_int[-2])
+
+    txstring[-25] = 1
+    txstring[-26] = 1
+
+    ref_voltage_int = f'{int(reference_voltage):0=16b}'
+    for i in range(len(ref_voltage_int)):
+        txstring[i] = int(ref_voltage_int[i])
+
+    return txstring
+
+
+# The original rxstring decoder
+def legacy_decode_rxstring(rxstring):
+    a = ''
+    for b in rxstring:
+        a += str(b)
+
+    ovr = int(a[5], base=2)
+    pol = int(a[6], base=2)
+    msd = int(a[7], base=2)
+    d3 = int(a[8:12], base=2)
+    d2 = int(a[12:16], base=2)
+    d1 = int(a[16:20], base=2)
+    lsd = int(a[20:24], base=2)
+
+    input_out = int(a[26:28], base=2)
+    ch_out = int(a[28:31], base=2)
+    disp_out = int(a[31:34], base=2)
+    excitation = int(a[34:37], base=2)
+    range_out = int(a[37:40], base=2)
+
+    adc = 10000 * msd + 1000 * d3 + 100 * d2 + 10 * d1 + lsd
+    if pol == 0:
+        adc *= -1.
+
+    resistance = adc * 10 ** (range_out - 5)
+
+    return ovr, resistance, adc, input_out, ch_out, disp_out, excitation, range_out
+
+
+# Build a received word from its fields
+def make_rx_word(ovr, pol, msd, digits, state):
+    word = ovr << 42 | pol << 41 | msd << 40
+    for shift, digit in zip((36, 32, 28, 24), digits):
+        word |= digit << shift
+
+    input_out, ch_out, disp_out, excitation, range_out = state
+    return word | input_out << 20 | ch_out << 17 | disp_out << 14 | excitation << 11 | range_out << 8
+
+
+# Mock of the serial port connected to the bridge
+# RTS is the clock, DTR is shifted in on the rising edge, and CTS shows the bit being shifted out
+# Every change of the lines and every read of CTS is logged, so waveforms can be compared
+class MockAVSPort():
+    def __init__(self, output_bits, op_delay=0.0):
+        # The state of the lines
+        self._rts = False
+        self._dtr = False
+
+        # Count the line operations
+        self.n_sets = 0
+        self.n_reads = 0
+
+        # Time each line operation takes (the real port takes a syscall or a USB round trip)
+        self.op_delay = op_delay
+
+        self.reset(output_bits)
+
+    def reset(self, output_bits):
+        # The bits the bridge shifts out, and the bits it received
+        self.output_bits = list(output_bits)
+        self.received = []
+        self.strobes = 0
+        self.pulses = 0
+
+        # The waveform, as ('set', rts, dtr) for every change and ('read', rts, dtr) for every read
+        self.events = []
+
+    def wait(self):
+        if self.op_delay > 0:
+            end = time.perf_counter() + self.op_delay
+            while time.perf_counter() < end:
+                pass
+
+    def set_lines(self, rts, dtr):
+        # Three pulses on the data line without a clock pulse in between is a strobe
+        if not rts and not self._rts and dtr and not self._dtr:
+            self.pulses += 1
+            if self.pulses == 3:
+                self.strobes += 1
+                self.pulses = 0
+
+        # A rising edge on the clock shifts a bit in and out
+        if rts and not self._rts:
+            self.pulses = 0
+            self.received.append(int(dtr))
+            if len(self.output_bits) > 0:
+                self.output_bits.pop(0)
+
+        # Setting a line to the state it's already in does not change the waveform
+        if (rts, dtr) != (self._rts, self._dtr):
+            self.events.append(('set', rts, dtr))
+
+        self._rts = rts
+        self._dtr = dtr
+        self.n_sets += 1
+        self.wait()
+
+    def read_cts(self):
+        self.events.append(('read', self._rts, self._dtr))
+        self.n_reads += 1
+        self.wait()
+        return bool(self.output_bits[0]) if len(self.output_bits) > 0 else False
+
+    @property
+    def cts(self):
+        return self.read_cts()
+
+    @property
+    def rts(self):
+        return self._rts
+
+    @rts.setter
+    def rts(self, value):
+        self.set_lines(bool(value), self._dtr)
+
+    @property
+    def dtr(self):
+        return self._dtr
+
+    @dtr.setter
+    def dtr(self, value):
+        self.set_lines(self._rts, bool(value))
+
+    def fileno(self):
+        return 3
+
+
+# Mock of the modem ioctls, driving the mock port
+def make_mock_ioctl(port):
+    import termios
+
+    def ioctl(fd, request, buffer):
+        if request == termios.TIOCMGET:
+            lines = termios.TIOCM_CTS if port.read_cts() else 0
+            if port.rts:
+                lines |= termios.TIOCM_RTS
+            if port.dtr:
+                lines |= termios.TIOCM_DTR
+            return struct.pack('I', lines)
+
+        lines = struct.unpack('I', buffer)[0]
+        port.set_lines(bool(lines & termios.TIOCM_RTS), bool(lines & termios.TIOCM_DTR))
+        return buffer
+
+    return ioctl
+
+
+# The original line transfer, used as the reference
+class LegacyTransfer():
+    def __init__(self, ser):
+        self.ser = ser
+
+    def transfer(self, tx):
+        rx = [0] * len(tx)
+        for i in range(len(tx)):
+            self.ser.rts = False
+            rx[i] = int(self.ser.cts)
+            self.ser.dtr = bool(tx[i])
+            self.ser.rts = True
+            self.ser.rts = False
+            self.ser.dtr = False
+
+        return rx
+
+    def strobe(self):
+        for _ in range(3):
+            self.ser.rts = False
+            self.ser.dtr = False
+            self.ser.dtr = True
+            self.ser.dtr = False
+
+
+# One config exchange, like send_config does it
+def exchange(transfer, txstring):
+    address = [0, 0, 0, 0, 0, 0, 0, 1]
+    rx_address = transfer.transfer(address)
+    transfer.strobe()
+    rxstring = transfer.transfer(txstring)
+    transfer.strobe()
+    return rx_address, rxstring
+
+
+# Run random exchanges through a transfer, returns the results, the bits received, the strobes and the waveforms
+def run_exchanges(make_transfer, n_exchanges=50):
+    rng = np.random.default_rng(0)
+    outputs = rng.integers(0, 2, size=(n_exchanges, 56))
+    configs = rng.integers(0, 2, size=(n_exchanges, 48))
+
+    port = MockAVSPort(outputs[0])
+    transfer = make_transfer(port)
+
+    results = []
+    for i in range(n_exchanges):
+        port.reset(outputs[i])
+        result = exchange(transfer, list(configs[i]))
+        results.append((result, port.received, port.strobes, port.events))
+
+    return results
+
+
+class AvsCodecTest(unittest.TestCase):
+    # Every reference voltage the parameter allows, with a fixed config
+    def test_encode_reference_voltages(self):
+        for reference_voltage in range(20001):
+            args = (reference_voltage, 1, 3, 0, 4, 7, True, 0)
+            self.assertEqual(word_to_bits(encode_tx(*args)), legacy_construct_txstring(*args))
+
+    # Every combination of the other config fields
+    def test_encode_config_fields(self):
+        for args in itertools.product(range(4), range(8), range(8), range(8), range(8), (False, True), (0, 1)):
+            args = (10000,) + args
+            self.assertEqual(word_to_bits(encode_tx(*args)), legacy_construct_txstring(*args))
+
+    # Every ADC reading (all 4 bit digits, not only BCD), with both signs and overrange flags
+    def test_decode_measurements(self):
+        for ovr, pol, msd in itertools.product((0, 1), (0, 1), (0, 1)):
+            for digits in itertools.product(range(16), repeat=4):
+                rxstring = word_to_bits(make_rx_word(ovr, pol, msd, digits, (1, 2, 0, 4, 5)))
+                self.assertEqual(decode_rx(bits_to_word(rxstring)), legacy_decode_rxstring(rxstring))
+
+    # Every BCD reading on every range, with both signs
+    def test_decode_ranges(self):
+        for pol, msd, range_out in itertools.product((0, 1), (0, 1), range(8)):
+            for digits in itertools.product(range(10), repeat=4):
+                rxstring = word_to_bits(make_rx_word(0, pol, msd, digits, (1, 2, 0, 4, range_out)))
+                self.assertEqual(decode_rx(bits_to_word(rxstring)), legacy_decode_rxstring(rxstring))
+
+    # Every combination of the state fields
+    def test_decode_state_fields(self):
+        for state in itertools.product(range(4), range(8), range(8), range(8), range(8)):
+            rxstring = word_to_bits(make_rx_word(0, 1, 1, (2, 3, 4, 5), state))
+            self.assertEqual(decode_rx(bits_to_word(rxstring)), legacy_decode_rxstring(rxstring))
+
+    # The config sent is read back at the same positions
+    def test_round_trip(self):
+        for args in itertools.product(range(4), range(8), range(8), range(8), range(8)):
+            word = encode_tx(0, *args, True, 0)
+            self.assertEqual(decode_rx(word)[3:], args)
+            self.assertEqual(bits_to_word(word_to_bits(word)), word)
+
+
+class AvsTransferTest(unittest.TestCase):
+    # The same bits in and out, the same strobes, and the same changes of the lines as the original
+    def test_serial_transfer(self):
+        self.assertEqual(run_exchanges(SerialLineTransfer), run_exchanges(LegacyTransfer))
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'The ioctl transfer is only used on Linux')
+    def test_ioctl_transfer(self):
+        self.assertEqual(run_exchanges(lambda port: IoctlLineTransfer(port, make_mock_ioctl(port))),
+                         run_exchanges(LegacyTransfer))
+
+    # The data line is returned low after every 1 bit, like the original
+    def test_data_line_returns_low(self):
+        port = MockAVSPort([0] * 4)
+        SerialLineTransfer(port).transfer([1, 1, 0, 1])
+        self.assertEqual([event for event in port.events if event[0] == 'set'],
+                         [('set', False, True), ('set', True, True), ('set', False, True), ('set', False, False),
+                          ('set', False, True), ('set', True, True), ('set', False, True), ('set', False, False),
+                          ('set', True, False), ('set', False, False),
+                          ('set', False, True), ('set', True, True), ('set', False, True), ('set', False, False)])
+
+
+if __name__ == '__main__':
+    unittest.main()
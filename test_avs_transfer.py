@@ -0,0 +1,52 @@
+"""
+Benchmark of the AVS-47B line transfers against a mock serial port.
+The mock behaves like the shift register of the bridge, and counts the line operations.
+The transfers are checked against the original bit-by-bit implementation in test_avs_codec.py, this only times them.
+Does not need the instrument (or qcodes).
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from instrument_drivers.Picowatt_AVS47B_protocol import SerialLineTransfer, IoctlLineTransfer
+from test_avs_codec import MockAVSPort, make_mock_ioctl, LegacyTransfer, exchange
+
+
+def run_transfer(name, make_transfer, n_exchanges, op_delay):
+    rng = np.random.default_rng(0)
+
+    # Random data from the bridge, and random configs to send
+    outputs = rng.integers(0, 2, size=(n_exchanges, 56))
+    configs = rng.integers(0, 2, size=(n_exchanges, 48))
+
+    # Time the transfer
+    port = MockAVSPort(outputs[0], op_delay)
+    transfer = make_transfer(port)
+    port.n_sets, port.n_reads = 0, 0
+    start = time.perf_counter()
+    for i in range(n_exchanges):
+        port.reset(outputs[i])
+        exchange(transfer, list(configs[i]))
+    elapsed = time.perf_counter() - start
+
+    print(f'{name:>8}: {port.n_sets / n_exchanges:6.1f} line sets, {port.n_reads / n_exchanges:5.1f} line reads, '
+          f'{1e3 * elapsed / n_exchanges:7.3f} ms per exchange')
+
+
+def main_run():
+    n_exchanges = 200
+
+    # Run once without delays (python overhead only), and once with 20 us per line operation
+    for op_delay in [0.0, 20e-6]:
+        print(f'Line operation delay: {op_delay * 1e6:.0f} us')
+        run_transfer('original', LegacyTransfer, n_exchanges, op_delay)
+        run_transfer('serial', SerialLineTransfer, n_exchanges, op_delay)
+
+        if sys.platform.startswith('linux'):
+            run_transfer('ioctl', lambda port: IoctlLineTransfer(port, make_mock_ioctl(port)), n_exchanges, op_delay)
+
+
+if __name__ == '__main__':
+    main_run()
@@ -0,0 +1,89 @@
+"""
+Tests of the scheduler deciding which resistance bridge channels are read, and in which order.
+The times are passed in, so the decisions are checked without waiting.
+Does not need the instruments (or qcodes).
+"""
+
+import unittest
+
+from socket_clients.bridge_scheduler import BridgeChannelScheduler
+
+
+# A still read every 10 s and two mixing chamber sensors read every 30 s, all read at time 0 (the bridge is on 3)
+def make_scheduler(**kwargs):
+    scheduler = BridgeChannelScheduler(**kwargs)
+    for channel in [1, 2, 3]:
+        scheduler.record(channel, 0.1 * channel, now=0.0)
+
+    return scheduler
+
+
+class BridgeChannelSchedulerTest(unittest.TestCase):
+    # Every channel is read the first time, starting with the channel the bridge is on
+    def test_first_plan(self):
+        scheduler = BridgeChannelScheduler()
+        scheduler.current_channel = 2
+        self.assertEqual(scheduler.plan(now=0.0), [2, 1, 3])
+
+    # A channel is only read once its interval has passed
+    def test_intervals(self):
+        scheduler = make_scheduler()
+
+        self.assertEqual(scheduler.plan(now=5.0), [])
+        self.assertEqual(scheduler.plan(now=10.0), [1])
+
+        # The still is read again, the mixing chambers are due at 30 s, the most overdue first
+        scheduler.record(1, 0.1, now=10.0)
+        scheduler.record(2, 0.2, now=1.0)
+        scheduler.current_channel = None
+        self.assertEqual(scheduler.plan(now=31.0), [1, 3, 2])
+
+    # The channel the bridge is on goes first, since it needs no switch
+    def test_current_channel_first(self):
+        scheduler = make_scheduler()
+        scheduler.record(2, 0.2, now=1.0)
+        scheduler.current_channel = 2
+        self.assertEqual(scheduler.plan(now=40.0), [2, 1, 3])
+
+    # The channel the bridge is on is read early when we have to switch away anyway
+    def test_early_read(self):
+        scheduler = make_scheduler()
+        scheduler.current_channel = 3
+
+        # Half of the interval of channel 3 has passed when the still is due
+        self.assertEqual(scheduler.plan(now=15.0), [3, 1])
+
+        # Not early enough, and nothing else is due
+        self.assertEqual(scheduler.plan(now=14.0), [1])
+        self.assertEqual(scheduler.plan(now=9.0), [])
+
+    # The control channel is read control_boost times as often, and the boost follows the control channel
+    def test_control_boost(self):
+        scheduler = make_scheduler(control_channel=2, control_boost=3.0)
+        self.assertEqual(scheduler.get_interval(2), 10.0)
+        self.assertEqual(scheduler.get_interval(3), 30.0)
+        self.assertEqual(scheduler.plan(now=10.0), [1, 2])
+
+        scheduler.set_control_channel(None)
+        self.assertEqual(scheduler.get_interval(2), 30.0)
+        self.assertEqual(scheduler.plan(now=10.0), [1])
+
+    # Changing an interval changes the decisions, and doesn't leak into the defaults
+    def test_set_interval(self):
+        scheduler = make_scheduler()
+        scheduler.set_interval(3, 5)
+        self.assertEqual(scheduler.plan(now=5.0), [3])
+        self.assertEqual(BridgeChannelScheduler().get_interval(3), 30.0)
+
+    # The channels that are not read keep their value, with its age
+    def test_temperatures(self):
+        scheduler = BridgeChannelScheduler()
+        scheduler.record(1, 0.5, now=100.0)
+        self.assertEqual(scheduler.get_temperatures(now=104.0),
+                         {'t_still': 0.5, 't_still_age': 4.0,
+                          't_mixing_chamber_1': None, 't_mixing_chamber_1_age': None,
+                          't_mixing_chamber_2': None, 't_mixing_chamber_2_age': None})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+"""
+Import smoke tests of the socket clients.
+Imports the clients with the fake stations, which catches missing imports and names used at import time.
+Needs the dependencies of the clients (qcodes, pandas and socketio), but not the instruments.
+"""
+
+import os
+import sys
+import unittest
+
+# The clients are started from the socket_clients folder, so their sibling modules are imported without the package
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/socket_clients')
+
+# Use the mocked stations, so the real instruments are never opened
+os.environ.setdefault('USE_FAKE_STATIONS', '1')
+
+
+class ClientImportTest(unittest.TestCase):
+    def test_cryogenics_client(self):
+        import cryogenics_client
+
+        # The history is kept in ring buffers
+        self.assertEqual(len(cryogenics_client.experiment_state['temperatures']), 0)
+        self.assertEqual(len(cryogenics_client.experiment_state['pressures']), 0)
+        self.assertTrue(issubclass(cryogenics_client.CryoClientNamespace, cryogenics_client.BaseClientNamespace))
+
+    def test_magnetism_client(self):
+        import magnetism_client
+
+        self.assertTrue(issubclass(magnetism_client.MagnetismClientNamespace,
+                                   magnetism_client.BaseClientNamespace))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Tests of the detector deciding when the magnet has settled at the target of a ramp.
+The readings are made up and timestamped, so the decisions are checked without waiting.
+Does not need the magnet controller, but the driver module needs qcodes.
+"""
+
+import unittest
+
+import numpy as np
+
+
+def has_qcodes():
+    try:
+        import qcodes
+    except ImportError:
+        return False
+    return True
+
+
+# A detector for a ramp to 1 T at 0.1 T/s
+def make_detector(**kwargs):
+    from instrument_drivers.CryogenicsLimited_MagnetController import FieldSettlingDetector
+    return FieldSettlingDetector(1.0, 0.1, **kwargs)
+
+
+# Add readings at one second intervals, starting at start, returns whether the last one was settled
+def add_readings(detector, fields, start=0.0):
+    settled = False
+    for i, field in enumerate(fields):
+        settled = detector.add_reading(field, timestamp=start + i)
+
+    return settled
+
+
+@unittest.skipUnless(has_qcodes(), 'The driver needs qcodes')
+class FieldSettlingDetectorTest(unittest.TestCase):
+    # A ramp that arrives at the target and stays there with a little noise settles after a full window
+    def test_settles(self):
+        detector = make_detector()
+        rng = np.random.default_rng(0)
+
+        # Ramp for 10 s, then hold the field
+        ramp = list(np.linspace(0.0, 1.0, 11))
+        hold = list(1.0 + 1e-5 * rng.standard_normal(12))
+        self.assertTrue(add_readings(detector, ramp + hold))
+
+        # Close to the target from the last reading of the ramp, and settled once the window is full of them
+        report = detector.report()
+        self.assertEqual(report['ramp_time'], 10.0)
+        self.assertEqual(report['settling_time'], detector.window - 1)
+        self.assertEqual(report['total_time'], 10.0 + detector.window - 1)
+
+    # Not settled before the window is full, even at the target
+    def test_needs_full_window(self):
+        detector = make_detector()
+        self.assertFalse(add_readings(detector, [1.0] * (detector.window - 1)))
+        self.assertTrue(detector.add_reading(1.0, timestamp=detector.window - 1))
+
+    # A field within the tolerance that still drifts does not settle
+    def test_drift_does_not_settle(self):
+        detector = make_detector()
+        self.assertFalse(add_readings(detector, 0.995 + 5e-4 * np.arange(16)))
+        self.assertIsNone(detector.report()['settling_time'])
+
+    # A noisy field within the tolerance does not settle
+    def test_noise_does_not_settle(self):
+        detector = make_detector()
+        self.assertFalse(add_readings(detector, 1.0 + 0.005 * (-1.0) ** np.arange(16)))
+
+    # The overshoot is the furthest past the target, in the direction of the ramp
+    def test_overshoot(self):
+        detector = make_detector()
+        add_readings(detector, [0.0, 0.5, 1.004, 1.002, 1.0])
+        self.assertAlmostEqual(detector.report()['overshoot'], 0.004)
+
+        # Ramping down, readings below the target are the overshoot
+        from instrument_drivers.CryogenicsLimited_MagnetController import FieldSettlingDetector
+        detector = FieldSettlingDetector(0.0, 0.1)
+        add_readings(detector, [1.0, 0.5, -0.003, 0.0])
+        self.assertAlmostEqual(detector.report()['overshoot'], 0.003)
+
+    # Slow polling far from the target, fast polling close to it
+    def test_next_interval(self):
+        detector = make_detector(min_interval=0.2, max_interval=3.0)
+        self.assertEqual(detector.next_interval(), 0.2)
+
+        # 10 s to go is polled every 2.5 s, 100 s to go is capped
+        detector.add_reading(0.0, timestamp=0.0)
+        self.assertEqual(detector.next_interval(), 2.5)
+        detector = make_detector(min_interval=0.2, max_interval=3.0)
+        detector.add_reading(-9.0, timestamp=0.0)
+        self.assertEqual(detector.next_interval(), 3.0)
+
+        # Close to the target
+        detector.add_reading(0.995, timestamp=1.0)
+        self.assertEqual(detector.next_interval(), 0.2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+"""
+Tests of the GHS valve procedures and the shared pressure stream.
+The buttons and the pressures are fakes, so the procedures can be run without the GHS (or qcodes).
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+# The clients are started from the socket_clients folder, so their sibling modules are imported without the package
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/socket_clients')
+
+from ghs_procedures import PressureStream, GHSProcedureRunner, ghs_procedures
+
+
+# Fake of the GHS pressures, every read returns the next P4 pressure in the list (the last one is repeated)
+class FakePressures():
+    def __init__(self, p4_values):
+        self.p4_values = list(p4_values)
+        self.n_reads = 0
+
+    async def read_pressures(self):
+        value = self.p4_values[min(self.n_reads, len(self.p4_values) - 1)]
+        self.n_reads += 1
+        return {'pressure_p4': value}
+
+
+# Fake of the front panel, keeps the buttons pressed in order
+class FakeButtons():
+    def __init__(self):
+        self.pressed = []
+
+    async def press_buttons(self, *buttons):
+        self.pressed += buttons
+
+
+# A procedure which waits for a pressure that is never reached
+waiting_procedures = {
+    'wait_forever': [
+        {'press': ['s3']},
+        {'wait_for': ('pressure_p4', '<=', 3), 'timeout': None},
+        {'press': ['s1']}
+    ],
+    'wait_too_long': [
+        {'press': ['s3']},
+        {'wait_for': ('pressure_p4', '<=', 3), 'timeout': 0.1},
+        {'press': ['s1']}
+    ]
+}
+
+
+class PressureStreamTest(unittest.TestCase):
+    # A condition that is never met times out, and the polling stops with the last waiter
+    def test_timeout(self):
+        async def run():
+            fake = FakePressures([10])
+            stream = PressureStream(fake.read_pressures, min_interval=0.01)
+
+            with self.assertRaises(asyncio.TimeoutError):
+                await stream.wait_for(('pressure_p4', '<=', 3), timeout=0.1)
+
+            self.assertEqual(stream.n_waiters, 0)
+            self.assertGreater(fake.n_reads, 0)
+
+            # Let the poller notice it has no waiters
+            await asyncio.sleep(0.05)
+            self.assertIsNone(stream.poll_task)
+
+            # Nothing is read while nobody waits
+            n_reads = fake.n_reads
+            await asyncio.sleep(0.05)
+            self.assertEqual(fake.n_reads, n_reads)
+
+        asyncio.run(run())
+
+    # Waiters share the readings, so the pressures are read once per interval whatever the number of waiters
+    def test_shared_polling(self):
+        async def run():
+            fake = FakePressures([10, 5, 2, 0.5])
+            stream = PressureStream(fake.read_pressures, min_interval=0.02)
+
+            first, second = await asyncio.gather(stream.wait_for(('pressure_p4', '<=', 3), timeout=5),
+                                                 stream.wait_for(('pressure_p4', '<=', 1), timeout=5))
+
+            self.assertEqual(first['pressure_p4'], 2)
+            self.assertEqual(second['pressure_p4'], 0.5)
+            self.assertEqual(fake.n_reads, 4)
+
+        asyncio.run(run())
+
+    # A reading published from elsewhere wakes up the waiters, without reading the pressures
+    def test_published_reading(self):
+        async def run():
+            fake = FakePressures([10])
+            stream = PressureStream(fake.read_pressures, min_interval=1.0)
+
+            stream.publish({'pressure_p4': 10})
+            waiter = asyncio.ensure_future(stream.wait_for(('pressure_p4', '<=', 3), timeout=5))
+            await asyncio.sleep(0.01)
+
+            stream.publish({'pressure_p4': 1})
+            self.assertEqual((await waiter)['pressure_p4'], 1)
+            self.assertEqual(fake.n_reads, 0)
+
+        asyncio.run(run())
+
+
+class GHSProcedureRunnerTest(unittest.TestCase):
+    def make_runner(self, p4_values, procedures=None):
+        self.buttons = FakeButtons()
+        self.pressures = FakePressures(p4_values)
+        stream = PressureStream(self.pressures.read_pressures, min_interval=0.01)
+        return GHSProcedureRunner(self.buttons.press_buttons, stream, procedures)
+
+    # A procedure runs its steps in order
+    def test_run(self):
+        runner = self.make_runner([10, 2], {'pump': waiting_procedures['wait_forever']})
+
+        self.assertTrue(asyncio.run(runner.run('pump')))
+        self.assertEqual(self.buttons.pressed, ['s3', 's1'])
+        self.assertIsNone(runner.running)
+
+    # Only the procedures known by name are run, nothing is pressed otherwise
+    def test_unknown_procedure(self):
+        runner = self.make_runner([10])
+
+        for procedure in ['open_everything', [{'press': ['reset']}, {'press': ['1', '2', '3']}], None]:
+            self.assertFalse(runner.has_procedure(procedure))
+            with self.assertRaises(ValueError):
+                asyncio.run(runner.run(procedure))
+
+        self.assertTrue(all(runner.has_procedure(name) for name in ghs_procedures))
+        self.assertEqual(self.buttons.pressed, [])
+
+    # Aborting stops at the current step, resets the GHS, and the runner can run again
+    def test_abort(self):
+        async def run():
+            runner = self.make_runner([10], waiting_procedures)
+
+            task = asyncio.ensure_future(runner.run('wait_forever'))
+            await asyncio.sleep(0.05)
+            self.assertEqual(runner.running, 'wait_forever')
+            self.assertEqual(runner.current_step, 1)
+
+            # A second procedure can't run at the same time
+            with self.assertRaises(RuntimeError):
+                await runner.run('wait_too_long')
+
+            runner.abort()
+            self.assertFalse(await task)
+            self.assertEqual(self.buttons.pressed, ['s3', 'reset'])
+            self.assertIsNone(runner.running)
+            self.assertIsNone(runner.aborted)
+
+            # The runner is ready for the next procedure
+            self.pressures.p4_values = [2]
+            self.assertTrue(await runner.run('wait_forever'))
+            self.assertEqual(self.buttons.pressed, ['s3', 'reset', 's3', 's1'])
+
+        asyncio.run(run())
+
+    # A wait that times out resets the GHS like an abort
+    def test_timeout(self):
+        runner = self.make_runner([10], waiting_procedures)
+
+        self.assertFalse(asyncio.run(runner.run('wait_too_long')))
+        self.assertEqual(self.buttons.pressed, ['s3', 'reset'])
+        self.assertIsNone(runner.running)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Tests of the staleness refresh of the GHS queries.
+Runs the refresh of the driver on a stand-in instrument, which keeps the queries it was asked to send.
+Does not need the GHS, but the driver module needs qcodes.
+"""
+
+import time
+import unittest
+
+
+def has_driver():
+    try:
+        import instrument_drivers.LeidenCryogenics_GHS_2T_1T_700_CF
+    except ImportError:
+        return False
+    return True
+
+
+# Stand-in of the driver, runs the refresh of the driver without opening an instrument
+# ages holds how old (seconds) the result of each query is, queries that are not in it were never sent
+def make_stub_ghs(ages, staleness=None):
+    from instrument_drivers.LeidenCryogenics_GHS_2T_1T_700_CF import LC_GHS
+
+    class StubGHS():
+        queries = LC_GHS.queries
+        refresh_groups = LC_GHS.refresh_groups
+        get_age = LC_GHS.get_age
+        refresh = LC_GHS.refresh
+        refresh_if_stale = LC_GHS.refresh_if_stale
+        get_led = LC_GHS.get_led
+        get_all_params = LC_GHS.get_all_params
+
+        def __init__(self):
+            self.staleness = dict(LC_GHS.default_staleness, **(staleness or {}))
+            self.refresh_times = {query: None for query in self.queries}
+            for query, age in ages.items():
+                self.refresh_times[query] = time.time() - age
+
+            self.led_mask = 0b101
+            self.sent = []
+
+        # Keep the query instead of sending it
+        def refresh_query(self, query):
+            self.sent.append(query)
+            self.refresh_times[query] = time.time()
+
+    return StubGHS()
+
+
+@unittest.skipUnless(has_driver(), 'The driver needs qcodes (with GroupParameter)')
+class GHSRefreshTest(unittest.TestCase):
+    # Only the stale queries of the group are sent
+    def test_stale_queries_of_group(self):
+        ghs = make_stub_ghs({'status': 5.0, 'settings': 5.0, 'pressures': 5.0})
+
+        # The status is older than 2 s, the settings are younger than 30 s
+        self.assertEqual(ghs.refresh('status'), ['status'])
+        self.assertEqual(ghs.sent, ['status'])
+
+        # Now it's fresh
+        self.assertEqual(ghs.refresh('status'), [])
+
+    # Queries that were never sent are always stale
+    def test_never_sent(self):
+        ghs = make_stub_ghs({'status': 0.0, 'settings': 0.0, 'pressures': 0.0})
+        self.assertEqual(ghs.refresh('full'), ['leds', 'keys'])
+
+    # The staleness window can be changed per query
+    def test_staleness_override(self):
+        ghs = make_stub_ghs({'pressures': 0.3}, staleness={'pressures': 0.1})
+        self.assertEqual(ghs.refresh('pressures'), ['pressures'])
+
+        ghs = make_stub_ghs({'pressures': 0.3})
+        self.assertEqual(ghs.refresh('pressures'), [])
+
+    # max_age overrides the staleness windows, 0 sends every query of the group
+    def test_max_age(self):
+        ages = {query: 1.0 for query in ['status', 'settings', 'leds', 'keys', 'pressures']}
+        ghs = make_stub_ghs(ages)
+        self.assertEqual(ghs.refresh('full', max_age=0.5), ['status', 'settings', 'leds', 'keys', 'pressures'])
+
+        ghs = make_stub_ghs(ages)
+        ghs.get_all_params()
+        self.assertEqual(ghs.sent, ['status', 'settings', 'leds', 'keys', 'pressures'])
+
+    # Reading a led refreshes the leds only if they are stale
+    def test_led_refresh(self):
+        ghs = make_stub_ghs({'leds': 0.5})
+        self.assertEqual([ghs.get_led(i) for i in [1, 2, 3]], [2, 1, 2])
+        self.assertEqual(ghs.sent, [])
+
+        ghs = make_stub_ghs({'leds': 5.0})
+        ghs.get_led(1)
+        self.assertEqual(ghs.sent, ['leds'])
+
+    def test_unknown_group(self):
+        with self.assertRaises(ValueError):
+            make_stub_ghs({}).refresh('valves')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+"""
+Tests of the instrument lanes, which decide which instrument commands can run at the same time.
+The instruments are plain names and the commands are sleeps, so the lanes are checked without the instruments.
+Does not need the instruments (or qcodes).
+"""
+
+import asyncio
+import threading
+import unittest
+
+from socket_clients.instrument_lanes import InstrumentLanes
+
+
+# Lock that gives the other tasks a turn before taking the lock, so two tasks taking locks interleave
+class YieldingLock(asyncio.Lock):
+    async def acquire(self):
+        await asyncio.sleep(0)
+        return await super().acquire()
+
+
+class InstrumentLanesTest(unittest.TestCase):
+    # Two tasks reserving the same instruments in opposite order both finish
+    # (taking the locks in the order given, each task would hold one lock and wait for the other forever)
+    def test_lock_order_no_deadlock(self):
+        async def run():
+            lanes = InstrumentLanes()
+            lanes.locks = {'a': YieldingLock(), 'b': YieldingLock()}
+            finished = []
+
+            async def reserve(name, *instruments):
+                for _ in range(20):
+                    async with lanes.use(*instruments):
+                        # Give the other task a chance to grab a lock in between
+                        await asyncio.sleep(0)
+                        await asyncio.sleep(0.001)
+
+                finished.append(name)
+
+            await asyncio.wait_for(asyncio.gather(reserve('ab', 'a', 'b'), reserve('ba', 'b', 'a')), timeout=5.0)
+            return finished, lanes
+
+        finished, lanes = asyncio.run(run())
+        self.assertEqual(sorted(finished), ['ab', 'ba'])
+
+        # All the locks are released afterwards
+        self.assertFalse(lanes.is_busy('a') or lanes.is_busy('b'))
+
+    # An instrument runs one task at a time, different instruments run at the same time
+    def test_exclusive_lanes(self):
+        async def run():
+            lanes = InstrumentLanes()
+            running = {'dmm': 0, 'bridge': 0}
+            overlap = {'dmm': 0, 'bridge': 0, 'both': 0}
+
+            async def task(instrument):
+                async with lanes.use(instrument):
+                    running[instrument] += 1
+                    overlap[instrument] = max(overlap[instrument], running[instrument])
+                    await asyncio.sleep(0.01)
+                    overlap['both'] = max(overlap['both'], running['dmm'] + running['bridge'])
+                    running[instrument] -= 1
+
+            await asyncio.wait_for(asyncio.gather(*[task(instrument) for instrument in ['dmm', 'bridge'] * 3]),
+                                   timeout=5.0)
+            return overlap
+
+        overlap = asyncio.run(run())
+        self.assertEqual(overlap['dmm'], 1)
+        self.assertEqual(overlap['bridge'], 1)
+        self.assertEqual(overlap['both'], 2)
+
+    # A reservation that fails half way releases the locks it took
+    def test_release_on_error(self):
+        async def run():
+            lanes = InstrumentLanes()
+            with self.assertRaises(RuntimeError):
+                async with lanes.use('dmm', 'bridge'):
+                    raise RuntimeError('instrument error')
+
+            return lanes
+
+        lanes = asyncio.run(run())
+        self.assertFalse(lanes.is_busy('dmm') or lanes.is_busy('bridge'))
+
+    # Blocking calls run in the thread of the instrument, one thread per instrument
+    def test_call_in_instrument_thread(self):
+        async def run():
+            lanes = InstrumentLanes()
+            names = await asyncio.gather(lanes.call('dmm', lambda: threading.current_thread().name),
+                                         lanes.call('dmm', lambda: threading.current_thread().name),
+                                         lanes.call('bridge', lambda: threading.current_thread().name))
+            lanes.shutdown()
+            return names
+
+        names = asyncio.run(run())
+        self.assertTrue(names[0].startswith('dmm'))
+        self.assertEqual(names[0], names[1])
+        self.assertTrue(names[2].startswith('bridge'))
+        self.assertNotEqual(threading.main_thread().name, names[0])
+
+    # The proxy looks up attributes and items directly, and runs the calls in the thread of the instrument
+    def test_proxy(self):
+        class FakeInstrument():
+            def __init__(self):
+                self.channels = {'ch1': self}
+                self.threads = []
+
+            def read(self, scale=1.0):
+                self.threads.append(threading.current_thread().name)
+                return 2.0 * scale
+
+        async def run():
+            lanes = InstrumentLanes()
+            instrument = FakeInstrument()
+            proxy = lanes.wrap('dmm', instrument)
+            values = [await proxy.read(), await proxy.channels['ch1'].read(scale=3.0)]
+            lanes.shutdown()
+            return values, instrument.threads
+
+        values, threads = asyncio.run(run())
+        self.assertEqual(values, [2.0, 6.0])
+        self.assertTrue(all(name.startswith('dmm') for name in threads))
+
+
+if __name__ == '__main__':
+    unittest.main()
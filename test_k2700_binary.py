@@ -0,0 +1,216 @@
+"""
+Throughput of the ASCII and binary buffer formats of the Keysight 2700 DMM.
+Uses the PyVISA-sim instrument in instrument_drivers/simulations/Keysight_2700_sim.yaml.
+PyVISA-sim can only send text, so the binary blocks are built locally from the same readings,
+and the time on the serial line is computed from the number of bytes (9600 baud, 10 bits per byte).
+The tests run the buffer readout of the driver on a stand-in instrument with a stub visa_handle,
+covering the binary read, the fallback to ASCII when the binary read fails, unknown channels
+and the alignment of the sweeps (they need qcodes).
+"""
+
+import os
+import time
+import unittest
+
+import numpy as np
+import pyvisa
+from pyvisa.util import to_ieee_block, from_ieee_block
+
+sim_file = os.path.dirname(__file__) + '/instrument_drivers/simulations/Keysight_2700_sim.yaml@sim'
+address = 'ASRL6::INSTR'
+
+# Seconds per byte on the serial line
+byte_time = 10 / 9600
+
+
+def time_call(function, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        result = function()
+
+    return (time.perf_counter() - start) / n, result
+
+
+# The readings of one sweep, alternating resistances and channels
+sweep = np.array([1083.4521, 101, 1122.9876, 102, 987.6123, 103, 1450.2311, 104, 1602.1187, 105,
+                  1200.3456, 106, 1198.7654, 107, 1312.3456, 108, 998.76543, 109])
+
+
+# Stub of the visa handle, replies to TRAC:DATA? with a binary block, parsed by pyvisa like the real one
+class StubVisaHandle():
+    def __init__(self, block):
+        self.block = block
+        self.queries = []
+
+    def query_binary_values(self, message, datatype, is_big_endian, container):
+        self.queries.append(message)
+        return from_ieee_block(self.block, datatype=datatype, is_big_endian=is_big_endian, container=container)
+
+
+# Stub of the calibrations, the temperature is the resistance
+class StubCalibrations():
+    def convert(self, sensors, resistances):
+        return resistances
+
+
+# Stand-in of the driver, runs the buffer readout of the driver without opening an instrument
+# The ASCII buffer holds the readings in buffer (one sweep by default)
+def make_stub_dmm(block, data_format, buffer=sweep):
+    from instrument_drivers.Keysight_2700_DMM import Keysight_2700_DMM
+
+    class StubDMM():
+        binary_formats = Keysight_2700_DMM.binary_formats
+        set_data_format = Keysight_2700_DMM.set_data_format
+        read_scan_values = Keysight_2700_DMM.read_scan_values
+        parse_scan_buffer = Keysight_2700_DMM.parse_scan_buffer
+        read_scan_buffer = Keysight_2700_DMM.read_scan_buffer
+        scan_channels_multi = Keysight_2700_DMM.scan_channels_multi
+
+        def __init__(self):
+            self.visa_handle = StubVisaHandle(block)
+            self.data_format = data_format
+            self.cleared = 0
+            self.written = []
+
+            # The channel lookup like the driver sets it up
+            self.n_channels = 9
+            self.channel_lookup = np.full(200, -1, dtype=int)
+            for i in range(self.n_channels):
+                self.channel_lookup[101 + i] = i
+            self.calibrations = StubCalibrations()
+
+        def device_clear(self):
+            self.cleared += 1
+
+        def write(self, cmd):
+            self.written.append(cmd)
+
+        def ask(self, cmd):
+            # The ASCII buffer, or the format the instrument is set to
+            if cmd == 'TRAC:DATA?':
+                return ','.join(f'{value:+.8E}' if i % 2 == 0 else str(int(value)) for i, value in enumerate(buffer))
+            return 'ASC'
+
+    return StubDMM()
+
+
+def has_qcodes():
+    try:
+        import qcodes
+    except ImportError:
+        return False
+    return True
+
+
+@unittest.skipUnless(has_qcodes(), 'The driver needs qcodes')
+class K2700ReadScanValuesTest(unittest.TestCase):
+    # The binary block is parsed into the readings, without touching the ASCII path
+    def test_binary_read(self):
+        for data_format, datatype in [('REAL,64', 'd'), ('REAL,32', 'f')]:
+            dmm = make_stub_dmm(to_ieee_block(sweep, datatype=datatype, is_big_endian=False), data_format)
+
+            values = dmm.read_scan_values()
+            self.assertTrue(np.allclose(values, sweep, rtol=1e-6))
+            self.assertEqual(dmm.visa_handle.queries, ['TRAC:DATA?'])
+            self.assertEqual(dmm.data_format, data_format)
+            self.assertEqual(dmm.cleared, 0)
+
+    # A block cut short clears the device, switches to ASCII and reads the buffer in ASCII
+    def test_binary_read_failure(self):
+        block = to_ieee_block(sweep, datatype='d', is_big_endian=False)
+        dmm = make_stub_dmm(block[:len(block) // 2], 'REAL,64')
+
+        values = dmm.read_scan_values()
+        self.assertTrue(np.allclose(values, sweep, rtol=1e-6))
+        self.assertEqual(dmm.cleared, 1)
+        self.assertEqual(dmm.data_format, 'ASC')
+        self.assertIn('FORM:DATA ASC', dmm.written)
+
+        # The next read stays in ASCII
+        dmm.read_scan_values()
+        self.assertEqual(dmm.visa_handle.queries, ['TRAC:DATA?'])
+
+
+# Readings (resistance = 1000 * sweep + sensor) of the channels, alternating resistances and channels
+def make_buffer(channels, sweeps):
+    return np.ravel([[1000 * n + channel - 101, channel] for n, channel in zip(sweeps, channels)])
+
+
+@unittest.skipUnless(has_qcodes(), 'The driver needs qcodes')
+class K2700ScanBufferTest(unittest.TestCase):
+    # A channel outside the lookup table raises ValueError, not IndexError
+    def test_unknown_channel(self):
+        for channel in [110, 201, 250, -3]:
+            buffer = make_buffer([101, 102, channel], [0, 0, 0])
+            with self.assertRaises(ValueError):
+                make_stub_dmm(b'', 'ASC', buffer).read_scan_buffer()
+
+    # The sweeps are aligned on channel 101, when the buffer starts mid-sweep and ends mid-sweep
+    def test_sweeps_aligned_on_first_channel(self):
+        channels = [107, 108, 109] + list(range(101, 110)) * 2 + [101, 102]
+        sweeps = [0, 0, 0] + [1] * 9 + [2] * 9 + [3, 3]
+        scans = make_stub_dmm(b'', 'ASC', make_buffer(channels, sweeps)).scan_channels_multi()
+
+        self.assertEqual(scans.shape, (2, 9))
+        self.assertTrue(np.array_equal(scans, [[1000 + i for i in range(9)], [2000 + i for i in range(9)]]))
+
+    # A reading missing from a sweep is NaN, and doesn't shift the next sweeps
+    def test_missing_reading(self):
+        channels = [101, 102, 104, 105, 106, 107, 108, 109] + list(range(101, 110))
+        sweeps = [0] * 8 + [1] * 9
+        scans = make_stub_dmm(b'', 'ASC', make_buffer(channels, sweeps)).scan_channels_multi()
+
+        self.assertEqual(scans.shape, (2, 9))
+        self.assertTrue(np.isnan(scans[0, 2]))
+        self.assertTrue(np.array_equal(scans[1], [1000 + i for i in range(9)]))
+
+
+def main_run():
+    n = 200
+
+    # Open the simulated instrument
+    rm = pyvisa.ResourceManager(sim_file)
+    dmm = rm.open_resource(address, read_termination='\r', write_termination='\r')
+
+    # ASCII, read and parsed through PyVISA-sim
+    ascii_reply = dmm.query('TRAC:DATA?')
+    ascii_time, values = time_call(lambda: np.array(dmm.query('TRAC:DATA?').split(','), dtype=float), n)
+
+    print(f'{"format":>8} {"sweeps":>6} {"bytes":>6} {"line time [ms]":>15} {"parse time [us]":>16}')
+    for n_sweeps in [1, 10]:
+        # The buffer with several sweeps
+        sweep_values = np.tile(values, n_sweeps)
+        ascii_bytes = n_sweeps * len(ascii_reply) + (n_sweeps - 1) + 1
+        parse_time, _ = time_call(lambda: np.array(','.join([ascii_reply] * n_sweeps).split(','), dtype=float), n)
+        print(f'{"ASC":>8} {n_sweeps:>6} {ascii_bytes:>6} {1e3 * ascii_bytes * byte_time:>15.1f} '
+              f'{1e6 * parse_time:>16.1f}')
+
+        # The binary formats, parsed like query_binary_values does it
+        for data_format, datatype in [('REAL,64', 'd'), ('REAL,32', 'f')]:
+            block = to_ieee_block(sweep_values, datatype=datatype, is_big_endian=False) + b'\r'
+            parse_time, parsed = time_call(lambda: from_ieee_block(block, datatype=datatype, is_big_endian=False,
+                                                                   container=np.array), n)
+
+            # Check we get the same readings back
+            assert np.allclose(parsed, sweep_values, rtol=1e-6)
+            print(f'{data_format:>8} {n_sweeps:>6} {len(block):>6} {1e3 * len(block) * byte_time:>15.1f} '
+                  f'{1e6 * parse_time:>16.1f}')
+
+    print(f'ASCII read and parse through PyVISA-sim: {1e6 * ascii_time:.1f} us per scan')
+
+    # Run the driver against the simulation, it should fall back to ASCII
+    try:
+        from instrument_drivers.Keysight_2700_DMM import Keysight_2700_DMM
+    except ImportError as e:
+        print('Skipping the driver (', e, ')')
+        return
+
+    driver = Keysight_2700_DMM('dmm', address, data_format='REAL,64', visalib=sim_file)
+    print('Driver data format after asking for REAL,64:', driver.data_format)
+    scan_time, scan = time_call(driver.scan_channels, n)
+    print(f'Driver scan_channels: {1e6 * scan_time:.1f} us per scan', scan)
+    driver.close()
+
+
+if __name__ == '__main__':
+    main_run()
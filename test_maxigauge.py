@@ -18,9 +18,9 @@ def main_run():
 
     t = 0
     while True:
-        # Query the maxigauge for pressures
-        s5, p5 = maxigauge.get_pressure(5)
-        s6, p6 = maxigauge.get_pressure(6)
+        # Query the maxigauge for pressures (all channels in one query)
+        statuses, pressures = maxigauge.get_all_pressures()
+        p5, p6 = pressures[4], pressures[5]
 
         # Add the new data to the lists
         time.append(t)
@@ -0,0 +1,154 @@
+"""
+Tests of the MaxiGauge readings, the PRX parsing of all six channels, and the continuous mode
+(the readings of the stream, the error on a stale reading, and leaving the mode when the stream fails).
+Runs the driver methods on a stand-in gauge with a fake serial port, so the gauge is never opened.
+Does not need the gauge, but the driver module needs qcodes.
+"""
+
+import threading
+import time
+import unittest
+
+import numpy as np
+import serial
+
+
+def has_driver():
+    try:
+        import instrument_drivers.PfeifferVacuum_MaxiGauge
+    except ImportError:
+        return False
+    return True
+
+
+# A PRX reply, the status and pressure of each channel
+prx_reply = b'0,1.0000E-03,0,2.5000E-02,1,0.0000E+00,2,9.9000E+03,0,4.2000E-06,0,7.7000E-01\r\n'
+
+
+# Fake of the serial port, replies with the lines in order (the acknowledge comes before each reply)
+class FakeSerial():
+    def __init__(self, lines):
+        self.lines = list(lines)
+        self.written = []
+        self.is_open = True
+        self.timeout = None
+
+    def write(self, data):
+        self.written.append(data)
+
+    def reset_input_buffer(self):
+        pass
+
+    def read_until(self):
+        # The port is unplugged once the lines run out
+        if len(self.lines) == 0:
+            raise serial.SerialException('device disconnected')
+
+        return self.lines.pop(0)
+
+
+# Stand-in of the driver, runs the methods of the driver without opening the gauge
+def make_stub_gauge(lines=()):
+    from instrument_drivers.PfeifferVacuum_MaxiGauge import MaxiGauge
+
+    class StubGauge():
+        send = MaxiGauge.send
+        parse_readings = MaxiGauge.parse_readings
+        get_pressure = MaxiGauge.get_pressure
+        add_sample = MaxiGauge.add_sample
+        get_latest_sample = MaxiGauge.get_latest_sample
+        get_stream = MaxiGauge.get_stream
+        start_streaming = MaxiGauge.start_streaming
+        read_stream = MaxiGauge.read_stream
+        stop_streaming = MaxiGauge.stop_streaming
+        reset_interface = MaxiGauge.reset_interface
+
+        def __init__(self):
+            self.name = 'maxigauge'
+            self.ser = FakeSerial(lines)
+
+            # The ring buffer of the continuous mode, like the driver sets it up
+            self.stream_length = 10
+            self.stream_times = np.full(self.stream_length, np.nan)
+            self.stream_statuses = np.zeros((self.stream_length, 6), dtype=int)
+            self.stream_pressures = np.full((self.stream_length, 6), np.nan)
+            self.stream_count = 0
+            self.stream_lock = threading.Lock()
+            self.stream_thread = None
+            self.streaming = False
+            self.stream_interval = None
+
+    return StubGauge()
+
+
+@unittest.skipUnless(has_driver(), 'The driver needs qcodes and pyserial')
+class MaxiGaugeReadingTest(unittest.TestCase):
+    # All six channels are parsed from one PRX reply
+    def test_parse_prx(self):
+        statuses, pressures = make_stub_gauge().parse_readings(prx_reply)
+        np.testing.assert_array_equal(statuses, [0, 0, 1, 2, 0, 0])
+        np.testing.assert_array_equal(pressures, [1e-3, 2.5e-2, 0.0, 9.9e3, 4.2e-6, 0.77])
+        self.assertEqual(statuses.dtype.kind, 'i')
+
+    # Replies that are cut short or garbled raise ValueError (the stream skips those lines)
+    def test_parse_garbled(self):
+        gauge = make_stub_gauge()
+        for reply in [b'0,1.0000E-03,0,2.50\r\n', b'\x06\r\n', b'0,1.0000E-03,x,2.5000E-02\r\n']:
+            with self.assertRaises(ValueError):
+                gauge.parse_readings(reply)
+
+    # A single channel is asked for with PR, after the acknowledge the enquiry gets the reply
+    def test_get_pressure(self):
+        gauge = make_stub_gauge([b'\x06\r\n', b'0,1.0000E-03\r\n'])
+        self.assertEqual(gauge.get_pressure(5), (0, 1e-3))
+        self.assertEqual(gauge.ser.written, [b'PR5\r\n', b'\x05'])
+
+
+@unittest.skipUnless(has_driver(), 'The driver needs qcodes and pyserial')
+class MaxiGaugeStreamTest(unittest.TestCase):
+    # The readings of the stream go in the ring buffer, and garbled lines are skipped
+    def test_stream_readings(self):
+        gauge = make_stub_gauge([b'\x06\r\n', prx_reply, prx_reply, b'0,1.0E-03,0\r\n', prx_reply])
+        gauge.start_streaming(0)
+        gauge.stream_thread.join(timeout=5)
+
+        times, statuses, pressures = gauge.get_stream()
+        self.assertEqual(len(times), 3)
+        np.testing.assert_array_equal(pressures[-1], [1e-3, 2.5e-2, 0.0, 9.9e3, 4.2e-6, 0.77])
+
+    # When the port fails, the gauge is taken out of continuous mode, and commands can be sent again
+    def test_stream_failure(self):
+        gauge = make_stub_gauge([b'\x06\r\n', prx_reply])
+        gauge.start_streaming(0)
+        gauge.stream_thread.join(timeout=5)
+
+        self.assertFalse(gauge.streaming)
+        self.assertIsNone(gauge.stream_thread)
+        self.assertEqual(gauge.ser.written[-1], b'\x03')
+
+        # Stopping after the failure does nothing
+        gauge.stop_streaming()
+
+    # The latest reading is returned while it's fresh, and raises once it's older than 3 stream intervals
+    def test_stale_sample(self):
+        gauge = make_stub_gauge()
+        gauge.stream_interval = 1.0
+        with self.assertRaises(RuntimeError):
+            gauge.get_latest_sample()
+
+        gauge.add_sample(time.time() - 2.5, *gauge.parse_readings(prx_reply))
+        timestamp, statuses, pressures = gauge.get_latest_sample()
+        np.testing.assert_array_equal(statuses, [0, 0, 1, 2, 0, 0])
+
+        gauge.add_sample(time.time() - 3.5, *gauge.parse_readings(prx_reply))
+        with self.assertRaises(RuntimeError):
+            gauge.get_latest_sample()
+
+        # In continuous mode the pressure of a channel is the latest reading, so it raises as well
+        gauge.streaming = True
+        with self.assertRaises(RuntimeError):
+            gauge.get_pressure(1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+Tests of the ring buffers keeping the history of the cryogenics client.
+Checks the buffer against a deque of dicts, which is what it replaces.
+Does not need the instruments (or qcodes).
+"""
+
+from collections import deque
+import unittest
+
+import numpy as np
+
+from socket_clients.ring_buffer import ColumnarRingBuffer, RingBuffer
+
+
+# A sample, with a missing value every third sample
+def make_sample(i):
+    return {'t_still': float(i), 't_mixing_chamber_1': None if i % 3 == 0 else 2.0 * i, 'timestamp': 0.5 * i}
+
+
+class ColumnarRingBufferTest(unittest.TestCase):
+    # The buffer holds the same samples as a deque, through several wraps
+    def test_matches_deque(self):
+        buffer = ColumnarRingBuffer(capacity=7)
+        reference = deque(maxlen=7)
+        for i in range(30):
+            self.assertEqual(buffer.append(make_sample(i)), i)
+            reference.append(dict(make_sample(i), seq=i))
+
+            self.assertEqual(buffer.get_samples(), list(reference))
+            self.assertEqual(buffer[-1], reference[-1])
+            self.assertEqual(buffer.first_seq, reference[0]['seq'])
+
+    # Windows are views of the array, in order
+    def test_views(self):
+        buffer = ColumnarRingBuffer(['t_still', 'timestamp'], capacity=5)
+        for i in range(12):
+            buffer.append(make_sample(i))
+
+        self.assertTrue(np.shares_memory(buffer.view(), buffer.data))
+        np.testing.assert_array_equal(buffer.column('t_still'), [7, 8, 9, 10, 11])
+        np.testing.assert_array_equal(buffer.column('t_still', 9, 11), [9, 10])
+
+        # Windows are clamped to the samples in the buffer
+        np.testing.assert_array_equal(buffer.column('t_still', 0, 8), [7])
+
+    # The traces are sent as deltas when possible, and resynced otherwise
+    def test_trace_after(self):
+        buffer = ColumnarRingBuffer(capacity=10)
+        self.assertEqual(buffer.get_trace_after(-1), {'full': True, 'samples': []})
+
+        for i in range(25):
+            buffer.append(make_sample(i))
+
+        # A delta from the latest sample we have
+        update = buffer.get_trace_after(20)
+        self.assertFalse(update['full'])
+        self.assertEqual([sample['seq'] for sample in update['samples']], [21, 22, 23, 24])
+
+        # Nothing new
+        self.assertEqual(buffer.get_trace_after(24), {'full': False, 'samples': []})
+
+        # Samples no longer in the buffer, or from before a restart, resync
+        for after_seq in [-1, 5, 100]:
+            update = buffer.get_trace_after(after_seq, max_samples=4)
+            self.assertTrue(update['full'])
+            self.assertEqual([sample['seq'] for sample in update['samples']], [21, 22, 23, 24])
+
+
+class RingBufferTest(unittest.TestCase):
+    # Windows and means over time
+    def test_window_mean(self):
+        buffer = RingBuffer(['t_still', 't_mixing_chamber_1'], capacity=4)
+        for i in range(6):
+            sample = make_sample(i)
+            buffer.append(sample.pop('timestamp'), sample)
+
+        self.assertEqual(buffer.latest(), {'timestamp': 2.5, 't_still': 5.0, 't_mixing_chamber_1': 10.0})
+        self.assertEqual(buffer.window_mean(1.5, 2.0), {'t_still': 3.5, 't_mixing_chamber_1': 8.0})
+
+        # Only the missing value in the window, and no samples in the window (the latest before is used)
+        self.assertEqual(buffer.window_mean(1.4, 1.6), {'t_still': 3.0, 't_mixing_chamber_1': None})
+        self.assertEqual(buffer.window_mean(10, 11), {'t_still': 5.0, 't_mixing_chamber_1': 10.0})
+
+    # Readings repeated from before the window (like the bridge channels that were not due) are left out of the mean,
+    # and the age is the age of the newest reading at the end of the window, not a mean of ages
+    def test_window_mean_with_ages(self):
+        buffer = RingBuffer(['t_still', 't_still_age', 't_mixing_chamber_1', 't_mixing_chamber_1_age'])
+
+        # The still is read at 0, 2 and 4, the mixing chamber only at 0, a sample is taken every second
+        for timestamp in range(6):
+            still_read = 2 * (timestamp // 2)
+            buffer.append(timestamp, {'t_still': 10.0 + still_read, 't_still_age': timestamp - still_read,
+                                      't_mixing_chamber_1': 1.0, 't_mixing_chamber_1_age': timestamp})
+
+        # The still readings made in the window (at 2 and 4, each in two samples), the mixing chamber reading
+        # is older than the window, so it's the latest reading with its age at the end of the window
+        mean = buffer.window_mean(1.5, 5.5)
+        self.assertEqual(mean, {'t_still': 13.0, 't_still_age': 1.5,
+                                't_mixing_chamber_1': 1.0, 't_mixing_chamber_1_age': 5.5})
+
+        # A sample in the window repeating a reading made before it
+        mean = buffer.window_mean(0.5, 1.0)
+        self.assertEqual(mean, {'t_still': 10.0, 't_still_age': 1.0,
+                                't_mixing_chamber_1': 1.0, 't_mixing_chamber_1_age': 1.0})
+
+        # Never read
+        buffer = RingBuffer(['t_still', 't_still_age'])
+        buffer.append(0.0, {'t_still': None, 't_still_age': None})
+        self.assertEqual(buffer.window_mean(0, 1), {'t_still': None, 't_still_age': None})
+
+
+if __name__ == '__main__':
+    unittest.main()
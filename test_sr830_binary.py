@@ -0,0 +1,121 @@
+"""
+Benchmark of the SR830 buffer readouts.
+Uses the PyVISA-sim instrument in instrument_drivers/simulations/SR830.yaml, which holds 512 points of each channel.
+Compares the ASCII transfer (TRCA), the QCoDeS transfer (TRCL) and the binary float transfer (TRCB)
+read into preallocated arrays, and the number of bytes each sends.
+"""
+
+import os
+import time
+
+import numpy as np
+import pyvisa
+
+sim_file = os.path.dirname(__file__) + '/instrument_drivers/simulations/SR830.yaml@sim'
+address = 'GPIB0::10::INSTR'
+n_points = 512
+
+
+def time_call(function, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        result = function()
+
+    return (time.perf_counter() - start) / n, result
+
+
+# ASCII, parsed from text
+def read_trca(lockin, out):
+    for channel in [1, 2]:
+        out[channel - 1] = np.array(lockin.query(f'TRCA? {channel}, 0, {n_points}').rstrip(',').split(','),
+                                    dtype=float)
+    return out
+
+
+# The QCoDeS databuffer, 4 byte mantissa/exponent pairs, into new arrays
+def read_trcl(lockin, out):
+    data = []
+    for channel in [1, 2]:
+        lockin.write(f'TRCL ? {channel}, 0, {n_points}')
+        rawdata = np.frombuffer(lockin.read_raw(), dtype='<i2', count=2 * n_points)
+        data.append(rawdata[::2] * 2.0 ** (rawdata[1::2] - 124))
+    return data
+
+
+# Binary floats, straight into the preallocated arrays
+# The floats can contain the termination character, so it's turned off and the read stops at END
+# (the simulation sends a line feed after the floats, the lock-in doesn't, so one more byte is allowed)
+def read_trcb(lockin, out, n=n_points):
+    for channel in [1, 2]:
+        lockin.write(f'TRCB? {channel}, 0, {n}')
+        with lockin.read_termination_context(''):
+            data = lockin.read_bytes(4 * n + 1, break_on_termchar=True)
+        out[channel - 1, :n] = np.frombuffer(data, dtype='<f4', count=n)
+    return out[:, :n]
+
+
+# The simulation has 4 points of each channel where the floats contain line feed bytes
+def test_line_feed_in_payload():
+    rm = pyvisa.ResourceManager(sim_file)
+    lockin = rm.open_resource(address, read_termination='\n', write_termination='\n')
+
+    expected = [[1.190430e-02] * 4, [5.000980e+01] * 4]
+    assert np.allclose(read_trcb(lockin, np.empty((2, 4)), 4), expected, rtol=1e-6)
+
+    # The next query is not disturbed by the binary transfer
+    assert lockin.query('SPTS?') == '512'
+    lockin.close()
+
+    # Run the driver against the simulation
+    try:
+        from instrument_drivers.StanfordResearch_SR830 import SR830
+    except ImportError as e:
+        print('Skipping the driver (', e, ')')
+        return
+
+    driver = SR830('lockin_line_feed', address, visalib=sim_file, terminator='\n')
+    assert np.allclose(driver.read_stream(0, 4), expected, rtol=1e-6)
+    driver.close()
+
+
+def main_run():
+    n = 200
+
+    # Open the simulated instrument
+    rm = pyvisa.ResourceManager(sim_file)
+    lockin = rm.open_resource(address, read_termination='\n', write_termination='\n')
+
+    # The arrays the buffer is read into
+    out = np.empty((2, n_points))
+
+    # Bytes sent for both channels (the ASCII transfer is about 13 characters per point)
+    ascii_bytes = sum(len(lockin.query(f'TRCA? {channel}, 0, {n_points}')) + 1 for channel in [1, 2])
+    sizes = {'TRCA': ascii_bytes, 'TRCL': 2 * 4 * n_points, 'TRCB': 2 * 4 * n_points}
+
+    print(f'{"transfer":>8} {"bytes":>6} {"time per read [us]":>19}')
+    results = {}
+    for transfer, read in [('TRCA', read_trca), ('TRCL', read_trcl), ('TRCB', read_trcb)]:
+        read_time, data = time_call(lambda: read(lockin, out), n)
+        results[transfer] = np.array(data)
+        print(f'{transfer:>8} {sizes[transfer]:>6} {1e6 * read_time:>19.1f}')
+
+    # The binary floats are the same points as the ASCII ones
+    assert np.allclose(results['TRCA'], results['TRCB'], rtol=1e-6)
+
+    # Run the driver against the simulation
+    try:
+        from instrument_drivers.StanfordResearch_SR830 import SR830
+    except ImportError as e:
+        print('Skipping the driver (', e, ')')
+        return
+
+    driver = SR830('lockin', address, visalib=sim_file, terminator='\n')
+    read_time, data = time_call(lambda: driver.read_stream(0, n_points, out), n)
+    assert np.allclose(data, results['TRCA'], rtol=1e-6)
+    print(f'Driver read_stream: {1e6 * read_time:.1f} us per read')
+    driver.close()
+
+
+if __name__ == '__main__':
+    test_line_feed_in_payload()
+    main_run()
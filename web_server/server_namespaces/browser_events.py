@@ -3,9 +3,86 @@ from server_namespaces.universal_events import UniversalEvents
 from default_experiment_config import get_default_experiment_configuration
 
 import numpy as np
+import time
 
 # All the methods related to the browser connection
 class BrowserNamespace(UniversalEvents):
+    # Data streams a browser can subscribe to, along with the default minimum time between updates (seconds)
+    # Each stream has a room of the same name, containing the browsers subscribed to it
+    data_streams = {
+        'temperatures': 0.0,
+        'pressures': 0.0,
+        'magnet_trace': 5.0,
+        'magnet_field': 0.0,
+        'fp_status': 0.0
+    }
+
+    def __init__(self, namespace=None):
+        super().__init__(namespace)
+
+        # Keep track of the subscribers of each stream, and their throttle rates
+        # Each subscriber is stored as {sid: {'interval': seconds, 'last_sent': timestamp}}
+        self.subscriptions = {stream: {} for stream in self.data_streams}
+
+    # Remove the browser from all the streams when it disconnects
+    def on_disconnect(self, sid):
+        # Socket.io removes the sid from the rooms, we just forget the throttle state
+        for subscribers in self.subscriptions.values():
+            subscribers.pop(sid, None)
+
+        super().on_disconnect(sid)
+
+    # Browsers send the full set of streams they want, along with the throttle interval for each
+    # Streams that are not in the set are unsubscribed, so idle tabs can send an empty set
+    async def on_b_set_subscriptions(self, sid, data):
+        streams = data.get('streams', {})
+
+        for stream, subscribers in self.subscriptions.items():
+            if stream in streams:
+                # Use the default interval if the browser does not care
+                interval = streams[stream]
+                if interval is None:
+                    interval = self.data_streams[stream]
+
+                # Join the room (keep the last sent time if we are already subscribed)
+                last_sent = subscribers.get(sid, {}).get('last_sent', 0.0)
+                subscribers[sid] = {'interval': float(interval), 'last_sent': last_sent}
+                self.enter_room(sid, stream)
+            elif sid in subscribers:
+                # Leave the room
+                del subscribers[sid]
+                self.leave_room(sid, stream)
+
+    # Check if anyone is listening to a stream (used to avoid asking the stations for data nobody wants)
+    def has_subscribers(self, stream):
+        return len(self.subscriptions[stream]) > 0
+
+    # Publish an event to the subscribers of a stream
+    # Subscribers are skipped if they got an update more recently than their interval allows
+    # Set throttle to false for events that must always arrive (such as full traces)
+    async def publish(self, stream, event, data, throttle=True):
+        subscribers = self.subscriptions[stream]
+
+        # Nobody is listening
+        if len(subscribers) < 1:
+            return
+
+        # Figure out which subscribers are due an update
+        now = time.time()
+        due = [sid for sid, s in subscribers.items() if not throttle or now - s['last_sent'] >= s['interval']]
+
+        if len(due) == len(subscribers):
+            # Everyone wants it, so we send it once to the room
+            await self.emit(event, data, room=stream)
+        else:
+            # Otherwise we send it to each of the subscribers that are due
+            for sid in due:
+                await self.emit(event, data, room=sid)
+
+        # Remember when we sent the update
+        for sid in due:
+            subscribers[sid]['last_sent'] = now
+
     # Get the temperatures
     async def on_b_get_temperatures(self, sid):
         await self.cryo_namespace.get_temperatures()
@@ -19,7 +96,7 @@ class BrowserNamespace(UniversalEvents):
     async def on_b_get_is_saving_temperatures(self, sid):
         with db.connection_context():
             saving = ConfigurationParameter.read_config_value('is_saving_cryo_temperatures')
-            await self.emit('b_got_is_saving_temperatures', saving)
+            await self.emit('b_got_is_saving_temperatures', saving, room=sid)
 
     async def on_b_begin_save_temperatures(self, sid):
         with db.connection_context():
@@ -32,26 +109,28 @@ class BrowserNamespace(UniversalEvents):
             await self.emit('b_got_is_saving_temperatures', False)
 
     async def send_cryo_status(self, status):
-        await self.emit('b_got_cryo_status', status)
+        await self.publish('fp_status', 'b_got_cryo_status', status, throttle=False)
 
     async def send_temperatures(self, temperatures):
-        await self.emit('b_temperatures', temperatures)
+        await self.publish('temperatures', 'b_temperatures', temperatures)
 
-    async def send_temperature_trace(self, temperature_trace):
-        await self.emit('b_temperature_trace', temperature_trace)
+    # Traces are used to (re)build the plots, so they are never throttled
+    # Traces are built from the latest sample of the browser that asked, so they are only sent to that browser
+    async def send_temperature_trace(self, temperature_trace, sid):
+        await self.emit('b_temperature_trace', temperature_trace, room=sid)
 
     async def send_pressures(self, pressures):
-        await self.emit('b_pressures', pressures)
+        await self.publish('pressures', 'b_pressures', pressures)
 
-    async def send_pressure_trace(self, pressure_trace):
-        await self.emit('b_pressure_trace', pressure_trace)
+    async def send_pressure_trace(self, pressure_trace, sid):
+        await self.emit('b_pressure_trace', pressure_trace, room=sid)
 
     async def got_magnet_trace(self, data):
         times, magnet_trace = data
-        await self.emit('b_magnet_trace', {'magnet_trace': magnet_trace, 'times': times})
+        await self.publish('magnet_trace', 'b_magnet_trace', {'magnet_trace': magnet_trace, 'times': times})
 
     async def got_magnet_rms(self, rms):
-        await self.emit('b_ac_field', round(rms, 4))
+        await self.publish('magnet_field', 'b_ac_field', round(rms, 4))
 
     async def got_picowatt_config(self, config):
         with db.connection_context():
@@ -64,7 +143,11 @@ class BrowserNamespace(UniversalEvents):
         # await self.emit('b_dc_field', dc_field_strength, room=sid)
 
     async def got_dc_field(self, dc_field_strength):
-        await self.emit('b_dc_field', dc_field_strength)
+        await self.publish('magnet_field', 'b_dc_field', dc_field_strength)
+
+    # Progress of the ramp of the large magnet (the last update of a ramp must not be dropped)
+    async def got_magnet_ramp_progress(self, progress):
+        await self.publish('magnet_field', 'b_magnet_ramp_progress', progress, throttle=False)
 
     # Get the field strength of the small magnet
     async def on_b_get_ac_field(self, sid):
@@ -138,7 +221,8 @@ class BrowserNamespace(UniversalEvents):
                     .where(ExperimentStep.experiment_configuration == e['id']) \
                     .count()
 
-            await self.emit('b_got_experiment_list', {'list': experiments, 'count': experiment_count, 'page': page})
+            await self.emit('b_got_experiment_list', {'list': experiments, 'count': experiment_count, 'page': page},
+                            room=sid)
 
     # Get the rms value of the oscilloscope
     async def on_b_get_rms(self, sid):
@@ -147,14 +231,18 @@ class BrowserNamespace(UniversalEvents):
 
     # Get a trace of the magnet field values
     async def on_b_get_magnet_trace(self, sid):
-        await self.magnetism_namespace.get_magnet_trace()
+        if self.has_subscribers('magnet_trace'):
+            await self.magnetism_namespace.get_magnet_trace()
 
-    # Get a trace of the temperatures recorded
-    async def on_b_get_temperature_trace(self, sid):
-        await self.cryo_namespace.get_temperature_trace()
+    # Get the temperatures recorded after the latest one the browser has
+    # A browser without any temperatures asks for everything (after_seq = -1)
+    async def on_b_get_temperature_trace(self, sid, data=None):
+        after_seq = -1 if data is None else data.get('after_seq', -1)
+        await self.cryo_namespace.get_temperature_trace(after_seq, sid)
 
-    async def on_b_get_pressure_trace(self, sid):
-        await self.cryo_namespace.get_pressure_trace()
+    async def on_b_get_pressure_trace(self, sid, data=None):
+        after_seq = -1 if data is None else data.get('after_seq', -1)
+        await self.cryo_namespace.get_pressure_trace(after_seq, sid)
 
     async def push_next_step_to_clients(self):
         # Grab the latest step
@@ -245,4 +333,18 @@ class BrowserNamespace(UniversalEvents):
 
     async def on_b_start_circulation(self, sid):
         print('got start circulation from browser')
-        await self.cryo_namespace.start_circulation()
+        await self.cryo_namespace.start_circulation(sid)
+
+    # The procedure is given by name, the cryo client checks the name and replies with an error if it doesn't know it
+    async def on_b_run_ghs_procedure(self, sid, procedure):
+        if not isinstance(procedure, str):
+            await self.send_ghs_procedure_error('GHS procedures are run by name', sid)
+            return
+
+        await self.cryo_namespace.run_ghs_procedure(procedure, sid)
+
+    async def send_ghs_procedure_error(self, message, sid):
+        await self.emit('b_ghs_procedure_error', message, room=sid)
+
+    async def on_b_abort_ghs_procedure(self, sid):
+        await self.cryo_namespace.abort_ghs_procedure()
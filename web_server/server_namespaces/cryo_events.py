@@ -25,14 +25,16 @@ class CryoNamespace(UniversalEvents):
     async def get_temperatures(self):
         await self.emit('c_get_temperatures')
 
-    async def get_temperature_trace(self):
-        await self.emit('c_get_temperature_trace')
+    # Traces are requested as the samples after a sequence number, the client only sends the new ones
+    # The sid of the browser asking is passed along, so the trace is sent back to that browser only
+    async def get_temperature_trace(self, after_seq, browser_sid):
+        await self.emit('c_get_temperature_trace', (after_seq, browser_sid))
 
     async def get_pressures(self):
         await self.emit('c_get_pressures')
 
-    async def get_pressure_trace(self):
-        await self.emit('c_get_pressure_trace')
+    async def get_pressure_trace(self, after_seq, browser_sid):
+        await self.emit('c_get_pressure_trace', (after_seq, browser_sid))
 
     async def get_fp_status(self):
         await self.emit('c_get_frontpanel_status')
@@ -69,9 +71,18 @@ class CryoNamespace(UniversalEvents):
         await self.emit('c_get_mck_state')
 
     # Event emitted to start circulation
-    async def start_circulation(self):
+    async def start_circulation(self, browser_sid):
         print('sending start circulation to client')
-        await self.emit('c_start_circulation')
+        await self.emit('c_start_circulation', browser_sid)
+
+    # Event emitted to run a valve procedure of the GHS
+    # The sid of the browser asking is passed along, so errors are sent back to that browser only
+    async def run_ghs_procedure(self, procedure, browser_sid):
+        await self.emit('c_run_ghs_procedure', (procedure, browser_sid))
+
+    # Event emitted to abort the running valve procedure of the GHS
+    async def abort_ghs_procedure(self):
+        await self.emit('c_abort_ghs_procedure')
 
     
 
@@ -126,14 +137,18 @@ class CryoNamespace(UniversalEvents):
         # Actually send the temperatures
         await self.browser_namespace.send_temperatures(temperatures)
 
-    async def on_c_got_temperature_trace(self, sid, temperature_trace):
-        await self.browser_namespace.send_temperature_trace(temperature_trace)
+    # Event received when a valve procedure of the GHS could not run
+    async def on_c_ghs_procedure_error(self, sid, message, browser_sid):
+        await self.browser_namespace.send_ghs_procedure_error(message, browser_sid)
+
+    async def on_c_got_temperature_trace(self, sid, temperature_trace, browser_sid):
+        await self.browser_namespace.send_temperature_trace(temperature_trace, browser_sid)
 
     async def on_c_got_pressures(self, sid, pressures):
         await self.browser_namespace.send_pressures(pressures)
 
-    async def on_c_got_pressure_trace(self, sid, pressure_trace):
-        await self.browser_namespace.send_pressure_trace(pressure_trace)
+    async def on_c_got_pressure_trace(self, sid, pressure_trace, browser_sid):
+        await self.browser_namespace.send_pressure_trace(pressure_trace, browser_sid)
 
     async def on_c_got_fp_status(self, sid, status):
         await self.browser_namespace.send_cryo_status(status)
@@ -19,6 +19,9 @@ class MagnetismNamespace(UniversalEvents):
     async def on_m_got_dc_field(self, sid, dc_field):
         await self.browser_namespace.got_dc_field(dc_field)
 
+    async def on_m_got_magnet_ramp_progress(self, sid, progress):
+        await self.browser_namespace.got_magnet_ramp_progress(progress)
+
     async def on_m_got_step_results(self, sid, results):
         with db.connection_context():
             # Get the datapoint associated with the step (should be generated when step is sent)
@@ -23,7 +23,19 @@ function get_magnet_field_list(state) {
     return `
         <div>Current field</div>
         <div class="magnet-field-value--label">B_large = ${state['dc_field']}T</div>
-        <div class="magnet-field-value--label">B_small = ${state['ac_field']}T</div>`;
+        <div class="magnet-field-value--label">B_small = ${state['ac_field']}T</div>
+        ${get_magnet_ramp_label(state)}`;
+}
+
+function get_magnet_ramp_label(state) {
+    // Only show the ramp while the magnet is moving
+    if (state['magnet_ramp'] === null || state['magnet_ramp']['eta'] <= 0) {
+        return '';
+    }
+
+    return `
+        <div class="magnet-field-value--label">Ramping to ${state['magnet_ramp']['target']}T
+            (${to_fixed(state['magnet_ramp']['eta'], 0)}s left)</div>`;
 }
 
 function get_pressure_list(state) {
@@ -2,11 +2,13 @@
 const state = {
     'temperature_trace_plot_data': [],
     'temperature_plot_layout': 0,
+    'temperature_trace_seq': -1,
     'last_temperature_update': 1603707641.0,
     'magnet_trace_plot_data': [],
     'magnet_trace_plot_layout': 0,
     'pressure_trace_plot_data': [],
     'pressure_trace_plot_layout': 0,
+    'pressure_trace_seq': -1,
     'temperatures': {
         't_1st_stage': 0.0,
         't_2nd_stage': 0.0,
@@ -36,6 +38,7 @@ const state = {
     },
     'ac_field': 0.0,
     'dc_field': 0.0,
+    'magnet_ramp': null,
     'n_points_taken': 0,
     'n_points_total': 0,
     'experiment_config': {
@@ -53,7 +56,8 @@ const state = {
         'data_wait_before_measuring': 1.0,
         'data_points_per_measurement': 10,
     },
-    'is_saving_temperatures': false
+    'is_saving_temperatures': false,
+    'subscriptions': {}
 };
 
 // Have a list of the temperature labels
@@ -86,6 +90,7 @@ function main_socket_connection() {
     socket.on('b_temperatures', temperatures_updated);
     socket.on('b_pressures', pressures_updated);
     socket.on('b_dc_field', dc_field_updated);
+    socket.on('b_magnet_ramp_progress', magnet_ramp_progress_updated);
     socket.on('b_ac_field', ac_field_updated);
     socket.on('b_n_points_taken', n_points_taken_updated);
     socket.on('b_n_points_total', n_points_total_updated);
@@ -99,6 +104,9 @@ function main_socket_connection() {
     socket.on('b_got_is_saving_temperatures', got_is_saving_temperatures);
     socket.on('b_got_picowatt_config', b_got_picowatt_config);
 
+    // Stop receiving data while the tab is hidden, and resubscribe when it is shown again
+    document.addEventListener('visibilitychange', send_subscriptions);
+
     // Open status page by default
     open_status_page();
 
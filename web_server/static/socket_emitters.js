@@ -4,6 +4,24 @@
  * They are typically called through button presses
  */
 
+// Tell the server which data streams this page wants, along with the minimum time between updates (seconds)
+// A null interval uses the server default, streams not in the object are unsubscribed
+function set_subscriptions(streams) {
+    // Remember the subscriptions so we can resend them on reconnect, or when the tab becomes visible
+    state['subscriptions'] = streams;
+    send_subscriptions();
+}
+
+function send_subscriptions() {
+    // Hidden tabs do not need any updates, so we unsubscribe from everything
+    let streams = state['subscriptions'];
+    if (document.hidden) {
+        streams = {};
+    }
+
+    window.my_socket.emit('b_set_subscriptions', {streams: streams});
+}
+
 function update_temperatures() {
     // Request an update for the temperatures
     window.my_socket.emit('b_get_temperatures');
@@ -48,13 +66,13 @@ function update_magnet_trace() {
 }
 
 function update_temperature_trace() {
-    // Request an update for the temperature trace
-    window.my_socket.emit('b_get_temperature_trace');
+    // Request the temperatures recorded after the latest one we have
+    window.my_socket.emit('b_get_temperature_trace', {after_seq: state['temperature_trace_seq']});
 }
 
 function update_pressure_trace() {
-    // Request an update for the pressure trace
-    window.my_socket.emit('b_get_pressure_trace');
+    // Request the pressures recorded after the latest one we have
+    window.my_socket.emit('b_get_pressure_trace', {after_seq: state['pressure_trace_seq']});
 }
 
 function update_experiment_config() {
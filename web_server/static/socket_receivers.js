@@ -19,6 +19,13 @@ function idn_requested() {
 
     // Send the idn back to the server
     socket.emit('idn', idn);
+
+    // The server forgets our subscriptions when we reconnect, so we send them again
+    send_subscriptions();
+
+    // The stations may have restarted while we were gone, so the next traces we ask for are full traces
+    state['temperature_trace_seq'] = -1;
+    state['pressure_trace_seq'] = -1;
 }
 
 // Received as a response when we want to know the status of the GHS
@@ -43,18 +50,7 @@ function temperatures_updated(temperatures) {
     if (state['temperature_trace_plot_data'].length > 0 && state['temperature_plot_layout'] !== 0) {
         if (typeof temperatures !== 'undefined') {
             // Add new data to the state
-            for (let i = 0; i < t_labels.length; i++) {
-                state['temperature_trace_plot_data'][i].x.push(temperatures['timestamp']);
-                state['temperature_trace_plot_data'][i].y.push(temperatures[t_labels[i]]);
-            }
-
-            // Ensure length is at max 20 items
-            if (state['temperature_trace_plot_data'][0].x.length > 50) {
-                for (let i = 0; i < 12; i++) {
-                    state['temperature_trace_plot_data'][i].x.shift();
-                    state['temperature_trace_plot_data'][i].y.shift();
-                }
-            }
+            add_temperature_sample(temperatures);
 
             // Update data revision and range
             state['temperature_plot_layout']['datarevision'] += 1;
@@ -93,18 +89,7 @@ function pressures_updated(pressures) {
     if (state['pressure_trace_plot_data'].length > 0 && state['pressure_plot_layout'] !== 0) {
         if (typeof pressures !== 'undefined') {
             // Add new data
-            for (let i = 0; i < 10; i++) {
-                state['pressure_trace_plot_data'][i].x.push(pressures['timestamp']);
-                state['pressure_trace_plot_data'][i].y.push(pressures['p_' + (i + 1)]);
-            }
-
-            // Ensure length is at max 20 items
-            if (state['pressure_trace_plot_data'][0].x.length > 50) {
-                for (let i = 0; i < 10; i++) {
-                    state['pressure_trace_plot_data'][i].x.shift();
-                    state['pressure_trace_plot_data'][i].y.shift();
-                }
-            }
+            add_pressure_sample(pressures);
 
             // Update data revision and range
             state['pressure_plot_layout']['datarevision'] += 1;
@@ -131,6 +116,13 @@ function dc_field_updated(fieldstrength) {
     update_magnet_state();
 }
 
+// Gets the progress of the ramp of the large magnet and displays it on the screen
+function magnet_ramp_progress_updated(progress) {
+    state['magnet_ramp'] = progress;
+    state['dc_field'] = progress['field'];
+    update_magnet_state();
+}
+
 // Gets the AC rms field from the server and displays it on the screen
 function ac_field_updated(fieldstrength) {
     state['ac_field'] = fieldstrength;
@@ -253,9 +245,48 @@ function magnet_trace_updated(magnet_trace) {
     }
 }
 
-// Server sends a temperature trace, we plot the trace
-// This is usually only called when we go to a page with a temperature plot, and only once
-function temperature_trace_updated(temperature_trace) {
+// Adds a single temperature sample to the plot data
+// Samples we have already seen (by sequence number) are skipped
+// If we are missing samples before this one, we ask for a full trace instead and return false
+function add_temperature_sample(sample) {
+    if (sample['seq'] <= state['temperature_trace_seq']) {
+        return true;
+    }
+
+    if (state['temperature_trace_seq'] >= 0 && sample['seq'] !== state['temperature_trace_seq'] + 1) {
+        state['temperature_trace_seq'] = -1;
+        update_temperature_trace();
+        return false;
+    }
+
+    // Add the sample to each of the temperature traces
+    for (let i = 0; i < t_labels.length; i++) {
+        state['temperature_trace_plot_data'][i].x.push(sample['timestamp']);
+        state['temperature_trace_plot_data'][i].y.push(sample[t_labels[i]]);
+    }
+
+    // Remember the latest sample we have
+    state['temperature_trace_seq'] = sample['seq'];
+
+    // Ensure length is at max 50 items
+    if (state['temperature_trace_plot_data'][0].x.length > 50) {
+        for (let i = 0; i < t_labels.length; i++) {
+            state['temperature_trace_plot_data'][i].x.shift();
+            state['temperature_trace_plot_data'][i].y.shift();
+        }
+    }
+
+    return true;
+}
+
+// Server sends the temperature samples we have not seen yet, we add them to the plot
+// The server sends the full trace (marked as full) when we have nothing or are out of sync, so we start over
+function temperature_trace_updated(trace_update) {
+    if (trace_update['full']) {
+        state['temperature_trace_plot_data'] = [];
+        state['temperature_trace_seq'] = -1;
+    }
+
     if (state['temperature_trace_plot_data'].length < 1) {
         // Initialize the data model
         for (let i = 0; i < t_labels.length; i++) {
@@ -267,14 +298,6 @@ function temperature_trace_updated(temperature_trace) {
             });
         }
 
-        // Add the datapoints
-        for (let i = 0; i < temperature_trace.length; i++) {
-            for (let j = 0; j < t_labels.length; j++) {
-                state['temperature_trace_plot_data'][j].x.push(temperature_trace[i]['timestamp']);
-                state['temperature_trace_plot_data'][j].y.push(temperature_trace[i][t_labels[j]]);
-            }
-        }
-
         state['temperature_plot_layout'] = {
             datarevision: 0,
             title: 'Temperature over time',
@@ -289,19 +312,63 @@ function temperature_trace_updated(temperature_trace) {
                 zeroline: true
             }
         }
+    }
 
-        if (document.getElementById("temperature-plot")) {
-            Plotly.newPlot('temperature-plot', state['temperature_trace_plot_data'], state['temperature_plot_layout']);
+    // Add the datapoints
+    // Stop at a gap, the full trace we asked for replaces the data
+    for (let i = 0; i < trace_update['samples'].length; i++) {
+        if (!add_temperature_sample(trace_update['samples'][i])) {
+            break;
         }
     }
-    else {
-        temperatures_updated();
+
+    // Redraw the plot and the list
+    state['temperature_plot_layout']['datarevision'] += 1;
+    temperatures_updated();
+}
+
+// Adds a single pressure sample to the plot data
+// Samples we have already seen (by sequence number) are skipped
+// If we are missing samples before this one, we ask for a full trace instead and return false
+function add_pressure_sample(sample) {
+    if (sample['seq'] <= state['pressure_trace_seq']) {
+        return true;
+    }
+
+    if (state['pressure_trace_seq'] >= 0 && sample['seq'] !== state['pressure_trace_seq'] + 1) {
+        state['pressure_trace_seq'] = -1;
+        update_pressure_trace();
+        return false;
+    }
+
+    // Add the sample to each of the pressure traces
+    for (let i = 0; i < 10; i++) {
+        state['pressure_trace_plot_data'][i].x.push(sample['timestamp']);
+        state['pressure_trace_plot_data'][i].y.push(sample['p_' + (i + 1)]);
+    }
+
+    // Remember the latest sample we have
+    state['pressure_trace_seq'] = sample['seq'];
+
+    // Ensure length is at max 50 items
+    if (state['pressure_trace_plot_data'][0].x.length > 50) {
+        for (let i = 0; i < 10; i++) {
+            state['pressure_trace_plot_data'][i].x.shift();
+            state['pressure_trace_plot_data'][i].y.shift();
+        }
     }
+
+    return true;
 }
 
-// Server sends a pressure trace, we plot the trace
-// This is usually only called when we go to a page with a pressure plot, and only once
-function pressure_trace_updated(pressure_trace) {
+// Server sends the pressure samples we have not seen yet, we add them to the plot
+// Works the same way as the temperature trace
+function pressure_trace_updated(trace_update) {
+    if (trace_update['full']) {
+        state['pressure_trace_plot_data'] = [];
+        state['pressure_trace_seq'] = -1;
+    }
+
     if (state['pressure_trace_plot_data'].length < 1) {
         // Initialize the data model
         for (let i = 0; i < 10; i++) {
@@ -313,14 +380,6 @@ function pressure_trace_updated(pressure_trace) {
             });
         }
 
-        // Add the datapoints
-        for (let i = 0; i < pressure_trace.length; i++) {
-            for (let j = 0; j < 10; j++) {
-                state['pressure_trace_plot_data'][j].x.push(pressure_trace[i]['timestamp'])
-                state['pressure_trace_plot_data'][j].y.push(pressure_trace[i]['p_' + (j+1)])
-            }
-        }
-
         state['pressure_plot_layout'] = {
             datarevision: 0,
             title: 'Pressure over time',
@@ -335,12 +394,19 @@ function pressure_trace_updated(pressure_trace) {
                 zeroline: true
             }
         }
-
-        Plotly.newPlot('pressure-plot', state['pressure_trace_plot_data'], state['pressure_plot_layout']);
     }
-    else {
-        pressures_updated();
+
+    // Add the datapoints
+    // Stop at a gap, the full trace we asked for replaces the data
+    for (let i = 0; i < trace_update['samples'].length; i++) {
+        if (!add_pressure_sample(trace_update['samples'][i])) {
+            break;
+        }
     }
+
+    // Redraw the plot and the list
+    state['pressure_plot_layout']['datarevision'] += 1;
+    pressures_updated();
 }
 
 // Server sends the latest experiment config
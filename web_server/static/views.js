@@ -8,6 +8,9 @@ function open_status_page(should_update) {
     // Update the state
     state['current_page'] = open_status_page;
 
+    // Subscribe to the data shown on the page
+    set_subscriptions({temperatures: null, magnet_trace: null, magnet_field: null});
+
     // Set the title and the html content
     $('.content-title').text('Experiment status');
     $('.content-container').html(get_status_template(state));
@@ -25,6 +28,9 @@ function open_experiment_config_page(should_update) {
     // Update the state
     state['current_page'] = open_experiment_config_page;
 
+    // The config page only shows the status, so we only want the magnet field and temperatures
+    set_subscriptions({temperatures: null, magnet_field: null});
+
     // Update the status state
     if (typeof (should_update) === 'undefined') {
         update_status_state_tree();
@@ -40,6 +46,9 @@ function open_info_page() {
     // Update the state
     state['current_page'] = open_info_page;
 
+    // Nothing live is shown on the info page
+    set_subscriptions({});
+
     // Set the title and the html content
     $('.content-title').text('About this page');
     $('.content-container').html(get_info_page_html());
@@ -49,6 +58,9 @@ function open_cryogenics_page(should_update) {
     // Update the state
     state['current_page'] = open_cryogenics_page;
 
+    // Subscribe to the data shown on the page
+    set_subscriptions({temperatures: null, pressures: null, fp_status: null});
+
     // Set the title and the html content
     $('.content-title').text('Cryogenics configuration');
     $('.content-container').html(get_cryogenics_page_html());
@@ -66,6 +78,9 @@ function open_data_page(should_update) {
     // Update the state
     state['current_page'] = open_data_page;
 
+    // Nothing live is shown on the data page
+    set_subscriptions({});
+
     // Set the title and the html content
     $('.content-title').text('Data management');
     $('.content-container').html(get_data_page_html());